@@ -2,66 +2,156 @@
 import streamlit as st
 from datetime import date, timedelta
 import calendar
-import json
 import os
+import sqlite3
+import numpy as np
 import pandas as pd
-import holidays
+from planning import CODES, WEEKDAYS_FR, Plan, metrics
+from planning.cache import evaluations
+from planning.calendar_meta import build_year_calendar, build_year_rules, month_dates, month_grid
+from planning.daystore import DayCodeStore
+from planning.incremental import apply_rules_from
+from planning.jobs import DONE, QUEUED, RUNNING, JobQueue, coverage_job, optimize_job
+from planning.result_cache import ResultCache
+from planning.rules import vacs_index
+from planning.ruleset import active_ruleset, is_default_ruleset
+from planning.scope import DateRange
+from planning.storage import SqliteCalendar, load_json_file
+from planning.team import Team, absence_bulk
+from planning.whatif import configurations, what_if
 
 # ---------------------------
 # Configuration
 # ---------------------------
 st.set_page_config(layout="wide", page_title="Gestion calendrier congés")
-DATA_FILE = "calendar_state.json"
-FR_HOLIDAYS = holidays.France()
+DATA_FILE = "calendar_state.db"
+LEGACY_JSON_FILE = "calendar_state.json"
+METRICS_FILE = "calendar_metrics.jsonl"
+METRICS_PROM_FILE = "calendar_metrics.prom"
+RESULT_CACHE_FILE = "optimization_cache.db"
+OPTIMIZE_METHODS = {"Exacte": "exact", "Gloutonne": "greedy", "Plusieurs plans (budget de temps)": "anytime"}
 
-CODES = ["TRA", "ZZ", "CX", "CZ", "C4", "FC"]
-WEEKDAYS_FR = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
 HEADER_DAYS = ["Dimanche", "Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi"]
+CODE_COLORS = {"TRA": "#f7f7f7", "ZZ": "#cfe8ff", "CX": "#ffd9b3", "CZ": "#ffb3b3", "C4": "#d1c4e9", "FC": "#ffef9f"}
+# le data_editor ne colore pas les cellules éditables : la couleur est portée par le libellé
+CODE_LABELS = {"TRA": "⬜ TRA", "ZZ": "🟦 ZZ", "CX": "🟧 CX", "CZ": "🟥 CZ", "C4": "🟪 C4", "FC": "🟨 FC"}
+LABEL_CODES = {label: code for code, label in CODE_LABELS.items()}
+DEFAULT_SETTINGS = {"zz_odd": ["samedi", "dimanche"], "zz_even": ["samedi", "dimanche"], "parity_choice": "Paires"}
 
 # ---------------------------
-# Helpers safe rerun
+# Instrumentation (temps par phase, compteurs)
 # ---------------------------
-def safe_rerun():
-    """Appelle st.experimental_rerun() de façon sûre (protège contre AttributeError)."""
-    rerun = getattr(st, "experimental_rerun", None)
-    if callable(rerun):
-        try:
-            rerun()
-        except Exception:
-            # si rerun échoue, on stoppe proprement la session pour éviter l'AttributeError
-            st.stop()
+def diagnostics_enabled():
+    """Mesures actives si la case Diagnostics est cochée, ou pour toutes les sessions si CONGE_METRICS est défini."""
+    return bool(st.session_state.get("diagnostics")) or bool(os.environ.get("CONGE_METRICS"))
+
+def run_recorder():
+    """
+    Installe pour le thread le Recorder du rerun en cours et le retourne (None si désactivé).
+    Les callbacks passent avant le script : ils créent le Recorder, le script le reprend.
+    Un rerun interrompu (st.stop, rerun forcé) laisse ses mesures au rerun suivant.
+    """
+    if not diagnostics_enabled():
+        metrics.install(None)
+        return None
+    recorder = st.session_state.get("_metrics_run")
+    if recorder is None:
+        recorder = st.session_state["_metrics_run"] = metrics.Recorder()
+    metrics.install(recorder)
+    return recorder
+
+recorder = run_recorder()
+metrics.lap()
 
 # ---------------------------
 # Persistence helpers
 # ---------------------------
+def open_storage():
+    """
+    Ouvre la base SQLite ; au premier lancement, l'ancien calendar_state.json est importé.
+    Une base ou un JSON illisible arrête la page avec l'erreur au lieu de repartir d'un état vide.
+    """
+    try:
+        db = SqliteCalendar(DATA_FILE)
+        if db.is_empty() and os.path.exists(LEGACY_JSON_FILE):
+            db.import_json(load_json_file(LEGACY_JSON_FILE))
+    except (sqlite3.DatabaseError, ValueError) as exc:
+        st.error(f"Impossible de charger le calendrier : {exc}")
+        st.stop()
+    return db
+
+def session_storage():
+    """Connexion à la base de la session : ouverte au premier rerun, puis réutilisée."""
+    db = st.session_state.get("_storage")
+    if db is None:
+        db = st.session_state["_storage"] = open_storage()
+    return db
+
 def load_state():
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {"data": {}, "settings": {}}
-    return {"data": {}, "settings": {}}
+    settings = storage.read_settings()
+    return {
+        "data": DayCodeStore(loader=storage.read_year, months=storage.read_months()),
+        "settings": settings,
+        "_saved_settings": dict(settings),
+        "_employee": storage.employee,
+        "_revision": storage.revision(),
+    }
+
+def cached_state():
+    """
+    État de l'employé gardé en session d'un rerun à l'autre : relu dans la base seulement pour
+    un autre employé, ou si la version du calendrier a changé depuis le chargement ou la
+    dernière sauvegarde de cette session (écriture d'une autre session, import).
+    """
+    cached = st.session_state.get("_state")
+    if cached is None or cached["_employee"] != storage.employee or cached["_revision"] != storage.revision():
+        metrics.count("state_loads")
+        cached = st.session_state["_state"] = load_state()
+    return cached
 
 def save_state(state_obj):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(state_obj, f, ensure_ascii=False, indent=2, default=str)
-
-state = load_state()
-if "data" not in state:
-    state["data"] = {}
-if "settings" not in state:
-    state["settings"] = {}
+    """Écrit en une transaction les jours modifiés depuis la dernière sauvegarde (rien si aucun)."""
+    with metrics.phase("save"):
+        days, months_added, months_removed = state_obj["data"].pop_changes()
+        settings = state_obj["settings"]
+        if settings == state_obj.get("_saved_settings"):
+            settings = None
+        if not days and not months_added and not months_removed and settings is None:
+            return
+        state_obj["_revision"] = storage.write(days, months_added, months_removed, settings)
+        state_obj["_saved_settings"] = dict(state_obj["settings"])
+
+def on_add_employee():
+    """Enregistre le nouvel employé (réglages par défaut) et affiche son calendrier."""
+    name = st.session_state.get("new_employee", "").strip()
+    if not name:
+        return
+    db = storage.with_employee(name)
+    if not db.read_settings():
+        db.write(settings=DEFAULT_SETTINGS)
+    st.session_state["employee"] = name
+    st.session_state["new_employee"] = ""
+
+storage = session_storage()
+
+# chaque employé a son calendrier et ses réglages ZZ/parité ("" = calendrier principal)
+st.sidebar.markdown("### Employé")
+employee = st.sidebar.selectbox(
+    "Calendrier affiché",
+    sorted(set(storage.list_employees()) | {""}),
+    format_func=lambda e: e or "Calendrier principal",
+    key="employee",
+)
+st.sidebar.text_input("Nouvel employé", key="new_employee")
+st.sidebar.button("Ajouter l'employé", on_click=on_add_employee)
+
+storage = storage.with_employee(employee)
+state = cached_state()
+metrics.lap("load")
 
 # ---------------------------
 # Utilitaires calendrier
 # ---------------------------
-def month_grid(year, month):
-    cal = calendar.Calendar(firstweekday=6)  # semaine commence dimanche
-    month_days = list(cal.itermonthdates(year, month))
-    weeks = [month_days[i:i+7] for i in range(0, len(month_days), 7)]
-    return weeks
-
 def date_key(d: date):
     return d.isoformat()
 
@@ -71,18 +161,10 @@ def display_date_str(d: date):
 def weekday_fr(d: date):
     return WEEKDAYS_FR[d.weekday()]
 
-def month_key(year, month):
-    return f"{year:04d}-{month:02d}"
-
 def ensure_month_initialized(year, month):
-    key = month_key(year, month)
-    if key not in state["data"]:
-        state["data"][key] = {}
-    for w in month_grid(year, month):
-        for d in w:
-            if d.month != month:
-                continue
-            state["data"][key].setdefault(date_key(d), "TRA")
+    state["data"].add_month(year, month)
+    for d in month_dates(year, month):
+        state["data"].setdefault(d, "TRA")
 
 # ---------------------------
 # Sidebar : paramètres
@@ -100,14 +182,37 @@ with col3:
 
 display_date = date(sel_year, sel_month, min(sel_day, calendar.monthrange(sel_year, sel_month)[1]))
 show_two_months = st.sidebar.checkbox("Afficher 2 mois (mois suivant inclus)", value=False)
+view_mode = st.sidebar.radio(
+    "Affichage", ("Cartes", "Grille", "Année"),
+    help="Cartes : un sélecteur par jour. Grille : un tableau éditable par mois. "
+         "Année : toute l'année dans un seul tableau (règles et optimisation portent alors sur l'année).",
+)
+custom_range = st.sidebar.checkbox(
+    "Période personnalisée", value=False, disabled=view_mode == "Année",
+    help="Règles, total et optimisation portent sur la période choisie (plusieurs années possibles).",
+)
+if custom_range and view_mode != "Année":
+    picked = st.sidebar.date_input(
+        "Période (début, fin)",
+        value=(display_date, display_date + timedelta(days=60)),
+        min_value=date(1900, 1, 1),
+        max_value=date(2100, 12, 31),
+    )
+    # pendant la sélection, date_input ne renvoie que le premier jour
+    picked = picked if isinstance(picked, (tuple, list)) else (picked,)
 
 st.sidebar.markdown("### Parité et jours ZZ")
-parity_choice = st.sidebar.radio("Semaines à 3 ZZ sur :", ("Paires", "Impaires"))
+employee_settings = {**DEFAULT_SETTINGS, **state["settings"]}
+parity_choice = st.sidebar.radio(
+    "Semaines à 3 ZZ sur :", ("Paires", "Impaires"),
+    index=("Paires", "Impaires").index(employee_settings["parity_choice"]),
+    key=f"parity_choice_{employee}",
+)
 
 st.sidebar.markdown("**Choix des jours ZZ pour semaines impaires**")
-zz_odd = st.sidebar.multiselect("ZZ semaine impaires (2 ou 3 jours)", WEEKDAYS_FR, default=["samedi", "dimanche"])
+zz_odd = st.sidebar.multiselect("ZZ semaine impaires (2 ou 3 jours)", WEEKDAYS_FR, default=employee_settings["zz_odd"], key=f"zz_odd_{employee}")
 st.sidebar.markdown("**Choix des jours ZZ pour semaines paires**")
-zz_even = st.sidebar.multiselect("ZZ semaine paires (2 ou 3 jours)", WEEKDAYS_FR, default=["samedi", "dimanche"])
+zz_even = st.sidebar.multiselect("ZZ semaine paires (2 ou 3 jours)", WEEKDAYS_FR, default=employee_settings["zz_even"], key=f"zz_even_{employee}")
 
 def validate_zz_selection(sel):
     if len(sel) < 2:
@@ -123,462 +228,594 @@ def validate_zz_selection(sel):
 
 zz_odd = validate_zz_selection(zz_odd)
 zz_even = validate_zz_selection(zz_even)
+# réglages propres à l'employé, enregistrés avec son calendrier
+state["settings"].update(zz_odd=list(zz_odd), zz_even=list(zz_even), parity_choice=parity_choice)
 
 st.sidebar.markdown("### Compteurs")
 cx_quota = st.sidebar.number_input("Compteur CX (unités totales à poser)", min_value=0, max_value=31, value=3, step=1)
 c4_quota = st.sidebar.number_input("Compteur C4 (max 4 unités)", min_value=0, max_value=4, value=0, step=1)
 
 st.sidebar.markdown("---")
+# l'optimisation exacte ne connaît que l'accord par défaut (voir planning.ruleset)
+optimize_method = st.sidebar.radio(
+    "Méthode d'optimisation",
+    [label for label, method in OPTIMIZE_METHODS.items() if method != "exact" or is_default_ruleset()],
+)
+optimize_workers = st.sidebar.number_input("Processus (optimisation gloutonne)", min_value=1, max_value=os.cpu_count() or 1, value=1, step=1)
+if optimize_method == "Plusieurs plans (budget de temps)":
+    search_budget = st.sidebar.number_input("Budget (secondes)", min_value=0.5, max_value=60.0, value=3.0, step=0.5)
+    search_k = st.sidebar.number_input("Nombre de plans proposés", min_value=1, max_value=20, value=5, step=1)
 optimize_btn = st.sidebar.button("Optimiser (mode optimisation)")
 
 # ---------------------------
-# Initialisation mois(s)
+# Période de planification et mois affichés
 # ---------------------------
-months_to_show = [display_date]
-if show_two_months:
-    y = sel_year
-    m = sel_month + 1
-    if m == 13:
-        m = 1
-        y += 1
-    months_to_show.append(date(y, m, 1))
+if view_mode == "Année":
+    planning_range = DateRange.year(sel_year)
+elif custom_range and picked:
+    planning_range = DateRange(picked[0], picked[-1])
+else:
+    months = [display_date]
+    if show_two_months:
+        y = sel_year
+        m = sel_month + 1
+        if m == 13:
+            m = 1
+            y += 1
+        months.append(date(y, m, 1))
+    planning_range = DateRange.from_months(months)
+
+months_to_show = [date(year, month, 1) for year, month in planning_range.months()]
+if view_mode == "Cartes" and len(months_to_show) > 3:
+    st.sidebar.info("Période longue : l'affichage Grille est plus rapide que les cartes.")
 
 for m in months_to_show:
     ensure_month_initialized(m.year, m.month)
+metrics.lap("sidebar")
 
 # ---------------------------
 # Accesseurs codes
 # ---------------------------
 def get_code(d: date):
-    key = month_key(d.year, d.month)
-    return state["data"].get(key, {}).get(date_key(d), "TRA")
+    return state["data"].get(d, "TRA")
 
 def set_code(d: date, code: str):
-    key = month_key(d.year, d.month)
-    state["data"].setdefault(key, {})
-    state["data"][key][date_key(d)] = code
+    state["data"].set(d, code)
+
+# ---------------------------
+# Tables calendaires (partagées entre sessions)
+# ---------------------------
+@st.cache_resource(show_spinner=False)
+def year_calendar(year):
+    """Jour de semaine, parité ISO et jours fériés de l'année."""
+    return build_year_calendar(year)
+
+@st.cache_resource(show_spinner=False)
+def year_rules(year, zz_odd_sel, zz_even_sel, parity):
+    """Table de l'année pour une sélection ZZ/parité : jour ZZ, semaine 3-ZZ, code par défaut."""
+    return build_year_rules(year_calendar(year), zz_odd_sel, zz_even_sel, parity)
+
+_rules_tables = {}  # tables des réglages courants, par année (pour ce rerun)
+
+def rules_table(year):
+    table = _rules_tables.get(year)
+    if table is None:
+        table = _rules_tables[year] = year_rules(year, tuple(zz_odd), tuple(zz_even), parity_choice)
+    return table
 
 # ---------------------------
 # Règles métier : utilitaires
 # ---------------------------
 def is_week_even(d: date):
-    return (d.isocalendar()[1] % 2) == 0
+    cal = rules_table(d.year).calendar
+    return cal.week_even[d.toordinal() - cal.start]
 
-def treated_as_zz(d: date):
-    """Retourne True si le jour est traité comme ZZ pour la logique (ZZ ou FC)."""
-    c = get_code(d)
-    return c == "ZZ" or c == "FC"
+def is_holiday(d: date):
+    cal = rules_table(d.year).calendar
+    return cal.holiday[d.toordinal() - cal.start]
 
 def week_is_three_zz(d: date):
     """Une semaine est '3-ZZ' si la sélection pour sa parité contient 3 jours et la parité correspond."""
-    week_even = is_week_even(d)
-    chosen = zz_even if week_even else zz_odd
-    if len(chosen) == 3:
-        if parity_choice == "Paires":
-            return week_even
-        else:
-            return not week_even
-    return False
+    table = rules_table(d.year)
+    return table.three_zz[table.index(d)]
 
 def apply_default_zz_and_fc_for_month(year, month):
-    key = month_key(year, month)
-    for w in month_grid(year, month):
-        for d in w:
-            if d.month != month:
-                continue
-            if d in FR_HOLIDAYS:
-                state["data"][key][date_key(d)] = "FC"
-                continue
-            state["data"][key].setdefault(date_key(d), "TRA")
-    # Appliquer ZZ selon sélection (sans écraser FC)
-    for w in month_grid(year, month):
-        for d in w:
-            if d.month != month:
-                continue
-            week_even = is_week_even(d)
-            chosen = zz_even if week_even else zz_odd
-            if WEEKDAYS_FR[d.weekday()] in chosen:
-                if state["data"][key].get(date_key(d)) != "FC":
-                    state["data"][key][date_key(d)] = "ZZ"
+    store = state["data"]
+    table = rules_table(year)
+    for d in month_dates(year, month):
+        default = table.default_code[table.index(d)]
+        if default == "FC":
+            store.set(d, "FC")
+            continue
+        store.setdefault(d, "TRA")
+        # Appliquer ZZ selon sélection (sans écraser FC)
+        if default == "ZZ" and store.get(d) != "FC":
+            store.set(d, "ZZ")
 
 # ---------------------------
 # Application des règles VACS / CZ / C4
 # ---------------------------
-def apply_business_rules(months_scope):
+def apply_business_rules(scope: DateRange):
     """
     Applique :
-    - defaults (TRA/ZZ/FC),
-    - calcule les périodes VACS (déclenchées par CX),
-    - transforme ZZ -> CZ uniquement si en VACS et semaine à 3 ZZ,
-    - FC reste FC visuellement mais est traité comme ZZ pour la logique.
+    - defaults (TRA/ZZ/FC) sur les mois couverts par la période,
+    - puis l'automate des règles (planning.ruleset) sur la période : pour l'accord par défaut,
+      VACS déclenchées par CX, ZZ -> CZ uniquement si en VACS et semaine à 3 ZZ,
+      FC reste FC visuellement mais est compté comme CZ (voir is_effective_cz()).
     """
+    metrics.count("rules_full")
     # 1) Defaults
-    for m in months_scope:
-        apply_default_zz_and_fc_for_month(m.year, m.month)
+    for year, month in scope.months():
+        apply_default_zz_and_fc_for_month(year, month)
 
     # 2) Revenir sur CZ précédents (ne pas écraser FC)
-    for m in months_scope:
-        key = month_key(m.year, m.month)
-        for w in month_grid(m.year, m.month):
-            for d in w:
-                if d.month != m.month:
-                    continue
-                if state["data"][key].get(date_key(d)) == "CZ":
-                    # si jour férié, garder FC; sinon remettre ZZ si sélection le prévoit, sinon TRA
-                    if d in FR_HOLIDAYS:
-                        state["data"][key][date_key(d)] = "FC"
-                    else:
-                        week_even = is_week_even(d)
-                        chosen = zz_even if week_even else zz_odd
-                        if WEEKDAYS_FR[d.weekday()] in chosen:
-                            state["data"][key][date_key(d)] = "ZZ"
-                        else:
-                            state["data"][key][date_key(d)] = "TRA"
-
-    # 3) Parcours chronologique pour appliquer VACS et CZ
-    all_dates = []
-    for m in months_scope:
-        for w in month_grid(m.year, m.month):
-            for d in w:
-                if d.month != m.month:
-                    continue
-                all_dates.append(d)
-    all_dates = sorted(all_dates)
-
-    in_vacs = False
-    for d in all_dates:
-        code = get_code(d)
-        if code == "CX":
-            in_vacs = True
-            continue
-        if code == "C4":
-            # C4 compte comme absence mais interrompt la VACS
-            in_vacs = False
-            continue
-        if code == "TRA":
-            in_vacs = False
-            continue
-        # Si on est en VACS et le jour est traité comme ZZ et la semaine est 3-ZZ :
-        # - si le jour est ZZ (non-FC) -> on le marque CZ
-        # - si le jour est FC -> on le laisse FC (visuel) mais il sera compté comme CZ dans les calculs via is_effective_cz()
-        if in_vacs and treated_as_zz(d) and week_is_three_zz(d):
-            if get_code(d) == "ZZ":
-                state["data"][month_key(d.year, d.month)][date_key(d)] = "CZ"
-            # si FC, on ne change pas la valeur stockée (reste "FC"), mais la logique d'absence le traitera comme CZ
+    store = state["data"]
+    for year, month in scope.months():
+        table = rules_table(year)
+        for d in month_dates(year, month):
+            if store.get(d) == "CZ":
+                # si jour férié, garder FC; sinon remettre ZZ si sélection le prévoit, sinon TRA
+                store.set(d, table.default_code[table.index(d)] or "TRA")
+
+    # 3) Automate VACS / CZ sur la période
+    dates = scope.dates()
+    final = active_ruleset().apply_codes([get_code(d) for d in dates], [week_is_three_zz(d) for d in dates])
+    for d, code in zip(dates, final):
+        if code != store.get(d):
+            store.set(d, code)
+
+# ---------------------------
+# Application incrémentale des règles (jours modifiés)
+# ---------------------------
+def apply_business_rules_from(changed, scope: DateRange):
+    """
+    Équivalent de apply_business_rules(scope) après modification des seuls jours `changed`
+    (voir planning.incremental) : seuls les segments de VACS concernés sont recalculés.
+    """
+    apply_rules_from(state["data"], changed, scope, rules_table)
+
+def rules_key(scope: DateRange):
+    return (scope, tuple(zz_odd), tuple(zz_even), parity_choice, state["data"].version)
+
+def mark_rules_applied(scope: DateRange):
+    """Les codes stockés sont à jour des règles pour `scope` et les réglages courants."""
+    state["_rules_key"] = rules_key(scope)
+
+def ensure_business_rules(scope: DateRange):
+    """
+    apply_business_rules(scope), sauf si rien n'a changé depuis la dernière application
+    (codes, période, réglages ZZ/parité) : les callbacks appliquent déjà les règles à chaque
+    modification, le rerun qui suit n'a plus rien à refaire.
+    """
+    if state.get("_rules_key") == rules_key(scope):
+        metrics.count("rules_skipped")
+        return
+    apply_business_rules(scope)
+    mark_rules_applied(scope)
 
 # ---------------------------
 # Fonctions d'évaluation CZ effectif et d'absence
 # ---------------------------
-def is_effective_cz(d: date, months_scope):
+def vacs_index_for_scope(scope: DateRange):
+    """
+    Index des VACS de la période sur les codes stockés (planning.vacs) : un seul parcours vers
+    l'avant, puis chaque jour est interrogé par recherche dichotomique. À construire une fois
+    par rerun, après apply_business_rules.
+    """
+    return vacs_index(plan_from_state(scope))
+
+def is_effective_cz(d: date, index, scope: DateRange):
     """
     Retourne True si le jour doit être considéré comme CZ pour le calcul d'absence :
     - stocké "CZ" OU
     - stocké "FC" et en période VACS et semaine à 3-ZZ
+    `index` : vacs_index_for_scope(scope).
     """
+    i = scope.index(d)
+    return i is not None and index.is_effective_cz(i)
+
+def effective_code_label(d: date, index, scope: DateRange):
+    """Code affiché : le code stocké, "FC → CZ" pour un FC compté comme CZ."""
     code = get_code(d)
-    if code == "CZ":
-        return True
-    if code == "FC":
-        # pour savoir si FC est 'effectivement CZ', il faut vérifier s'il est dans une VACS
-        # On détecte la présence d'une VACS qui englobe ce jour en recherchant un CX antérieur non interrompu par TRA/C4
-        # Parcourir en arrière jusqu'à trouver un CX ou une interruption
-        dd = d
-        # chercher le début de la séquence en remontant
-        while True:
-            prev = dd - timedelta(days=1)
-            # si prev hors scope, on arrête
-            if not any((prev.year == m.year and prev.month == m.month) for m in months_scope):
-                break
-            prev_code = get_code(prev)
-            if prev_code == "CX":
-                # il y a un CX avant sans interruption -> d est dans VACS
-                # vérifier que la semaine est 3-ZZ
-                return week_is_three_zz(d)
-            if prev_code in ("TRA", "C4"):
-                break
-            dd = prev
-        # aussi vérifier si d lui-même est après un CX (parcours avant n'a trouvé CX mais peut y avoir CX sur d ou après)
-        # on vérifie s'il existe un CX avant d dans la période sans interruption
-        dd = d
-        while True:
-            prev = dd - timedelta(days=1)
-            if not any((prev.year == m.year and prev.month == m.month) for m in months_scope):
-                break
-            prev_code = get_code(prev)
-            if prev_code == "CX":
-                return week_is_three_zz(d)
-            if prev_code in ("TRA", "C4"):
-                break
-            dd = prev
-    return False
+    return "FC → CZ" if code == "FC" and is_effective_cz(d, index, scope) else code
+
+def is_counted_absence(d: date, index, scope: DateRange):
+    """True si le jour compte dans une VACS de la période (ZZ/FC collés compris)."""
+    i = scope.index(d)
+    return i is not None and index.is_counted(i)
 
-def simulate_vacs_from(start_date, months_scope):
+def total_absence_for_scope(scope: DateRange):
     """
-    Retourne la liste unique et triée des jours d'absence pour une VACS démarrant à start_date.
-    Les jours comptés : CX, C4, CZ (stocké) et ZZ/FC qui sont traités comme CZ via is_effective_cz.
-    On arrête la VACS au premier TRA ou après un C4.
+    (total, jours) de la VACS ouverte par le premier CX de la période, sur les codes stockés
+    (règles déjà appliquées) : décompte de l'index des VACS, lu dans le cache d'évaluations
+    tant que le calendrier et les réglages ZZ/parité ne changent pas.
     """
-    abs_days = []
-    d = start_date
-    while True:
-        if not any((d.year == m.year and d.month == m.month) for m in months_scope):
-            break
-        code = get_code(d)
-        if code == "TRA":
-            break
-        # CX, C4, CZ sont comptés ; FC peut être compté via is_effective_cz
-        if code in ("CX", "C4", "CZ"):
-            abs_days.append(d)
-        elif code == "ZZ":
-            # si ZZ stocké mais en semaine 3-ZZ et en VACS -> CZ effectif (mais ici on ne sait pas si on est en VACS)
-            # pour la simulation, on considère la VACS démarrant à start_date, donc on est en VACS
-            if week_is_three_zz(d):
-                abs_days.append(d)  # compte comme CZ
-        elif code == "FC":
-            # FC treated as ZZ for logic; if week_is_three_zz -> count as CZ
-            if week_is_three_zz(d):
-                abs_days.append(d)
-            else:
-                # FC not in 3-ZZ week: still counts as absence if contiguous to VACS (we'll include contiguous ZZ/FC later)
-                abs_days.append(d)
-        d = d + timedelta(days=1)
-    if not abs_days:
-        return []
-    # ajouter ZZ/FC contigus avant et après
-    first = abs_days[0]
-    last = abs_days[-1]
-    # avant
-    d = first - timedelta(days=1)
-    while any((d.year == m.year and d.month == m.month) for m in months_scope):
-        if treated_as_zz(d):
-            abs_days.insert(0, d)
-            d = d - timedelta(days=1)
-        else:
-            break
-    # après
-    d = last + timedelta(days=1)
-    while any((d.year == m.year and d.month == m.month) for m in months_scope):
-        if treated_as_zz(d):
-            abs_days.append(d)
-            d = d + timedelta(days=1)
-        else:
-            break
-    unique = sorted({dd for dd in abs_days})
-    return unique
-
-def total_absence_for_scope(months_scope):
-    # trouver le premier CX dans la période
-    all_dates = []
-    for m in months_scope:
-        for w in month_grid(m.year, m.month):
-            for d in w:
-                if d.month != m.month:
-                    continue
-                all_dates.append(d)
-    all_dates = sorted(all_dates)
-    first_cx = None
-    for d in all_dates:
-        if get_code(d) == "CX":
-            first_cx = d
-            break
-    if not first_cx:
-        return 0, []
-    days = simulate_vacs_from(first_cx, months_scope)
-    return len(days), days
-
-# ---------------------------
-# Optimisation (greedy amélioré)
-# ---------------------------
-def evaluate_total_absence_with_plan(months_scope):
-    apply_business_rules(months_scope)
-    cnt, days = total_absence_for_scope(months_scope)
-    return cnt, days
-
-def optimize_placement(months_scope, cx_quota, c4_quota):
-    candidates = []
-    for m in months_scope:
-        for w in month_grid(m.year, m.month):
-            for d in w:
-                if d.month != m.month:
-                    continue
-                if get_code(d) not in ("CX", "C4"):
-                    candidates.append(d)
-    candidates = sorted(set(candidates))
-    placed_cx = []
-    placed_c4 = []
-    baseline_cnt, _ = evaluate_total_absence_with_plan(months_scope)
-
-    # placer CX par gain marginal (fallback earliest pour consommer quota)
-    for _ in range(int(cx_quota)):
-        best_gain = -1
-        best_day = None
-        for cand in candidates:
-            if cand in placed_cx or cand in placed_c4:
-                continue
-            prev = state["data"].get(month_key(cand.year, cand.month), {}).get(date_key(cand), None)
-            set_code(cand, "CX")
-            cnt, _ = evaluate_total_absence_with_plan(months_scope)
-            gain = cnt - baseline_cnt
-            # revert
-            if prev is None:
-                state["data"][month_key(cand.year, cand.month)].pop(date_key(cand), None)
-            else:
-                set_code(cand, prev)
-            if gain > best_gain:
-                best_gain = gain
-                best_day = cand
-        if best_day is None:
-            for cand in candidates:
-                if cand not in placed_cx and cand not in placed_c4:
-                    best_day = cand
-                    break
-        if best_day is None:
-            break
-        set_code(best_day, "CX")
-        placed_cx.append(best_day)
-        baseline_cnt, _ = evaluate_total_absence_with_plan(months_scope)
-
-    # placer C4 par gain marginal (fallback heuristique)
-    for _ in range(int(c4_quota)):
-        best_gain = -1
-        best_day = None
-        for cand in candidates:
-            if cand in placed_cx or cand in placed_c4:
-                continue
-            prev = state["data"].get(month_key(cand.year, cand.month), {}).get(date_key(cand), None)
-            set_code(cand, "C4")
-            cnt, _ = evaluate_total_absence_with_plan(months_scope)
-            gain = cnt - baseline_cnt
-            if prev is None:
-                state["data"][month_key(cand.year, cand.month)].pop(date_key(cand), None)
-            else:
-                set_code(cand, prev)
-            if gain > best_gain:
-                best_gain = gain
-                best_day = cand
-        if best_day is None:
-            if placed_cx:
-                last_vacs = simulate_vacs_from(placed_cx[-1], months_scope)
-                if last_vacs:
-                    candidate_day = last_vacs[-1] + timedelta(days=1)
-                    if any((candidate_day.year == m.year and candidate_day.month == m.month) for m in months_scope):
-                        best_day = candidate_day
-        if best_day is None:
-            break
-        set_code(best_day, "C4")
-        placed_c4.append(best_day)
-        baseline_cnt, _ = evaluate_total_absence_with_plan(months_scope)
-
-    final_cnt, final_days = evaluate_total_absence_with_plan(months_scope)
+    return evaluations.evaluate_final(plan_from_state(scope))
+
+def vacs_reaches_edge(abs_days, scope: DateRange):
+    """
+    True si la VACS comptée touche un bord de la période : les jours au-delà ne sont pas lus,
+    le total peut alors être coupé (il suffit d'élargir la période pour la compter en entier).
+    """
+    return bool(abs_days) and (abs_days[0] == scope.start or abs_days[-1] == scope.end)
+
+# ---------------------------
+# Optimisation en tâche de fond
+# ---------------------------
+def plan_from_state(scope):
+    """Photographie immuable (planning.Plan) des codes stockés de la période et des réglages ZZ/parité."""
+    all_dates = scope.dates()
+    return Plan(
+        start=scope.start,
+        codes=tuple(state["data"].get(d) for d in all_dates),
+        holidays=frozenset(d for d in all_dates if is_holiday(d)),
+        zz_odd=tuple(zz_odd),
+        zz_even=tuple(zz_even),
+        parity_choice=parity_choice,
+    )
+
+@st.cache_resource(show_spinner=False)
+def job_queue():
+    """File des optimisations partagée par toutes les sessions (CONGE_JOB_WORKERS threads, 1 par défaut)."""
+    return JobQueue(workers=int(os.environ.get("CONGE_JOB_WORKERS", "1")))
+
+@st.cache_resource(show_spinner=False)
+def result_cache():
+    """Cache disque des placements (planning.result_cache), partagé par toutes les sessions et processus."""
+    return ResultCache(RESULT_CACHE_FILE)
+
+def start_optimization(scope, method_label, cx_quota, c4_quota, budget=3.0, k=5, workers=1):
+    """Lance l'optimisation sur une copie du calendrier ; la page reste utilisable pendant le calcul."""
+    plan = plan_from_state(scope)
+    method = OPTIMIZE_METHODS[method_label]
+    job = job_queue().submit(
+        optimize_job, plan, cx_quota, c4_quota, method, budget, k, workers, result_cache(),
+        description=f"{method_label} : {employee or 'Calendrier principal'}",
+        context={"employee": employee, "scope": scope, "plan": plan, "method": method},
+    )
+    st.session_state.setdefault("jobs", []).append(job.id)
+    return job
+
+def team_for_scope(scope):
+    """Équipe (planning.team.Team) de tous les employés de la base sur la période."""
+    return Team.from_storage(storage, scope.start, scope.end, frozenset(d for d in scope.dates() if is_holiday(d)))
+
+def start_team_optimization(scope, cx_quota, c4_quota, min_staff, fairness):
+    """Lance le planning d'équipe sous effectif minimum (compteurs identiques pour chaque employé)."""
+    team = team_for_scope(scope)
+    job = job_queue().submit(
+        coverage_job, team, cx_quota, c4_quota, min_staff, fairness,
+        description=f"Planning d'équipe ({len(team.employees)} employés, effectif minimum {min_staff})",
+        context={"employee": None, "scope": scope, "team": team, "method": "team"},
+    )
+    st.session_state.setdefault("jobs", []).append(job.id)
+    return job
+
+def session_jobs():
+    queue = job_queue()
+    return [job for job in (queue.get(job_id) for job_id in st.session_state.get("jobs", [])) if job is not None]
+
+def place_days(placed_cx, placed_c4, scope):
+    """Pose des CX/C4, réapplique les règles et enregistre le tout en une transaction."""
+    for d in placed_cx:
+        set_code(d, "CX")
+    for d in placed_c4:
+        set_code(d, "C4")
+    apply_business_rules(scope)
+    mark_rules_applied(scope)
     save_state(state)
-    return final_cnt, placed_cx, placed_c4, final_days
+
+def job_matches(job, scope):
+    """La tâche porte sur l'employé (None : toute l'équipe) et la période affichés."""
+    return job.context["employee"] in (None, employee) and job.context["scope"] == scope
+
+def collect_finished_jobs(scope):
+    """
+    Reprend les tâches terminées de la session qui portent sur l'employé et la période affichés :
+    un plan exact ou glouton est posé d'un bloc si le calendrier n'a pas changé depuis le
+    lancement (sinon il reste proposé, voir "stale_job"), les plans de la recherche anytime
+    sont proposés au choix. Retourne les messages à afficher.
+    """
+    messages = []
+    queue = job_queue()
+    current = None
+    for job in session_jobs():
+        if job.active or not job_matches(job, scope):
+            continue
+        st.session_state["jobs"].remove(job.id)
+        queue.forget(job.id)
+        if job.status != DONE:
+            messages.append(("warning", f"{job.description} : {job.status}" + (f" ({job.error})" if job.error else "")))
+            continue
+        if job.context["method"] == "team":
+            st.session_state["team_results"] = (scope, job.context["team"], job.result)
+            messages.append(("success", f"{job.description} : {int(job.result.totals.sum())} jours d'absence "
+                                        f"pour l'équipe (borne sans contrainte : {int(job.result.bounds.sum())})."))
+            continue
+        if job.context["method"] == "anytime":
+            st.session_state["search_results"] = (employee, scope, job.result)
+            st.session_state["search_choice"] = 0
+            messages.append(("success", f"{job.description} : {len(job.result)} plans proposés."))
+            continue
+        result, optimal = job.result
+        current = current or plan_from_state(scope)
+        if current != job.context["plan"]:
+            st.session_state["stale_job"] = (employee, scope, result)
+            messages.append(("warning", f"{job.description} : le calendrier a changé depuis le lancement, "
+                                        "le plan trouvé n'a pas été posé."))
+            continue
+        place_days(result.placed_cx, result.placed_c4, scope)
+        current = None
+        days = [f"CX {d.strftime('%d/%m/%Y')}" for d in result.placed_cx] + [f"C4 {d.strftime('%d/%m/%Y')}" for d in result.placed_c4]
+        exact = "" if optimal is None else f" (optimum exact : {optimal})"
+        messages.append(("success", f"Optimisation terminée. Jours d'absence totaux : {result.total}{exact}. "
+                                    f"Posés : {', '.join(days) or 'aucun'}"))
+    return messages
 
 # ---------------------------
 # Reactivity control (callbacks)
 # ---------------------------
-if "needs_rerun" not in st.session_state:
-    st.session_state["needs_rerun"] = False
-
+# Les callbacks passent avant le script : la modification, les règles et l'écriture sont faites
+# une fois ici, le rerun qui suit affiche l'état à jour sans rien recalculer ni relancer.
 def on_selectbox_change(date_iso):
     """
     Callback when a day's selectbox changes.
-    Update state and mark for rerun.
+    Update state, reapply the rules around the day and save.
     """
-    key = f"sel_{date_iso}"
-    new_value = st.session_state.get(key)
-    d = date.fromisoformat(date_iso)
-    set_code(d, new_value)
-    # save immediately
-    save_state(state)
-    # mark for rerun after rendering
-    st.session_state["needs_rerun"] = True
+    run_recorder()
+    with metrics.phase("callback"):
+        key = f"sel_{date_iso}"
+        new_value = st.session_state.get(key)
+        d = date.fromisoformat(date_iso)
+        set_code(d, new_value)
+        apply_business_rules_from([d], planning_range)
+        mark_rules_applied(planning_range)
+        # save immediately
+        save_state(state)
+
+if "grid_version" not in st.session_state:
+    st.session_state["grid_version"] = 0
+
+def on_grid_change(key, cells):
+    """
+    Callback du tableau éditable (mode Grille/Année) : toutes les cellules modifiées sont
+    appliquées en un lot, puis le tableau est recréé (nouvelle clé) à partir de l'état à jour.
+    `cells` associe (ligne, colonne) au jour affiché dans la cellule.
+    """
+    run_recorder()
+    with metrics.phase("callback"):
+        changed = []
+        for row, values in st.session_state[key]["edited_rows"].items():
+            for column, label in values.items():
+                d = cells.get((int(row), column))
+                code = LABEL_CODES.get(label)
+                if d is not None and code is not None and code != get_code(d):
+                    set_code(d, code)
+                    changed.append(d)
+        apply_business_rules_from(changed, planning_range)
+        mark_rules_applied(planning_range)
+        save_state(state)
+    st.session_state["grid_version"] += 1
 
 # ---------------------------
 # Initial application of rules
 # ---------------------------
-apply_business_rules(months_to_show)
+metrics.lap()
+ensure_business_rules(planning_range)
 save_state(state)
+job_messages = collect_finished_jobs(planning_range)
+vacs = vacs_index_for_scope(planning_range)
+metrics.lap("rules")
 
 # ---------------------------
 # Main UI : affichage calendrier (selectbox with on_change)
 # ---------------------------
 st.title("Gestionnaire de calendrier de congés")
 
-cols = st.columns(len(months_to_show))
-
-for idx, m in enumerate(months_to_show):
-    with cols[idx]:
-        st.subheader(f"{calendar.month_name[m.month]} {m.year}")
-        weeks = month_grid(m.year, m.month)
-        header_cols = st.columns(7)
-        for i, h in enumerate(HEADER_DAYS):
-            header_cols[i].markdown(f"**{h}**")
-        for week in weeks:
-            week_cols = st.columns(7)
-            for i, d in enumerate(week):
-                col = week_cols[i]
-                with col:
-                    if d.month != m.month:
-                        st.write("")
-                        continue
-                    code = get_code(d)
-                    date_str = display_date_str(d)
-                    day_name = weekday_fr(d)
-                    # determine display code: if FC but is_effective_cz -> show "FC" visually but will be counted as CZ
-                    display_code = code
-                    color = "#ffffff"
-                    if code == "TRA":
-                        color = "#f7f7f7"
-                    elif code == "ZZ":
-                        color = "#cfe8ff"
-                    elif code == "CX":
-                        color = "#ffd9b3"
-                    elif code == "CZ":
-                        color = "#ffb3b3"
-                    elif code == "C4":
-                        color = "#d1c4e9"
-                    elif code == "FC":
-                        color = "#ffef9f"
-                    st.markdown(
-                        f"<div style='background:{color};padding:8px;border-radius:6px'>"
-                        f"<div style='font-weight:600'>{date_str}</div>"
-                        f"<div style='color:#333'>{day_name}</div>"
-                        f"<div style='margin-top:6px;font-weight:700'>{display_code}</div>"
-                        f"</div>",
-                        unsafe_allow_html=True
-                    )
-                    # selectbox with callback
-                    key = f"sel_{d.isoformat()}"
-                    if key not in st.session_state:
-                        st.session_state[key] = code
-                    st.selectbox("", CODES, key=key, on_change=on_selectbox_change, args=(d.isoformat(),), label_visibility="collapsed")
+def grid_editor(frame, cells, key_prefix):
+    """Tableau éditable (une liste de codes par cellule) relié au callback on_grid_change."""
+    key = f"{key_prefix}_{st.session_state['grid_version']}"
+    options = list(CODE_LABELS.values())
+    st.data_editor(
+        frame,
+        key=key,
+        column_config={
+            column: st.column_config.SelectboxColumn(column, options=options, required=True)
+            for column in frame.columns
+        },
+        on_change=on_grid_change,
+        args=(key, cells),
+    )
+
+def month_frame(m: date):
+    """Mois en semaines (lignes) × jours dimanche -> samedi ; cellules hors mois vides."""
+    rows, index, cells = [], [], {}
+    for r, week in enumerate(month_grid(m.year, m.month)):
+        in_month = [d for d in week if d.month == m.month]
+        index.append(f"{in_month[0].day:02d} → {in_month[-1].day:02d}")
+        row = []
+        for header, d in zip(HEADER_DAYS, week):
+            if d.month == m.month:
+                code = get_code(d)
+                row.append(CODE_LABELS.get(code, code))
+                cells[(r, header)] = d
+            else:
+                row.append(None)
+        rows.append(row)
+    return pd.DataFrame(rows, index=index, columns=HEADER_DAYS), cells
+
+def year_frame(year):
+    """Année en mois (lignes) × jours 1 -> 31 ; un seul tableau pour les 12 mois."""
+    columns = [str(day) for day in range(1, 32)]
+    rows, cells = [], {}
+    for r, month in enumerate(range(1, 13)):
+        row = [None] * 31
+        for d in month_dates(year, month):
+            code = get_code(d)
+            row[d.day - 1] = CODE_LABELS.get(code, code)
+            cells[(r, str(d.day))] = d
+        rows.append(row)
+    index = [calendar.month_name[month] for month in range(1, 13)]
+    return pd.DataFrame(rows, index=index, columns=columns), cells
+
+def month_columns(months, per_row=3):
+    """(colonne, mois) : les mois sont rangés par lignes de `per_row` colonnes au plus."""
+    for row in range(0, len(months), per_row):
+        chunk = months[row:row + per_row]
+        yield from zip(st.columns(len(chunk)), chunk)
+
+if view_mode == "Cartes":
+    for col_month, m in month_columns(months_to_show):
+        with col_month:
+            st.subheader(f"{calendar.month_name[m.month]} {m.year}")
+            weeks = month_grid(m.year, m.month)
+            header_cols = st.columns(7)
+            for i, h in enumerate(HEADER_DAYS):
+                header_cols[i].markdown(f"**{h}**")
+            for week in weeks:
+                week_cols = st.columns(7)
+                for i, d in enumerate(week):
+                    col = week_cols[i]
+                    with col:
+                        if d.month != m.month:
+                            st.write("")
+                            continue
+                        code = get_code(d)
+                        date_str = display_date_str(d)
+                        day_name = weekday_fr(d)
+                        # FC compté comme CZ : reste affiché FC, avec le code effectif ; jours comptés encadrés
+                        display_code = effective_code_label(d, vacs, planning_range)
+                        color = CODE_COLORS.get(code, "#ffffff")
+                        border = "2px solid #333" if is_counted_absence(d, vacs, planning_range) else "2px solid transparent"
+                        st.markdown(
+                            f"<div style='background:{color};padding:8px;border-radius:6px;border:{border}'>"
+                            f"<div style='font-weight:600'>{date_str}</div>"
+                            f"<div style='color:#333'>{day_name}</div>"
+                            f"<div style='margin-top:6px;font-weight:700'>{display_code}</div>"
+                            f"</div>",
+                            unsafe_allow_html=True
+                        )
+                        # selectbox with callback
+                        key = f"sel_{d.isoformat()}"
+                        if key not in st.session_state:
+                            st.session_state[key] = code
+                        st.selectbox("", CODES, key=key, on_change=on_selectbox_change, args=(d.isoformat(),), label_visibility="collapsed")
+elif view_mode == "Grille":
+    for col_month, m in month_columns(months_to_show):
+        with col_month:
+            st.subheader(f"{calendar.month_name[m.month]} {m.year}")
+            frame, cells = month_frame(m)
+            grid_editor(frame, cells, f"grid_{m.year}_{m.month:02d}")
+else:
+    st.subheader(f"Année {sel_year}")
+    frame, cells = year_frame(sel_year)
+    grid_editor(frame, cells, f"year_{sel_year}")
 
 st.markdown("---")
 
-# After rendering, if any change occurred, reapply rules, save and rerun once (safe)
-if st.session_state.get("needs_rerun", False):
-    apply_business_rules(months_to_show)
-    save_state(state)
-    st.session_state["needs_rerun"] = False
-    safe_rerun()
+metrics.lap("render")
 
 # ---------------------------
 # Metrics and optimisation
 # ---------------------------
-total_abs, abs_days = total_absence_for_scope(months_to_show)
+total_abs, abs_days = total_absence_for_scope(planning_range)
+metrics.lap("totals")
 st.sidebar.markdown(f"**Total absence (VACS + ZZ collés)** : **{total_abs}** jours")
+if vacs_reaches_edge(abs_days, planning_range):
+    st.sidebar.warning(
+        f"La VACS touche un bord de la période ({display_date_str(planning_range.start)} → "
+        f"{display_date_str(planning_range.end)}) : élargissez la période pour la compter en entier."
+    )
+
+def candidate_summary(candidate):
+    days = [f"CX {d.strftime('%d/%m')}" for d in candidate.placed_cx] + [f"C4 {d.strftime('%d/%m')}" for d in candidate.placed_c4]
+    return f"{candidate.total} jours : {', '.join(days) or 'rien à poser'}"
+
+def on_apply_candidate():
+    """Callback : pose le plan choisi parmi les résultats de la recherche."""
+    run_recorder()
+    with metrics.phase("callback"):
+        _, scope, candidates = st.session_state["search_results"]
+        candidate = candidates[st.session_state["search_choice"]]
+        place_days(candidate.placed_cx, candidate.placed_c4, scope)
+
+def on_apply_team_plan():
+    """
+    Callback : pose les jours du planning d'équipe dans le calendrier de chaque employé, si
+    aucun calendrier de l'équipe n'a changé depuis le lancement.
+    """
+    run_recorder()
+    with metrics.phase("callback"):
+        scope, team, result = st.session_state.pop("team_results")
+        current = team_for_scope(scope)
+        if current.employees != team.employees or not np.array_equal(current.codes, team.codes):
+            st.session_state["team_stale"] = True
+            return
+        for k, member in enumerate(team.employees):
+            days = {**{d: "CX" for d in result.placed_cx[k]}, **{d: "C4" for d in result.placed_c4[k]}}
+            if days:
+                storage.with_employee(member.name).write(days, months_added=sorted({(d.year, d.month) for d in days}))
+
+def on_reset_months(months):
+    """Callback : vide les mois affichés ; le rerun qui suit les réinitialise (defaults et règles)."""
+    run_recorder()
+    with metrics.phase("callback"):
+        for m in months:
+            state["data"].clear_month(m.year, m.month)
+        save_state(state)
+
+def on_apply_stale_job():
+    """Callback : pose malgré tout un plan calculé sur une version antérieure du calendrier."""
+    run_recorder()
+    with metrics.phase("callback"):
+        _, scope, result = st.session_state.pop("stale_job")
+        place_days(result.placed_cx, result.placed_c4, scope)
 
 if optimize_btn:
-    with st.spinner("Optimisation en cours..."):
-        final_cnt, placed_cx, placed_c4, final_days = optimize_placement(months_to_show, cx_quota, c4_quota)
-    st.success(f"Optimisation terminée. Jours d'absence totaux : {final_cnt}")
-    if placed_cx:
-        st.sidebar.markdown(f"CX placés : {', '.join([d.strftime('%d/%m/%Y') for d in placed_cx])}")
-    if placed_c4:
-        st.sidebar.markdown(f"C4 placés : {', '.join([d.strftime('%d/%m/%Y') for d in placed_c4])}")
-    apply_business_rules(months_to_show)
-    save_state(state)
-    safe_rerun()
+    anytime = OPTIMIZE_METHODS[optimize_method] == "anytime"
+    start_optimization(
+        planning_range, optimize_method, cx_quota, c4_quota,
+        float(search_budget) if anytime else 3.0, int(search_k) if anytime else 5, int(optimize_workers),
+    )
+for level, message in job_messages:
+    getattr(st, level)(message)
+
+stale_job = st.session_state.get("stale_job")
+if stale_job is not None and stale_job[:2] == (employee, planning_range):
+    st.button("Poser quand même le plan trouvé", on_click=on_apply_stale_job)
+
+@st.fragment(run_every=1.0)
+def jobs_panel():
+    """Avancement des optimisations de la session, rafraîchi chaque seconde sans recharger la page."""
+    queue = job_queue()
+    jobs = session_jobs()
+    if any(not job.active and job_matches(job, planning_range) for job in jobs):
+        st.rerun()  # une tâche vient de finir : la page entière reprend son résultat
+    for job in jobs:
+        if job.status == RUNNING:
+            st.progress(job.progress, text=f"{job.description} : {job.message}")
+        elif job.status == QUEUED:
+            st.caption(f"{job.description} : en attente (position {queue.position(job)} dans la file)")
+        else:
+            st.caption(f"{job.description} : {job.status} (résultat repris à l'affichage de ce calendrier)")
+        if job.active:
+            st.button("Annuler", key=f"cancel_job_{job.id}", on_click=queue.cancel, args=(job.id,))
+
+if any(job.active for job in session_jobs()):
+    st.markdown("### Optimisations en cours")
+    jobs_panel()
+metrics.lap("optimize")
+
+search_results = st.session_state.get("search_results")
+if search_results is not None and search_results[:2] == (employee, planning_range):
+    candidates = search_results[2]
+    st.markdown("### Plans proposés")
+    st.radio(
+        "Plans proposés", range(len(candidates)), key="search_choice",
+        format_func=lambda k: f"{k + 1}. {candidate_summary(candidates[k])}",
+        label_visibility="collapsed",
+    )
+    st.button("Appliquer ce plan", on_click=on_apply_candidate)
 
 # Save / reset controls
 col_save, col_reset = st.columns([1,1])
@@ -587,18 +824,139 @@ with col_save:
         save_state(state)
         st.success("État sauvegardé.")
 with col_reset:
-    if st.button("Réinitialiser mois affiché"):
-        for m in months_to_show:
-            key = month_key(m.year, m.month)
-            if key in state["data"]:
-                state["data"].pop(key, None)
-        save_state(state)
-        safe_rerun()
+    st.button("Réinitialiser mois affiché", on_click=on_reset_months, args=(months_to_show,))
 
 # Détail jours d'absence
 if abs_days:
     st.markdown("### Détails jours d'absence liés à la période VACS")
-    df = pd.DataFrame({"date": [d.strftime("%d/%m/%Y") for d in abs_days], "jour": [weekday_fr(d) for d in abs_days], "code": [get_code(d) for d in abs_days]})
+    df = pd.DataFrame({"date": [d.strftime("%d/%m/%Y") for d in abs_days], "jour": [weekday_fr(d) for d in abs_days], "code": [effective_code_label(d, vacs, planning_range) for d in abs_days]})
     st.table(df)
 
+# ---------------------------
+# Vue équipe
+# ---------------------------
+with st.expander("Équipe : jours d'absence sur la période"):
+    team = team_for_scope(planning_range)
+    team_totals, _ = absence_bulk(team)
+    st.table(pd.DataFrame({
+        "employé": [e.name or "Calendrier principal" for e in team.employees],
+        "jours d'absence": team_totals,
+    }))
+
+    st.markdown("**Planning d'équipe sous effectif minimum**")
+    st.caption(
+        "Pose les compteurs CX/C4 de la barre latérale pour chaque employé en gardant chaque jour "
+        "au moins l'effectif demandé en TRA."
+    )
+    col_staff, col_fairness = st.columns(2)
+    with col_staff:
+        team_min_staff = st.number_input(
+            "Effectif TRA minimum par jour", min_value=0, max_value=max(len(team.employees), 1), value=0, step=1,
+        )
+    with col_fairness:
+        team_fairness = st.slider(
+            "Équité", min_value=0.0, max_value=0.9, value=0.0, step=0.1,
+            help="0 : le plus de jours d'absence au total ; plus haut : les jours sont mieux répartis entre employés.",
+        )
+    if not is_default_ruleset():
+        st.caption(f"Indisponible avec les règles {active_ruleset().name!r} : le planning d'équipe repose sur "
+                   "l'optimisation exacte, qui suppose l'accord par défaut.")
+    # callback : la tâche est lancée avant le rerun, dont le suivi (plus haut dans la page) l'affiche
+    st.button(
+        "Proposer un planning d'équipe", on_click=start_team_optimization, disabled=not is_default_ruleset(),
+        args=(planning_range, cx_quota, c4_quota, int(team_min_staff), float(team_fairness)),
+    )
+    if st.session_state.pop("team_stale", False):
+        st.warning("Un calendrier de l'équipe a changé depuis le calcul : planning d'équipe non posé, relancez-le.")
+    team_results = st.session_state.get("team_results")
+    if team_results is not None and team_results[0] == planning_range:
+        _, proposed_team, proposed = team_results
+        st.table(pd.DataFrame({
+            "employé": [e.name or "Calendrier principal" for e in proposed_team.employees],
+            "jours d'absence": proposed.totals,
+            "sans contrainte": proposed.bounds,
+            "jours posés": [
+                ", ".join([f"CX {d.strftime('%d/%m')}" for d in cx] + [f"C4 {d.strftime('%d/%m')}" for d in c4])
+                for cx, c4 in zip(proposed.placed_cx, proposed.placed_c4)
+            ],
+        }))
+        short = int((proposed.staff < proposed.min_staff).sum())
+        if short:
+            st.caption(f"{short} jours sont déjà sous l'effectif minimum sans aucun congé posé.")
+        st.button("Poser ce planning pour toute l'équipe", on_click=on_apply_team_plan)
+
+# ---------------------------
+# Simulation des réglages ZZ / parité
+# ---------------------------
+with st.expander("Simulation : comparer les réglages ZZ / parité"):
+    st.caption(
+        "Total atteignable (CX/C4 des compteurs posés au mieux) sur la période, pour chaque "
+        "combinaison de jours ZZ et de parité, calculé en une seule passe."
+    )
+    col_parity, col_sizes, col_fixed = st.columns(3)
+    with col_parity:
+        whatif_parities = st.multiselect("Parité", ("Paires", "Impaires"), default=["Paires", "Impaires"])
+    with col_sizes:
+        whatif_sizes = st.multiselect("Jours ZZ par semaine", (2, 3), default=[2, 3])
+    with col_fixed:
+        whatif_fixed = st.radio("Sélections explorées", ("Les deux", "ZZ paires seulement", "ZZ impaires seulement"))
+    if not is_default_ruleset():
+        st.caption(f"Indisponible avec les règles {active_ruleset().name!r} : le total atteignable suppose l'accord par défaut.")
+    if st.button("Comparer les réglages", disabled=not is_default_ruleset()) and whatif_parities and whatif_sizes:
+        configs = configurations(
+            tuple(whatif_parities), tuple(whatif_sizes),
+            zz_odd=zz_odd if whatif_fixed == "ZZ paires seulement" else None,
+            zz_even=zz_even if whatif_fixed == "ZZ impaires seulement" else None,
+        )
+        with st.spinner(f"Simulation de {len(configs)} configurations..."):
+            rows = what_if(plan_from_state(planning_range), cx_quota, c4_quota, configs)
+        current_key = (set(zz_odd), set(zz_even), parity_choice)
+        rank = next(
+            (k for k, r in enumerate(rows, start=1) if (set(r.zz_odd), set(r.zz_even), r.parity_choice) == current_key),
+            None,
+        )
+        if rank is not None:
+            st.markdown(f"Réglages actuels : rang **{rank}** sur {len(rows)} ({rows[rank - 1].achievable} jours atteignables).")
+        st.dataframe(pd.DataFrame({
+            "atteignable": [r.achievable for r in rows[:50]],
+            "actuel": [r.current for r in rows[:50]],
+            "parité": [r.parity_choice for r in rows[:50]],
+            "ZZ impaires": [", ".join(r.zz_odd) for r in rows[:50]],
+            "ZZ paires": [", ".join(r.zz_even) for r in rows[:50]],
+        }, index=range(1, min(len(rows), 50) + 1)))
+    metrics.lap("what_if")
+
 st.markdown("**Légende** : TRA = Jour travaillé; ZZ = Repos habituel; CX = Congé posé; CZ = Congé généré; C4 = Congé supplémentaire; FC = Jour férié.")
+metrics.lap("tables")
+
+# ---------------------------
+# Diagnostics
+# ---------------------------
+st.sidebar.markdown("---")
+st.sidebar.checkbox("Diagnostics (temps et compteurs par rerun)", key="diagnostics")
+if recorder is not None:
+    record = metrics.finish(
+        recorder, METRICS_FILE, METRICS_PROM_FILE,
+        employee=employee, view=view_mode, days=len(planning_range),
+    )
+    del st.session_state["_metrics_run"]
+    metrics.install(None)
+    if st.session_state.get("diagnostics"):
+        with st.sidebar.expander("Diagnostics du rerun", expanded=True):
+            st.table(pd.DataFrame(
+                {"phase": list(record["phases_ms"]), "ms": list(record["phases_ms"].values())}
+            ))
+            st.table(pd.DataFrame(
+                {"compteur": list(record["counters"]), "valeur": list(record["counters"].values())}
+            ))
+            cache_stats = evaluations.stats()
+            st.caption(
+                f"Cache d'évaluations : {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                f"{cache_stats['size']}/{cache_stats['maxsize']} entrées"
+            )
+            disk_stats = result_cache().stats()
+            st.caption(
+                f"Cache des résultats ({disk_stats['path']}) : {disk_stats['entries']} entrées, "
+                f"{disk_stats['bytes'] / 2**20:.1f}/{disk_stats['max_bytes'] / 2**20:.0f} Mo"
+            )
+            st.caption(f"Journal : {METRICS_FILE} ; cumuls Prometheus : {METRICS_PROM_FILE}")
@@ -0,0 +1,20 @@
+"""Règles de calcul du calendrier de congés, utilisables sans Streamlit."""
+from planning.rules import (
+    CODES,
+    WEEKDAYS_FR,
+    Plan,
+    apply_rules,
+    evaluate_plan,
+    vacs_days_from,
+    week_is_three_zz,
+)
+
+__all__ = [
+    "CODES",
+    "WEEKDAYS_FR",
+    "Plan",
+    "apply_rules",
+    "evaluate_plan",
+    "vacs_days_from",
+    "week_is_three_zz",
+]
@@ -0,0 +1,220 @@
+"""
+Replanification par lots, sans Streamlit.
+
+Lit des calendriers, pose les CX/C4 de chacun sur la période demandée (en parallèle) et écrit
+les résultats. Entrées acceptées :
+- .json : un calendar_state.json (nom = nom du fichier) ou une liste de tels objets portant
+  chacun une clé "employee" ;
+- .csv : colonnes employee,day,code (jour ISO) ; réglages ZZ/parité pris des options ;
+- .db : tous les employés d'une base SqliteCalendar.
+Sortie .json (résultats et calendriers replanifiés) ou .csv (un résumé par calendrier).
+Avec --cache, les placements déjà calculés (par l'application ou un lot précédent) sont lus dans
+le cache disque planning.result_cache et les nouveaux y sont enregistrés.
+
+    python -m planning.batch equipe.db --start 2026-01-01 --end 2026-12-31 --cx 3 -o resultats.csv
+"""
+import argparse
+import csv
+from datetime import date
+import json
+import os
+import sys
+
+from planning.optimize import METHODS, optimize_plan, placed_result
+from planning.parallel import map_in_order
+from planning.result_cache import ResultCache, result_key
+from planning.rules import WEEKDAYS_FR, Plan
+
+DEFAULT_SETTINGS = {"zz_odd": ["samedi", "dimanche"], "zz_even": ["samedi", "dimanche"], "parity_choice": "Paires"}
+
+
+# ---------------------------
+# Lecture des calendriers
+# ---------------------------
+def _calendar_days(state_obj):
+    """{jour: code} d'un objet au format calendar_state.json."""
+    return {
+        date.fromisoformat(iso): code
+        for month_data in state_obj.get("data", {}).values()
+        for iso, code in month_data.items()
+    }
+
+
+def read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            content = json.load(f)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"{path} est illisible ({exc}) : fichier corrompu ?") from exc
+    if isinstance(content, dict):
+        content = [{"employee": os.path.splitext(os.path.basename(path))[0], **content}]
+    return [(item.get("employee", ""), _calendar_days(item), item.get("settings", {})) for item in content]
+
+
+def read_csv(path):
+    calendars = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            days = calendars.setdefault(row["employee"], {})
+            days[date.fromisoformat(row["day"])] = row["code"] or None
+    return [(name, days, {}) for name, days in calendars.items()]
+
+
+def read_database(path):
+    from planning.storage import SqliteCalendar
+
+    db = SqliteCalendar(path)
+    calendars = []
+    for name, settings in db.read_all_settings().items():
+        employee_db = db.with_employee(name)
+        calendars.append((name, _calendar_days(employee_db.export_json()), settings))
+    db.close()
+    return calendars
+
+
+READERS = {".json": read_json, ".csv": read_csv, ".db": read_database}
+
+
+def read_calendars(paths):
+    """Liste (nom, {jour: code}, réglages) de tous les calendriers des fichiers."""
+    calendars = []
+    for path in paths:
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise ValueError(f"{path} : format non reconnu (attendu : {', '.join(READERS)})")
+        calendars.extend(reader(path))
+    return calendars
+
+
+def make_plan(days, settings, start: date, end: date, holidays):
+    settings = {**DEFAULT_SETTINGS, **settings}
+    return Plan(
+        start=start,
+        codes=tuple(days.get(date.fromordinal(o)) for o in range(start.toordinal(), end.toordinal() + 1)),
+        holidays=holidays,
+        zz_odd=tuple(settings["zz_odd"]),
+        zz_even=tuple(settings["zz_even"]),
+        parity_choice=settings["parity_choice"],
+    )
+
+
+# ---------------------------
+# Optimisation et écriture
+# ---------------------------
+def _optimize_job(job):
+    name, plan, cx_quota, c4_quota, method = job
+    return name, optimize_plan(plan, cx_quota, c4_quota, method)
+
+
+def optimize_calendars(calendars, start, end, cx_quota, c4_quota, method="exact", workers=1, holidays=frozenset(),
+                       cache=None):
+    """
+    Optimise chaque calendrier (nom, jours, réglages) ; retourne [(nom, OptimizeResult)] dans l'ordre.
+    `cache` (ResultCache) est lu et complété par ce processus, les calculs restants sont répartis.
+    """
+    jobs = [
+        (name, make_plan(days, settings, start, end, holidays), cx_quota, c4_quota, method)
+        for name, days, settings in calendars
+    ]
+    if cache is None:
+        return map_in_order(_optimize_job, jobs, workers)
+    keys = [result_key(method, plan, cx_quota, c4_quota) for _, plan, _, _, _ in jobs]
+    placements, missing = {}, {}  # clé -> (positions CX, positions C4) ; clé absente -> premier calendrier qui la porte
+    for k, key in enumerate(keys):
+        if key in placements or key in missing:
+            continue
+        hit = cache.get(key)
+        if hit is None:
+            missing[key] = k
+        else:
+            placements[key] = hit[1:]
+    for key, (_, result) in zip(missing, map_in_order(_optimize_job, [jobs[k] for k in missing.values()], workers)):
+        plan = jobs[missing[key]][1]
+        placements[key] = [plan.index(d) for d in result.placed_cx], [plan.index(d) for d in result.placed_c4]
+        cache.put(key, result.total if method == "exact" else None, *placements[key])  # total du plan exact = optimum
+    results = []
+    for (name, plan, _, _, _), key in zip(jobs, keys):
+        cx_positions, c4_positions = placements[key]
+        results.append((name, placed_result(plan, [plan.day(i) for i in cx_positions], [plan.day(i) for i in c4_positions])))
+    return results
+
+
+def write_results(results, out):
+    """Écrit les résultats dans le fichier `out` (.json ou .csv) ; "-" = CSV sur la sortie standard."""
+    if out.endswith(".json"):
+        payload = []
+        for name, result in results:
+            data = {}
+            for d, code in zip(result.plan.dates(), result.plan.codes):
+                if code is not None:
+                    data.setdefault(f"{d.year:04d}-{d.month:02d}", {})[d.isoformat()] = code
+            payload.append({
+                "employee": name,
+                "total": result.total,
+                "placed_cx": [d.isoformat() for d in result.placed_cx],
+                "placed_c4": [d.isoformat() for d in result.placed_c4],
+                "data": data,
+            })
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        return
+    f = sys.stdout if out == "-" else open(out, "w", newline="", encoding="utf-8")
+    try:
+        writer = csv.writer(f)
+        writer.writerow(["employee", "total", "placed_cx", "placed_c4"])
+        for name, result in results:
+            writer.writerow([
+                name,
+                result.total,
+                " ".join(d.isoformat() for d in result.placed_cx),
+                " ".join(d.isoformat() for d in result.placed_c4),
+            ])
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replanification par lots des calendriers de congés.")
+    parser.add_argument("inputs", nargs="+", help="fichiers .json, .csv ou .db")
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="premier jour (AAAA-MM-JJ)")
+    parser.add_argument("--end", type=date.fromisoformat, required=True, help="dernier jour inclus (AAAA-MM-JJ)")
+    parser.add_argument("--cx", type=int, default=3, help="compteur CX")
+    parser.add_argument("--c4", type=int, default=0, help="compteur C4")
+    parser.add_argument("--method", choices=METHODS, default="exact")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processus en parallèle")
+    parser.add_argument("--zz-odd", nargs="+", choices=WEEKDAYS_FR, help="jours ZZ des semaines impaires (CSV)")
+    parser.add_argument("--zz-even", nargs="+", choices=WEEKDAYS_FR, help="jours ZZ des semaines paires (CSV)")
+    parser.add_argument("--parity", choices=("Paires", "Impaires"), help="semaines à 3 ZZ (CSV)")
+    parser.add_argument("-o", "--output", default="-", help="fichier .json ou .csv (défaut : CSV sur la sortie standard)")
+    parser.add_argument("--cache", help="cache disque des résultats (voir planning.result_cache), ex. optimization_cache.db")
+    args = parser.parse_args(argv)
+    if args.end < args.start:
+        parser.error("--end doit être postérieur à --start")
+
+    overrides = {
+        key: value
+        for key, value in (("zz_odd", args.zz_odd), ("zz_even", args.zz_even), ("parity_choice", args.parity))
+        if value is not None
+    }
+    try:
+        calendars = [
+            (name, days, {**overrides, **settings}) for name, days, settings in read_calendars(args.inputs)
+        ]
+    except (OSError, ValueError, KeyError) as exc:
+        parser.error(f"lecture impossible : {exc}")
+
+    from planning.calendar_meta import french_holidays
+
+    holidays = frozenset().union(*(french_holidays(y) for y in range(args.start.year, args.end.year + 1)))
+    cache = ResultCache(args.cache) if args.cache else None
+    results = optimize_calendars(
+        calendars, args.start, args.end, args.cx, args.c4, args.method, args.workers, holidays, cache
+    )
+    if cache is not None:
+        cache.close()
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
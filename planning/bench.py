@@ -0,0 +1,233 @@
+"""
+Banc d'essai des règles, de l'évaluation et des optimiseurs, sans Streamlit.
+
+Les calendriers sont synthétiques et tirés d'une graine fixe : deux exécutions mesurent
+exactement les mêmes cas. Pour chaque cas (période de 1, 2, 12 ou 36 mois, compteurs CX/C4,
+densité de jours fériés, parité) on relève le temps (meilleur de plusieurs répétitions), le
+nombre d'évaluations de plan et le pic mémoire (tracemalloc, mesuré à part).
+Le temps est aussi exprimé en unités de calibrate, un travail Python fixe qui n'appelle aucun
+moteur, mesuré juste avant et juste après chaque cas (l'unité du cas est la moyenne des deux) :
+c'est ce temps relatif que --compare confronte à la référence, qui reste ainsi valable d'une
+machine à l'autre et suit les variations de vitesse d'une même machine pendant la mesure. La
+référence enregistrée est à régénérer (--save) dans chaque changement d'un moteur.
+apply_rules / evaluate_plan ont les mêmes règles qu'apply_business_rules /
+total_absence_for_scope dans Conge.py.
+
+    python -m planning.bench --save bench_baseline.json
+    python -m planning.bench --compare bench_baseline.json
+"""
+import argparse
+import gc
+from contextlib import contextmanager
+from datetime import date, timedelta
+import itertools
+import io
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from planning import metrics
+from planning.cache import evaluations
+from planning.optimize import exact_placement, greedy_placement
+from planning.rules import Plan, apply_rules, evaluate_plan
+from planning.scope import DateRange
+
+SCOPES = (1, 2, 12, 36)
+QUOTAS = ((3, 0), (5, 2), (10, 4))
+HOLIDAYS = ("aucun", "france", "dense")
+PARITIES = ("Paires", "Impaires")
+OPS = ("rules", "total", "exact", "greedy")
+START = date(2026, 1, 1)
+
+
+# ---------------------------
+# Calendriers synthétiques
+# ---------------------------
+def make_holidays(kind, scope: DateRange, rng):
+    if kind == "aucun":
+        return frozenset()
+    if kind == "dense":
+        return frozenset(d for d in scope.dates() if rng.random() < 0.1)
+    from planning.calendar_meta import french_holidays
+
+    return frozenset(d for year in range(scope.start.year, scope.end.year + 1) for d in french_holidays(year)
+                     if d in scope)
+
+
+def make_plan(months, holidays_kind, parity, seed=0):
+    """Plan de `months` mois : quelques CX/C4 posés à la main, le reste non renseigné ou TRA."""
+    rng = random.Random(f"{seed}-{months}-{holidays_kind}-{parity}")
+    last = START.month - 1 + months - 1
+    scope = DateRange.from_months([START, date(START.year + last // 12, last % 12 + 1, 1)])
+    codes = tuple(rng.choice((None, None, None, None, "TRA", "CX", "C4")) if rng.random() < 0.15 else None
+                  for _ in scope.dates())
+    return Plan(
+        start=scope.start,
+        codes=codes,
+        holidays=make_holidays(holidays_kind, scope, rng),
+        zz_odd=("lundi", "samedi", "dimanche"),  # 3 ZZ en semaine impaire : la parité compte
+        zz_even=("samedi", "dimanche"),
+        parity_choice=parity,
+    )
+
+
+# ---------------------------
+# Mesures
+# ---------------------------
+@contextmanager
+def counting_evaluations():
+    """Compte les évaluations de plan (compteur "evaluations" de planning.metrics) pendant le bloc."""
+    previous = metrics.current()
+    recorder = metrics.Recorder()
+    metrics.install(recorder)
+    try:
+        yield recorder.counters
+    finally:
+        metrics.install(previous)
+
+
+def run_op(op, plan, cx_quota, c4_quota):
+    evaluations.clear()  # chaque mesure part d'un cache d'évaluations vide
+    if op == "rules":
+        apply_rules(plan)
+    elif op == "total":
+        evaluate_plan(plan)
+    elif op == "exact":
+        exact_placement(plan, cx_quota, c4_quota)
+    else:
+        greedy_placement(plan, cx_quota, c4_quota)
+
+
+def calibrate(repeat=10):
+    """Durée (meilleure de `repeat`) d'un travail Python fixe, indépendant des moteurs."""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        start, counts = date(2026, 1, 1), {}
+        for i in range(2_000):
+            d = start + timedelta(days=i % 730)
+            counts[d] = counts.get(d, 0) + d.isocalendar()[1] % 2
+        sorted(counts.items())
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure(op, plan, cx_quota, c4_quota, repeat, budget=0.2):
+    with counting_evaluations() as counters:
+        run_op(op, plan, cx_quota, c4_quota)
+    evaluations = counters["evaluations"]
+    before = calibrate()
+    timings = []
+    gc.disable()  # comme timeit : le ramasse-miettes ne doit pas tomber au hasard dans une mesure
+    try:
+        # au moins `repeat` répétitions, plus tant que les cas courts n'ont pas rempli `budget` secondes
+        while len(timings) < repeat or (sum(timings) < budget and len(timings) < 50):
+            t0 = time.perf_counter()
+            run_op(op, plan, cx_quota, c4_quota)
+            timings.append(time.perf_counter() - t0)
+    finally:
+        gc.enable()
+    unit = (before + calibrate()) / 2
+    tracemalloc.start()
+    run_op(op, plan, cx_quota, c4_quota)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(timings), "units": min(timings) / unit, "evaluations": evaluations,
+            "peak_kib": round(peak / 1024, 1)}
+
+
+def cases(scopes, ops, quotas):
+    """(identifiant, opération, mois, fériés, parité, cx, c4) ; les compteurs ne varient que pour les optimiseurs."""
+    for months, holidays_kind, parity, op in itertools.product(scopes, HOLIDAYS, PARITIES, ops):
+        for cx_quota, c4_quota in (quotas if op in ("exact", "greedy") else quotas[:1]):
+            case_id = f"{op}/{months}m/{holidays_kind}/{parity}"
+            if op in ("exact", "greedy"):
+                case_id += f"/cx={cx_quota},c4={c4_quota}"
+            yield case_id, op, months, holidays_kind, parity, cx_quota, c4_quota
+
+
+def run_suite(scopes=SCOPES, ops=OPS, quotas=QUOTAS, repeat=3, out=sys.stdout, only=None, budget=0.2):
+    """Mesure les cas (seulement ceux de `only` si donné)."""
+    results = {}
+    for case_id, op, months, holidays_kind, parity, cx_quota, c4_quota in cases(scopes, ops, quotas):
+        if only is not None and case_id not in only:
+            continue
+        plan = make_plan(months, holidays_kind, parity)
+        # un tiers des répétitions (une par défaut) pour les cas lents (glouton sur plusieurs années)
+        reps = max(1, repeat // 3) if op == "greedy" and months >= 12 else repeat
+        results[case_id] = measure(op, plan, cx_quota, c4_quota, reps, budget)
+        r = results[case_id]
+        print(f"{case_id:45s} {r['seconds'] * 1000:10.2f} ms {r['units']:9.3f} u {r['evaluations']:8d} éval. "
+              f"{r['peak_kib']:10.1f} Kio", file=out)
+    return results
+
+
+# ---------------------------
+# Références et régressions
+# ---------------------------
+def compare(results, baseline, tolerance=0.25, min_seconds=0.005, memory_tolerance=0.25, min_kib=64):
+    """
+    Cas en régression : temps relatif (unités de calibrate) plus grand que celui de la référence
+    de plus de `tolerance` (et d'au moins `min_seconds` une fois ramené à cette machine), pic
+    mémoire plus grand de plus de `memory_tolerance` (et d'au moins `min_kib` Kio), ou plus
+    d'évaluations de plan.
+    """
+    regressions = []
+    for case_id, r in results.items():
+        b = baseline.get(case_id)
+        if b is None:
+            continue
+        expected = b["units"] * r["seconds"] / r["units"]  # temps de la référence sur cette machine
+        slower = r["units"] > b["units"] * (1 + tolerance) and r["seconds"] - expected > min_seconds
+        heavier = r["peak_kib"] > b["peak_kib"] * (1 + memory_tolerance) and r["peak_kib"] - b["peak_kib"] > min_kib
+        if slower or heavier or r["evaluations"] > b["evaluations"]:
+            regressions.append((case_id, b, r))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai du moteur de règles et des optimiseurs.")
+    parser.add_argument("--scopes", type=int, nargs="+", default=list(SCOPES), help="longueurs de période en mois")
+    parser.add_argument("--ops", nargs="+", choices=OPS, default=list(OPS))
+    parser.add_argument("--repeat", type=int, default=3, help="répétitions par cas (meilleur temps retenu)")
+    parser.add_argument("--save", help="écrit les résultats comme référence (JSON)")
+    parser.add_argument("--compare", help="référence JSON à comparer ; code de sortie 1 en cas de régression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="ralentissement relatif toléré (0.25 = +25 %%)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="hausse tolérée du pic mémoire")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.scopes, args.ops, QUOTAS, args.repeat)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "calibration_seconds": calibrate(), "results": results},
+                      f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance, memory_tolerance=args.memory_tolerance)
+        # une machine partagée ralentit des cas au hasard : un ralentissement doit se confirmer
+        # sur de nouvelles mesures (plus longues) avant d'être signalé
+        for _ in range(2):
+            if not regressions:
+                break
+            suspects = {case_id for case_id, _, _ in regressions}
+            again = run_suite(args.scopes, args.ops, QUOTAS, args.repeat * 3, io.StringIO(), suspects, budget=1.0)
+            for case_id, r in again.items():
+                if r["units"] < results[case_id]["units"]:
+                    results[case_id] = r
+            regressions = compare(results, baseline, args.tolerance, memory_tolerance=args.memory_tolerance)
+        for case_id, b, r in regressions:
+            print(f"RÉGRESSION {case_id} : {b['units']:.3f} -> {r['units']:.3f} u, "
+                  f"{b['peak_kib']:.1f} -> {r['peak_kib']:.1f} Kio, {b['evaluations']} -> {r['evaluations']} évaluations")
+        if regressions:
+            sys.exit(1)
+        print(f"Aucune régression sur {len(results)} cas.")
+
+
+if __name__ == "__main__":
+    main()
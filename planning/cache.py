@@ -0,0 +1,91 @@
+"""
+Cache des évaluations de plan.
+
+La clé est une empreinte compacte (16 octets, blake2b) des codes de la plage, de son début, des
+jours fériés et des réglages ZZ/parité : deux plans identiques partagent leur évaluation,
+quelle que soit la session ou l'appelant (optimiseur, total de la barre latérale, détail des
+jours). Taille bornée, éviction du moins récemment utilisé ; hits/misses comptés ici et dans
+planning.metrics.
+"""
+from collections import OrderedDict
+import functools
+import hashlib
+import io
+import pickle
+import threading
+
+from planning import metrics
+from planning.rules import Plan, evaluate_final, evaluate_plan
+
+DEFAULT_MAXSIZE = 4096
+
+
+@functools.lru_cache(maxsize=256)
+def _settings_digest(start, zz_odd, zz_even, parity_choice, holidays):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{start.isoformat()}|{','.join(zz_odd)}|{','.join(zz_even)}|{parity_choice}|".encode())
+    h.update(",".join(sorted(d.isoformat() for d in holidays)).encode())
+    return h.digest()
+
+
+def fingerprint(plan: Plan, kind=b"r"):
+    """
+    Empreinte (16 octets) du plan : codes, début de plage, jours fériés, réglages ZZ/parité.
+    `kind` distingue les évaluations avec règles (b"r") et sur codes finaux (b"f").
+    """
+    h = hashlib.blake2b(kind, digest_size=16)
+    h.update(_settings_digest(plan.start, plan.zz_odd, plan.zz_even, plan.parity_choice, plan.holidays))
+    buf = io.BytesIO()
+    pickler = pickle.Pickler(buf, protocol=5)
+    pickler.fast = True  # sans mémo : deux codes égaux sont sérialisés pareil, quelle que soit leur identité
+    pickler.dump(plan.codes)
+    h.update(buf.getbuffer())
+    return h.digest()
+
+
+class EvaluationCache:
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key, compute, plan):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if entry is not None:
+            metrics.count("eval_cache_hits")
+            return entry[0], list(entry[1])
+        count, days = compute(plan)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (count, tuple(days))
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        metrics.count("eval_cache_misses")
+        return count, days
+
+    def evaluate(self, plan: Plan):
+        """evaluate_plan(plan), mis en cache."""
+        return self._get(fingerprint(plan, b"r"), evaluate_plan, plan)
+
+    def evaluate_final(self, plan: Plan):
+        """evaluate_final(plan) (codes déjà finaux), mis en cache."""
+        return self._get(fingerprint(plan, b"f"), evaluate_final, plan)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+# cache partagé du processus (toutes les sessions Streamlit, tous les appelants)
+evaluations = EvaluationCache()
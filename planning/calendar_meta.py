@@ -0,0 +1,87 @@
+"""
+Tables calendaires précalculées par année.
+
+YearCalendar regroupe les faits qui ne dépendent que de l'année (jour de semaine, parité ISO,
+jours fériés) ; YearRules y ajoute ce qui dépend des réglages ZZ/parité (jour ZZ par défaut,
+semaine 3-ZZ, code par défaut). Les tables sont indexées par jour de l'année
+(d.toordinal() - start) et sont immuables, donc partageables entre sessions.
+"""
+import calendar
+from datetime import date, timedelta
+import functools
+from typing import NamedTuple
+
+from planning.rules import WEEKDAYS_FR
+
+
+class YearCalendar(NamedTuple):
+    year: int
+    start: int  # ordinal du 1er janvier
+    weekday: tuple  # 0 = lundi
+    week_even: tuple
+    holiday: tuple
+
+    def index(self, d: date):
+        return d.toordinal() - self.start
+
+
+class YearRules(NamedTuple):
+    calendar: YearCalendar
+    zz_day: tuple  # jour ZZ d'après la sélection de sa semaine
+    three_zz: tuple  # semaine à 3 ZZ
+    default_code: tuple  # "FC" (férié), "ZZ" ou None (TRA / code posé conservé)
+
+    def index(self, d: date):
+        return d.toordinal() - self.calendar.start
+
+
+@functools.lru_cache(maxsize=None)
+def month_grid(year, month):
+    """Semaines du mois (dimanche -> samedi), jours des mois voisins inclus."""
+    cal = calendar.Calendar(firstweekday=6)  # semaine commence dimanche
+    month_days = list(cal.itermonthdates(year, month))
+    return tuple(tuple(month_days[i:i+7]) for i in range(0, len(month_days), 7))
+
+
+@functools.lru_cache(maxsize=None)
+def month_dates(year, month):
+    """Jours du mois, dans l'ordre."""
+    first = date(year, month, 1)
+    return tuple(first + timedelta(days=i) for i in range(calendar.monthrange(year, month)[1]))
+
+
+def french_holidays(year):
+    import holidays
+
+    return frozenset(holidays.France(years=year).keys())
+
+
+def build_year_calendar(year, holidays=None):
+    """Table de l'année ; `holidays` : jours fériés (ensemble de dates), fériés français par défaut."""
+    first = date(year, 1, 1)
+    days = [first + timedelta(days=i) for i in range(date(year + 1, 1, 1).toordinal() - first.toordinal())]
+    holiday_dates = french_holidays(year) if holidays is None else holidays
+    return YearCalendar(
+        year=year,
+        start=first.toordinal(),
+        weekday=tuple(d.weekday() for d in days),
+        week_even=tuple((d.isocalendar()[1] % 2) == 0 for d in days),
+        holiday=tuple(d in holiday_dates for d in days),
+    )
+
+
+def build_year_rules(year_cal: YearCalendar, zz_odd, zz_even, parity_choice):
+    zz_day, three_zz, default_code = [], [], []
+    for weekday, week_even, holiday in zip(year_cal.weekday, year_cal.week_even, year_cal.holiday):
+        chosen = zz_even if week_even else zz_odd
+        is_zz = WEEKDAYS_FR[weekday] in chosen
+        zz_day.append(is_zz)
+        # même règle que week_is_three_zz
+        three_zz.append(len(chosen) == 3 and (week_even if parity_choice == "Paires" else not week_even))
+        default_code.append("FC" if holiday else ("ZZ" if is_zz else None))
+    return YearRules(
+        calendar=year_cal,
+        zz_day=tuple(zz_day),
+        three_zz=tuple(three_zz),
+        default_code=tuple(default_code),
+    )
@@ -0,0 +1,23 @@
+"""
+Alphabet des codes jour et leur forme entière (tableaux NumPy, tables de transition).
+
+0 = jour non renseigné, OTHER = code inconnu (fichier édité à la main) : ni compté, ni
+frontière de VACS.
+"""
+CODES = ["TRA", "ZZ", "CX", "CZ", "C4", "FC"]
+CODE_IDS = {code: i + 1 for i, code in enumerate(CODES)}
+OTHER = len(CODES) + 1
+N_SYMBOLS = OTHER + 1
+TRA, ZZ, CX, CZ, C4, FC = (CODE_IDS[c] for c in CODES)
+
+
+def encode(code):
+    if code is None:
+        return 0
+    return CODE_IDS.get(code, OTHER)
+
+
+def decode(code_id):
+    if code_id == 0:
+        return None
+    return CODES[code_id - 1] if code_id < OTHER else "?"
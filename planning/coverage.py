@@ -0,0 +1,281 @@
+"""
+Pose des CX/C4 de toute une équipe sous contrainte d'effectif.
+
+Chaque jour, au moins `min_staff` employés doivent rester au travail (code final TRA). On pose
+les compteurs CX/C4 de chacun pour maximiser la somme des totaux d'absence (VACS ouverte par le
+premier CX, comme evaluate_plan), ou une somme pondérée par équité (`fairness`).
+
+Un jour dont l'effectif est au minimum est fermé aux congés : seuls les employés qui n'y
+travaillent pas (ZZ, férié, congé déjà posé) n'y sont pas comptés. Le placement d'un employé,
+une fois les jours fermés connus, est l'optimum exact de optimize.exact_placement.
+
+Recherche locale :
+- construction : les employés, dans un ordre tiré au hasard, prennent leur optimum parmi les
+  jours encore ouverts ;
+- meilleure réponse : un employé sous son optimum sans contrainte libère ses jours et reprend
+  le meilleur placement possible (jamais moins bon : l'ancien reste possible) ;
+- échange : un employé sous son optimum et un employé qui occupe un jour qui lui manque
+  libèrent leurs jours, le premier se replace puis le second ; l'échange est gardé s'il
+  améliore l'objectif. Seuls les totaux des deux employés changent : l'écart se calcule sur
+  eux (évaluation delta), sans réévaluer l'équipe.
+Quand un passage complet n'améliore plus rien, une perturbation replace un employé sur dix
+tiré au hasard et la recherche reprend (recherche locale itérée) ; le meilleur placement
+rencontré est gardé. Arrêt après `patience` perturbations sans progrès, ou au bout du budget.
+
+    python -m planning.coverage equipe.db --start 2026-01-01 --end 2026-12-31 --cx 5 --min-staff 3
+"""
+import argparse
+from datetime import date
+import random
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from planning.optimize import exact_placement
+from planning.team import C4, CX, TRA, Employee, Team, absence_bulk, apply_rules_bulk, day_tables, encode, normalize_bulk
+
+
+class TeamPlacement(NamedTuple):
+    placed_cx: list  # par employé, jours où poser un CX
+    placed_c4: list  # par employé, jours où poser un C4
+    totals: np.ndarray  # total d'absence de chaque employé, jours posés
+    bounds: np.ndarray  # total optimal de chaque employé seul (sans contrainte d'effectif)
+    staff: np.ndarray  # effectif TRA de chaque jour, jours posés
+    min_staff: np.ndarray  # effectif minimum de chaque jour
+    objective: float
+
+
+def utility(totals, fairness=0.0):
+    """
+    Objectif de l'équipe : somme des totaux élevés à la puissance 1 - fairness. Avec
+    fairness = 0 c'est la somme des jours d'absence ; en s'approchant de 1, un jour de plus pour
+    un employé peu servi l'emporte sur un jour de plus pour un employé déjà bien servi.
+    """
+    return float(np.sum(np.asarray(totals, dtype=float) ** (1.0 - fairness)))
+
+
+def _per_employee(value, n_employees, name):
+    values = np.broadcast_to(np.asarray(value, dtype=np.int64), (n_employees,))
+    if (values < 0).any():
+        raise ValueError(f"{name} doit être positif")
+    return values
+
+
+def coverage_placement(team: Team, cx_quota, c4_quota, min_staff, fairness=0.0, budget=30.0, seed=0,
+                       patience=5, should_stop=None, on_progress=None):
+    """
+    Placement des CX/C4 de chaque employé de `team` (TeamPlacement). `cx_quota`, `c4_quota` :
+    un compteur commun ou un par employé ; `min_staff` : un effectif commun ou un par jour.
+    `budget` borne la durée en secondes ; `should_stop()` vrai arrête la recherche (le
+    meilleur placement trouvé est rendu) ; `on_progress(avancement, message)` est appelé au fil
+    de la recherche.
+    """
+    if not 0.0 <= fairness < 1.0:
+        raise ValueError("fairness doit être dans [0, 1)")
+    t0 = time.perf_counter()
+    deadline = t0 + budget
+    rng = random.Random(seed)
+    n_employees, n = team.codes.shape
+    cx_quota = _per_employee(cx_quota, n_employees, "cx_quota")
+    c4_quota = _per_employee(c4_quota, n_employees, "c4_quota")
+    min_staff = np.broadcast_to(np.asarray(min_staff, dtype=np.int64), (n,)).copy()
+
+    def stopped():
+        return time.perf_counter() >= deadline or (should_stop is not None and should_stop())
+
+    def progress(fraction, message):
+        if on_progress is not None:
+            on_progress(fraction, message)
+
+    tables = day_tables(team)
+    # poser un congé sur un jour TRA retire l'employé de l'effectif de ce jour
+    leaves_tra = normalize_bulk(team, tables) == TRA
+    slack = (apply_rules_bulk(team, tables) == TRA).sum(axis=0) - min_staff
+    holders = [set() for _ in range(n)]  # employés dont un congé posé retire un TRA du jour
+    plans = [team.plan(k) for k in range(n_employees)]
+    origin = team.start.toordinal()
+
+    def solve(e, blocked=frozenset()):
+        total, cx, c4 = exact_placement(plans[e], cx_quota[e], c4_quota[e], blocked)
+        return total, [d.toordinal() - origin for d in cx], [d.toordinal() - origin for d in c4]
+
+    def closed_days(e):
+        return frozenset(np.flatnonzero((slack <= 0) & leaves_tra[e]).tolist())
+
+    placement = [(0, [], []) for _ in range(n_employees)]
+
+    def place(e, chosen):
+        placement[e] = chosen
+        for i in chosen[1] + chosen[2]:
+            if leaves_tra[e, i]:
+                slack[i] -= 1
+                holders[i].add(e)
+
+    def release(e):
+        chosen = placement[e]
+        for i in chosen[1] + chosen[2]:
+            if leaves_tra[e, i]:
+                slack[i] += 1
+                holders[i].discard(e)
+        placement[e] = (0, [], [])
+        return chosen
+
+    def gain(before, after):
+        return utility(after, fairness) - utility(before, fairness)
+
+    # optimum de chacun seul : borne supérieure, et jours que l'échange cherche à libérer
+    alone = [solve(e) for e in range(n_employees)]
+    bounds = np.array([a[0] for a in alone], dtype=np.int64)
+
+    # construction
+    order = list(range(n_employees))
+    rng.shuffle(order)
+    for done, e in enumerate(order, start=1):
+        place(e, solve(e, closed_days(e)))
+        if done % 20 == 0:
+            progress(0.5 * done / n_employees, f"construction : {done}/{n_employees} employés")
+
+    def best_response(e):
+        old = release(e)
+        new = solve(e, closed_days(e))
+        if new[0] > old[0]:
+            place(e, new)
+            return True
+        place(e, old)
+        return False
+
+    def exchange(e, g):
+        old_e, old_g = release(e), release(g)
+        new_e = solve(e, closed_days(e))
+        place(e, new_e)
+        new_g = solve(g, closed_days(g))
+        if gain((old_e[0], old_g[0]), (new_e[0], new_g[0])) > 1e-9:
+            place(g, new_g)
+            return True
+        release(e)
+        place(e, old_e)
+        place(g, old_g)
+        return False
+
+    def local_search():
+        improved = True
+        while improved and not stopped():
+            improved = False
+            below = [e for e in range(n_employees) if placement[e][0] < bounds[e]]
+            rng.shuffle(below)
+            for e in below:
+                if stopped():
+                    break
+                if best_response(e):
+                    improved = True
+                    continue
+                # jours de l'optimum seul que d'autres occupent
+                wanted = [i for i in alone[e][1] + alone[e][2] if leaves_tra[e, i] and slack[i] <= 0]
+                rivals = sorted({g for i in wanted for g in holders[i] if g != e})
+                rng.shuffle(rivals)
+                for g in rivals[:4]:
+                    if exchange(e, g):
+                        improved = True
+                        break
+
+    def objective():
+        return utility([p[0] for p in placement], fairness)
+
+    local_search()
+    best, best_objective = list(placement), objective()
+    kicks = stale = 0
+    while stale < patience and not stopped():
+        kicks += 1
+        kicked = rng.sample(range(n_employees), max(1, n_employees // 10))
+        for e in kicked:
+            release(e)
+        for e in kicked:
+            place(e, solve(e, closed_days(e)))
+        local_search()
+        current = objective()
+        if current > best_objective + 1e-9:
+            best, best_objective, stale = list(placement), current, 0
+        else:
+            stale += 1
+        progress(min(0.5 + 0.5 * max(stale / patience, (time.perf_counter() - t0) / budget), 0.99),
+                 f"perturbation {kicks} : objectif {best_objective:g}")
+    for e in range(n_employees):
+        release(e)
+    for e in range(n_employees):
+        place(e, best[e])
+
+    # totaux d'absence de l'équipe avec les jours posés, par les règles en bloc
+    codes = team.codes.copy()
+    for e, (_, cx, c4) in enumerate(placement):
+        codes[e, cx] = CX
+        codes[e, c4] = C4
+    placed = Team(team.employees, team.start, codes, team.holidays)
+    final = apply_rules_bulk(placed, tables)  # les tables ne dépendent que des employés et des dates
+    totals, _ = absence_bulk(placed, final, tables)
+    progress(1.0, "terminé")
+    return TeamPlacement(
+        placed_cx=[[date.fromordinal(origin + i) for i in sorted(p[1])] for p in placement],
+        placed_c4=[[date.fromordinal(origin + i) for i in sorted(p[2])] for p in placement],
+        totals=totals,
+        bounds=bounds,
+        staff=(final == TRA).sum(axis=0),
+        min_staff=min_staff,
+        objective=utility(totals, fairness),
+    )
+
+
+def main(argv=None):
+    from planning.batch import DEFAULT_SETTINGS, read_calendars
+
+    parser = argparse.ArgumentParser(description="Pose les CX/C4 d'une équipe en gardant un effectif minimum.")
+    parser.add_argument("inputs", nargs="+", help="fichiers .json, .csv ou .db (voir planning.batch)")
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="premier jour (AAAA-MM-JJ)")
+    parser.add_argument("--end", type=date.fromisoformat, required=True, help="dernier jour inclus (AAAA-MM-JJ)")
+    parser.add_argument("--cx", type=int, default=3, help="compteur CX de chaque employé")
+    parser.add_argument("--c4", type=int, default=0, help="compteur C4 de chaque employé")
+    parser.add_argument("--min-staff", type=int, required=True, help="employés en TRA au minimum chaque jour")
+    parser.add_argument("--fairness", type=float, default=0.0, help="équité, de 0 (somme des jours) à 1 exclu")
+    parser.add_argument("--budget", type=float, default=30.0, help="durée maximale en secondes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.end < args.start:
+        parser.error("--end doit être postérieur à --start")
+    if not 0.0 <= args.fairness < 1.0:
+        parser.error("--fairness doit être dans [0, 1)")
+
+    try:
+        calendars = read_calendars(args.inputs)
+    except (OSError, ValueError, KeyError) as exc:
+        parser.error(f"lecture impossible : {exc}")
+    if not calendars:
+        parser.error("aucun calendrier à planifier")
+
+    from planning.calendar_meta import french_holidays
+
+    holidays = frozenset().union(*(french_holidays(y) for y in range(args.start.year, args.end.year + 1)))
+    employees = [Employee.from_settings(name, {**DEFAULT_SETTINGS, **settings}) for name, _, settings in calendars]
+    team = Team.empty(employees, args.start, args.end, holidays)
+    origin = args.start.toordinal()
+    for row, (_, days, _) in enumerate(calendars):
+        for d, code in days.items():
+            if args.start <= d <= args.end:
+                team.codes[row, d.toordinal() - origin] = encode(code)
+
+    t0 = time.perf_counter()
+    result = coverage_placement(team, args.cx, args.c4, args.min_staff, args.fairness, args.budget, args.seed)
+    elapsed = time.perf_counter() - t0
+    print(f"{len(employees)} employés, {team.n_days} jours : {int(result.totals.sum())} jours d'absence "
+          f"(borne sans contrainte : {int(result.bounds.sum())}), objectif {result.objective:g}, {elapsed:.1f} s")
+    short = np.flatnonzero(result.staff < result.min_staff)
+    if len(short):
+        days = ", ".join(team.dates()[i].isoformat() for i in short[:10])
+        print(f"{len(short)} jours déjà sous l'effectif minimum avant toute pose : {days}{' ...' if len(short) > 10 else ''}")
+    for e, employee in enumerate(employees):
+        days = [f"CX {d.isoformat()}" for d in result.placed_cx[e]] + [f"C4 {d.isoformat()}" for d in result.placed_c4[e]]
+        print(f"{employee.name or 'Calendrier principal'} : {int(result.totals[e])}/{int(result.bounds[e])} jours ; "
+              f"{', '.join(days) or 'rien à poser'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Codes jour du calendrier chargé (state["data"] de Conge.py), en mémoire, utilisables sans Streamlit.
+"""
+from array import array
+import calendar
+from datetime import date
+
+from planning.calendar_meta import month_dates
+from planning.codes import OTHER, decode, encode
+
+
+class DayCodeStore:
+    """
+    Codes jour en petits entiers : un array('B') par année, indexé par jour de l'année, avec les
+    identifiants de planning.codes (0 = non renseigné). Un code inconnu (fichier édité à la main)
+    est stocké OTHER et son texte gardé à part, pour que la conversion JSON reste sans perte.
+    Remplace le dict {"YYYY-MM": {"YYYY-MM-DD": code}} ; to_json()/from_json() convertissent
+    sans perte vers et depuis ce format (y compris les mois présents mais vides).
+    Avec un `loader`, chaque année est lue à la demande ; les modifications sont suivies
+    pour n'écrire que les jours changés (pop_changes()). `version` augmente à chaque
+    modification effective (pas aux lectures).
+    """
+
+    def __init__(self, loader=None, months=()):
+        self._years = {}  # année -> (ordinal du 1er janvier, array('B'))
+        self._other = {}  # ordinal -> texte des codes inconnus (cases OTHER)
+        self._months = set(months)  # (année, mois) présents dans le format JSON
+        self._loader = loader  # année -> [(jour ISO, code)]
+        self._dirty_days = set()  # ordinaux modifiés depuis le dernier pop_changes()
+        self._months_added = set()
+        self._months_removed = set()
+        self.version = 0
+
+    def _year_slot(self, year):
+        slot = self._years.get(year)
+        if slot is None:
+            start = date(year, 1, 1).toordinal()
+            codes = array("B", bytes(date(year + 1, 1, 1).toordinal() - start))
+            if self._loader is not None:
+                for iso, code in self._loader(year):
+                    self._put(start, codes, date.fromisoformat(iso).toordinal(), code)
+            slot = (start, codes)
+            self._years[year] = slot
+        return slot
+
+    def _put(self, start, codes, o, code):
+        cid = encode(code)
+        codes[o - start] = cid
+        if cid == OTHER:
+            self._other[o] = code
+        else:
+            self._other.pop(o, None)
+
+    def _name(self, cid, o):
+        return self._other[o] if cid == OTHER else decode(cid)
+
+    def _mark_month(self, year, month):
+        if (year, month) not in self._months:
+            self.version += 1
+            self._months.add((year, month))
+            self._months_added.add((year, month))
+            self._months_removed.discard((year, month))
+
+    def get(self, d: date, default=None):
+        slot = self._years.get(d.year)
+        if slot is None:
+            if self._loader is None:
+                return default
+            slot = self._year_slot(d.year)
+        o = d.toordinal()
+        cid = slot[1][o - slot[0]]
+        return self._name(cid, o) if cid else default
+
+    def set(self, d: date, code: str):
+        start, codes = self._year_slot(d.year)
+        o = d.toordinal()
+        if self._name(codes[o - start], o) != code:
+            self._put(start, codes, o, code)
+            self._dirty_days.add(o)
+            self.version += 1
+        self._mark_month(d.year, d.month)
+
+    def setdefault(self, d: date, code: str):
+        start, codes = self._year_slot(d.year)
+        o = d.toordinal()
+        if not codes[o - start]:
+            self._put(start, codes, o, code)
+            self._dirty_days.add(o)
+            self.version += 1
+        self._mark_month(d.year, d.month)
+        return self._name(codes[o - start], o)
+
+    def discard(self, d: date):
+        start, codes = self._year_slot(d.year)
+        o = d.toordinal()
+        if codes[o - start]:
+            codes[o - start] = 0
+            self._other.pop(o, None)
+            self._dirty_days.add(o)
+            self.version += 1
+
+    def add_month(self, year, month):
+        self._year_slot(year)
+        self._mark_month(year, month)
+
+    def clear_month(self, year, month):
+        """Supprime le mois (équivalent de data.pop("YYYY-MM") dans le format JSON)."""
+        for d in month_dates(year, month):
+            self.discard(d)
+        if (year, month) in self._months:
+            self.version += 1
+            self._months.discard((year, month))
+            self._months_removed.add((year, month))
+            self._months_added.discard((year, month))
+
+    def pop_changes(self):
+        """Retourne ({jour: code ou None}, mois ajoutés, mois supprimés) depuis le dernier appel."""
+        days = {}
+        for o in self._dirty_days:
+            d = date.fromordinal(o)
+            days[d] = self.get(d)
+        changes = (days, self._months_added, self._months_removed)
+        self._dirty_days = set()
+        self._months_added = set()
+        self._months_removed = set()
+        return changes
+
+    def to_json(self):
+        data = {}
+        for year, month in sorted(self._months):
+            start, codes = self._year_slot(year)
+            first = date(year, month, 1).toordinal()
+            month_data = {}
+            for o in range(first, first + calendar.monthrange(year, month)[1]):
+                cid = codes[o - start]
+                if cid:
+                    month_data[date.fromordinal(o).isoformat()] = self._name(cid, o)
+            data[f"{year:04d}-{month:02d}"] = month_data
+        return data
+
+    @classmethod
+    def from_json(cls, data):
+        store = cls()
+        for key, month_data in data.items():
+            year, month = (int(x) for x in key.split("-"))
+            store.add_month(year, month)
+            for iso, code in month_data.items():
+                store.set(date.fromisoformat(iso), code)
+        store.pop_changes()
+        return store
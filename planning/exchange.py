@@ -0,0 +1,310 @@
+"""
+Import / export en flux des codes jour par jour d'une base SqliteCalendar, pour un ou
+plusieurs employés et sur plusieurs années.
+
+- CSV (colonnes employee,day,code, jour ISO, code vide = jour effacé), lu et écrit ligne à ligne :
+  la mémoire utilisée ne dépend pas du nombre de lignes ;
+- iCalendar (export) : un événement par VACS (planning.vacs), jours ZZ/FC collés compris.
+
+Un import écrit les codes par paquets de lignes, puis applique les règles en bloc
+(planning.team.apply_rules_bulk) sur les mois touchés de chaque employé, par groupes d'employés,
+au lieu d'un set_code et d'une passe complète des règles par jour.
+
+    python -m planning.exchange import codes.csv equipe.db
+    python -m planning.exchange export equipe.db codes.csv --start 2026-01-01 --end 2027-12-31
+    python -m planning.exchange export equipe.db vacs.ics --employee Alice Bob
+"""
+import argparse
+from collections import defaultdict
+import csv
+from datetime import date, datetime, timedelta, timezone
+import functools
+from itertools import groupby
+from operator import itemgetter
+import os
+import sys
+from typing import NamedTuple
+
+import numpy as np
+
+from planning.batch import DEFAULT_SETTINGS, make_plan
+from planning.calendar_meta import french_holidays
+from planning.codes import decode, encode
+from planning.rules import CODES, WEEKDAYS_FR, apply_rules, vacs_index
+from planning.storage import SqliteCalendar
+from planning.team import Employee, Team, apply_rules_bulk
+
+CSV_COLUMNS = ("employee", "day", "code")
+DEFAULT_CHUNK = 50_000  # lignes écrites par transaction à l'import
+DEFAULT_BATCH = 256  # employés par passe des règles en bloc
+
+
+class ImportResult(NamedTuple):
+    rows: int  # lignes lues
+    employees: int
+    ruled: int  # jours réécrits par les règles (defaults, CZ)
+
+
+@functools.lru_cache(maxsize=64)
+def _holidays(first_year, last_year):
+    return frozenset().union(*(french_holidays(y) for y in range(first_year, last_year + 1)))
+
+
+def _month_span(first: date, last: date):
+    """Premier jour du mois de `first`, dernier jour du mois de `last`."""
+    following = date(last.year + last.month // 12, last.month % 12 + 1, 1)
+    return first.replace(day=1), following - timedelta(days=1)
+
+
+def _months(start: date, end: date):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = year + month // 12, month % 12 + 1
+
+
+# ---------------------------
+# CSV
+# ---------------------------
+def read_csv_rows(f, source="CSV", strict=False):
+    """
+    (employé, jour, code ou None) de chaque ligne ; ValueError, avec le numéro de ligne, si elle
+    est invalide. Un code inconnu est gardé tel quel, comme dans la base (planning.codes.OTHER
+    pour les règles, qui ne le comptent pas) ; avec `strict`, il rend la ligne invalide.
+    """
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+    try:
+        fields = itemgetter(*(header.index(name) for name in CSV_COLUMNS))
+    except ValueError:
+        raise ValueError(f"{source} : colonnes attendues {','.join(CSV_COLUMNS)} (trouvé : {','.join(header)})") from None
+    known = frozenset(CODES)
+    for line, row in enumerate(reader, start=2):
+        if not row:
+            continue
+        try:
+            employee, iso, code = fields(row)
+            d = date.fromisoformat(iso)
+        except (IndexError, ValueError):
+            raise ValueError(f"{source}, ligne {line} : ligne invalide {row!r}") from None
+        if strict and code and code not in known:
+            raise ValueError(f"{source}, ligne {line} : code inconnu {code!r} (attendu : {', '.join(CODES)})")
+        yield employee, d, code or None
+
+
+def export_csv(db: SqliteCalendar, out, start=None, end=None, employees=None):
+    """Écrit les jours renseignés dans `out` (fichier texte) ; retourne le nombre de lignes."""
+    writer = csv.writer(out)
+    writer.writerow(CSV_COLUMNS)
+    n = 0
+    for row in db.iter_range(start, end, employees):
+        writer.writerow(row)
+        n += 1
+    return n
+
+
+# ---------------------------
+# Import
+# ---------------------------
+def import_rows(db: SqliteCalendar, rows, settings=None, chunk=DEFAULT_CHUNK, batch=DEFAULT_BATCH):
+    """
+    Importe des lignes (employé, jour, code) dans la base, puis applique les règles sur les mois
+    touchés. `settings` (réglages ZZ/parité) remplace ceux des employés importés ; un employé
+    sans réglages enregistrés reçoit les réglages par défaut. Si la lecture échoue (ValueError),
+    les lignes déjà lues restent importées, règles appliquées, et l'erreur est relancée.
+    """
+    spans = {}  # employé -> (premier, dernier) ordinal importé
+    buffer = []
+    n = 0
+    error = None
+    try:
+        for employee, d, code in rows:
+            buffer.append((employee, d, code))
+            n += 1
+            o = d.toordinal()
+            span = spans.get(employee)
+            spans[employee] = (o, o) if span is None else (min(span[0], o), max(span[1], o))
+            if len(buffer) >= chunk:
+                db.write_rows(buffer)
+                buffer = []
+    except ValueError as exc:
+        error = exc
+    if buffer:
+        db.write_rows(buffer)
+
+    stored = db.read_all_settings()
+    for employee in spans:
+        current = stored.get(employee) or {}
+        wanted = {**DEFAULT_SETTINGS, **current, **(settings or {})}
+        if wanted != current:
+            db.with_employee(employee).write(settings=wanted)
+    ruled = apply_rules_to_spans(
+        db, {e: (date.fromordinal(a), date.fromordinal(b)) for e, (a, b) in spans.items()}, batch
+    )
+    if error is not None:
+        raise ValueError(f"{error} ({n} lignes précédentes importées)") from error
+    return ImportResult(n, len(spans), ruled)
+
+
+def apply_rules_to_spans(db: SqliteCalendar, spans, batch=DEFAULT_BATCH):
+    """
+    Applique les règles aux mois couverts par spans[employé] = (premier jour, dernier jour) :
+    les employés qui couvrent les mêmes mois sont traités ensemble, `batch` à la fois, en une
+    passe NumPy ; seuls les jours changés sont réécrits et les mois sont marqués présents.
+    Retourne le nombre de jours réécrits.
+    """
+    groups = defaultdict(list)
+    for employee, (first, last) in spans.items():
+        groups[_month_span(first, last)].append(employee)
+    settings = db.read_all_settings()
+    ruled = 0
+    for (start, end), names in groups.items():
+        holidays = _holidays(start.year, end.year)
+        months = list(_months(start, end))
+        origin = start.toordinal()
+        for k in range(0, len(names), batch):
+            part = names[k:k + batch]
+            team = Team.empty([Employee.from_settings(n, settings.get(n, {})) for n in part], start, end, holidays)
+            row_of = {n: r for r, n in enumerate(part)}
+            for name, iso, code in db.iter_range(start, end, part):
+                team.codes[row_of[name], date.fromisoformat(iso).toordinal() - origin] = encode(code)
+            final = apply_rules_bulk(team)
+            rows, cols = np.nonzero(final != team.codes)
+            db.write_rows(
+                [(part[r], date.fromordinal(origin + c), decode(final[r, c]))
+                 for r, c in zip(rows.tolist(), cols.tolist())],
+                [(n, year, month) for n in part for year, month in months],
+            )
+            ruled += len(rows)
+    return ruled
+
+
+# ---------------------------
+# iCalendar
+# ---------------------------
+def vacs_segments(db: SqliteCalendar, start=None, end=None, employees=None):
+    """
+    (employé, plan, Segment) de chaque VACS, employé par employé : seuls les jours d'un employé
+    sont en mémoire à la fois. Sans bornes, la plage d'un employé va de son premier à son dernier
+    jour renseigné.
+    """
+    settings = db.read_all_settings()
+    for employee, rows in groupby(db.iter_range(start, end, employees), key=itemgetter(0)):
+        days = {date.fromisoformat(iso): code for _, iso, code in rows}
+        first, last = start or min(days), end or max(days)
+        plan = make_plan(days, settings.get(employee, {}), first, last, _holidays(first.year, last.year))
+        for segment in vacs_index(plan, apply_rules(plan)).complete().segments:
+            yield employee, plan, segment
+
+
+def _ics_text(value):
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ics_line(line):
+    """Ligne iCalendar repliée à 75 octets (RFC 5545), terminée par CRLF."""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts, limit = [], 75
+    while data:
+        cut = min(limit, len(data))
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:  # pas au milieu d'un caractère UTF-8
+            cut -= 1
+        parts.append(data[:cut].decode("utf-8"))
+        data, limit = data[cut:], 74  # la ligne suivante commence par une espace
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def export_ics(db: SqliteCalendar, out, start=None, end=None, employees=None):
+    """Écrit un calendrier iCalendar, un événement par VACS ; retourne le nombre d'événements."""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    out.write(_ics_line("BEGIN:VCALENDAR"))
+    out.write(_ics_line("VERSION:2.0"))
+    out.write(_ics_line("PRODID:-//Gestion calendrier congés//planning.exchange//FR"))
+    n = 0
+    for employee, plan, segment in vacs_segments(db, start, end, employees):
+        first, last, opening = plan.day(segment.first), plan.day(segment.last), plan.day(segment.opening)
+        who = employee or "Calendrier principal"
+        for line in (
+            "BEGIN:VEVENT",
+            f"UID:{_ics_text(employee)}-{first.isoformat()}@conge",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART;VALUE=DATE:{first:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{last + timedelta(days=1):%Y%m%d}",
+            f"SUMMARY:{_ics_text(f'{who} : VACS, {len(segment.days)} jours')}",
+            f"DESCRIPTION:{_ics_text(f'Ouverte par le CX du {opening:%d/%m/%Y}, du {first:%d/%m/%Y} au {last:%d/%m/%Y}.')}",
+            "CATEGORIES:VACS",
+            "TRANSP:OPAQUE",
+            "END:VEVENT",
+        ):
+            out.write(_ics_line(line))
+        n += 1
+    out.write(_ics_line("END:VCALENDAR"))
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import / export en flux des codes du calendrier (CSV, iCalendar).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="importe un CSV employee,day,code dans la base et applique les règles")
+    imp.add_argument("csv_file", help="fichier CSV (- : entrée standard)")
+    imp.add_argument("database")
+    imp.add_argument("--zz-odd", nargs="+", choices=WEEKDAYS_FR, help="jours ZZ des semaines impaires des employés importés")
+    imp.add_argument("--zz-even", nargs="+", choices=WEEKDAYS_FR, help="jours ZZ des semaines paires des employés importés")
+    imp.add_argument("--parity", choices=("Paires", "Impaires"), help="semaines à 3 ZZ des employés importés")
+    imp.add_argument("--strict", action="store_true", help="refuse les codes inconnus (gardés tels quels par défaut)")
+    imp.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="lignes écrites par transaction")
+    imp.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="employés par passe des règles")
+    exp = sub.add_parser("export", help="exporte la base en CSV ou en iCalendar (.ics, une VACS par événement)")
+    exp.add_argument("database")
+    exp.add_argument("output", help="fichier .csv ou .ics (- : CSV sur la sortie standard)")
+    exp.add_argument("--employee", nargs="+", help="employés exportés (défaut : tous)")
+    exp.add_argument("--start", type=date.fromisoformat, help="premier jour (AAAA-MM-JJ)")
+    exp.add_argument("--end", type=date.fromisoformat, help="dernier jour inclus (AAAA-MM-JJ)")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        settings = {
+            key: value
+            for key, value in (("zz_odd", args.zz_odd), ("zz_even", args.zz_even), ("parity_choice", args.parity))
+            if value is not None
+        }
+        db = SqliteCalendar(args.database)
+        f = sys.stdin if args.csv_file == "-" else open(args.csv_file, newline="", encoding="utf-8")
+        try:
+            result = import_rows(db, read_csv_rows(f, args.csv_file, args.strict), settings or None, args.chunk, args.batch)
+        except (OSError, ValueError) as exc:
+            parser.error(f"import interrompu : {exc}")
+        finally:
+            if f is not sys.stdin:
+                f.close()
+            db.close()
+        print(f"{args.csv_file} : {result.rows} lignes, {result.employees} employés, "
+              f"{result.ruled} jours mis à jour par les règles")
+        return
+
+    if args.start and args.end and args.end < args.start:
+        parser.error("--end doit être postérieur à --start")
+    if args.output != "-" and os.path.splitext(args.output)[1].lower() not in (".csv", ".ics"):
+        parser.error("format de sortie non reconnu (attendu : .csv ou .ics)")
+    db = SqliteCalendar(args.database)
+    ics = args.output.lower().endswith(".ics")
+    f = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        if ics:
+            n = export_ics(db, f, args.start, args.end, args.employee)
+        else:
+            n = export_csv(db, f, args.start, args.end, args.employee)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+        db.close()
+    if f is not sys.stdout:
+        print(f"{args.output} : {n} {'événements' if ics else 'lignes'}")
+
+
+if __name__ == "__main__":
+    main()
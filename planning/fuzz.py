@@ -0,0 +1,706 @@
+"""
+Fuzzing différentiel des moteurs de règles et des optimiseurs, sans Streamlit.
+
+Des calendriers aléatoires (codes, jours fériés, réglages ZZ/parité, périodes de 1 à 3 mois ou
+quelconques, semaines 53 comprises) sont soumis à la fois à l'implémentation de référence
+(planning.reference, l'ancien code de Conge.py) et à chaque moteur : tout écart est réduit à un
+calendrier minimal qui le reproduit encore, puis affiché et, avec --out, enregistré pour être
+rejoué (--replay). Les cas sont tirés d'une graine : deux exécutions voient les mêmes cas.
+
+Un moteur est un Engine(nom, check) : check(cas) rend les (position, message) des cas en
+désaccord avec la référence. rules_engine / total_engine en construisent un à partir d'une
+fonction plan -> codes finaux ou plan -> (total, jours) ; --plugin charge des moteurs extérieurs.
+
+    python -m planning.fuzz --cases 20000 --seed 1
+    python -m planning.fuzz --engines apply_rules_bulk absence_bulk --seconds 60
+    python -m planning.fuzz --plugin mon_moteur:ENGINES --engines mon_moteur --out ecarts.json
+"""
+import argparse
+from dataclasses import replace
+from datetime import date, timedelta
+import functools
+import importlib
+import itertools
+import json
+import random
+import sys
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from planning.cache import evaluations
+from planning.calendar_meta import build_year_calendar, build_year_rules, french_holidays
+from planning.codes import decode, encode
+from planning.daystore import DayCodeStore
+from planning.incremental import apply_rules_from
+from planning.optimize import exact_placement, greedy_placement
+from planning.parallel import map_in_order
+from planning import reference
+from planning.reference import ReferenceCalendar
+from planning.rules import WEEKDAYS_FR, Plan, apply_rules, evaluate_final, evaluate_plan, vacs_days_from, vacs_index
+from planning.scope import DateRange
+from planning.team import Employee, Team, absence_bulk, apply_rules_bulk, exact_bulk
+from planning.whatif import check_current
+
+# codes tirés ; "XX" : code inconnu (fichier édité à la main), ni compté ni frontière de VACS
+CODE_POOL = (None, "TRA", "ZZ", "CX", "CZ", "C4", "FC", "XX")
+HOLIDAY_KINDS = ("aucun", "france", "dense", "bords")
+DEFAULT_MAX_DAYS = 100
+GROUP_SIZE = 32  # cas partageant début, longueur et fériés (une Team pour les moteurs en bloc)
+# modifications d'un jour (ZZ plus souvent : saisi hors sélection, il passe en CZ puis revient en TRA)
+EDIT_CODES = ("TRA", "ZZ", "ZZ", "CX", "CZ", "C4", "FC", "XX")
+EDITS_PER_CASE = 6
+# optimum exact vérifié par énumération jusqu'à cette longueur et ce nombre de jours à poser
+BRUTE_FORCE_DAYS = 10
+BRUTE_FORCE_BUDGET = 3
+
+
+class Case(NamedTuple):
+    plan: Plan
+    cx_quota: int = 0
+    c4_quota: int = 0
+
+
+class Engine(NamedTuple):
+    name: str
+    check: object  # check(liste de Case) -> [(position, message)] des cas en désaccord
+    max_days: int = 0  # cas plus longs ignorés (0 : aucune limite)
+
+
+class Failure(NamedTuple):
+    engine: str
+    case: Case
+    message: str
+
+
+# ---------------------------
+# Génération des cas
+# ---------------------------
+def _random_range(rng, max_days):
+    """(début, nombre de jours) : le plus souvent des mois entiers, parfois à cheval sur deux années."""
+    r = rng.random()
+    if r < 0.6:
+        start = date(rng.randint(2019, 2032), rng.randint(1, 12), 1)
+        months = rng.randint(1, 3)
+        last = start.month - 1 + months
+        n = (date(start.year + last // 12, last % 12 + 1, 1) - start).days
+    elif r < 0.8:
+        # autour du 1er janvier : semaines 52/53 puis 1, parité qui ne s'inverse pas
+        start = date(rng.randint(2019, 2032), 12, 1) + timedelta(days=rng.randrange(40))
+        n = rng.randint(1, 60)
+    else:
+        start = date(rng.randint(2019, 2032), 1, 1) + timedelta(days=rng.randrange(366))
+        n = rng.randint(1, 70)
+    return start, max(1, min(n, max_days))
+
+
+def _random_holidays(rng, start, n):
+    kind = rng.choice(HOLIDAY_KINDS)
+    end = start + timedelta(days=n - 1)
+    if kind == "aucun":
+        return frozenset()
+    if kind == "france":
+        return frozenset(d for year in range(start.year, end.year + 1) for d in french_holidays(year))
+    if kind == "dense":
+        return frozenset(start + timedelta(days=i) for i in range(n) if rng.random() < 0.15)
+    # premiers / derniers jours de la plage et jours qui la bordent
+    return frozenset(start + timedelta(days=i) for i in (-1, 0, 1, n - 2, n - 1, n) if rng.random() < 0.5)
+
+
+def _random_zz(rng):
+    size = rng.choice((0, 1, 2, 2, 3, 3, 3))  # 3 jours souvent : semaines 3-ZZ
+    return tuple(rng.sample(WEEKDAYS_FR, size))
+
+
+def _random_codes(rng, n):
+    weights = [rng.random() ** 2 for _ in CODE_POOL]
+    weights[-1] *= 0.1
+    if rng.random() < 0.3:
+        # par séries : longues VACS, suites de ZZ/FC
+        codes = []
+        while len(codes) < n:
+            codes += [rng.choices(CODE_POOL, weights)[0]] * rng.randint(1, 6)
+        return tuple(codes[:n])
+    return tuple(rng.choices(CODE_POOL, weights, k=n))
+
+
+def random_cases(rng, max_days=DEFAULT_MAX_DAYS, group=GROUP_SIZE):
+    """Suite infinie de groupes de cas ; les cas d'un groupe partagent début, longueur et fériés."""
+    while True:
+        start, n = _random_range(rng, max_days)
+        holidays = _random_holidays(rng, start, n)
+        yield [
+            Case(
+                Plan(start=start, codes=_random_codes(rng, n), holidays=holidays, zz_odd=_random_zz(rng),
+                     zz_even=_random_zz(rng), parity_choice=rng.choice(("Paires", "Impaires"))),
+                cx_quota=rng.randint(0, 3),
+                c4_quota=rng.randint(0, 2),
+            )
+            for _ in range(group)
+        ]
+
+
+# ---------------------------
+# Comparaisons
+# ---------------------------
+# résultats de la référence calculés une fois par cas et partagés par les moteurs d'un groupe
+reference_rules = functools.lru_cache(maxsize=4 * GROUP_SIZE)(reference.reference_rules)
+reference_total = functools.lru_cache(maxsize=4 * GROUP_SIZE)(reference.reference_total)
+# tables d'année d'un groupe (mêmes fériés) : construites une fois pour ses cas
+_year_calendar = functools.lru_cache(maxsize=8)(build_year_calendar)
+
+
+def _days(days):
+    return "[" + ", ".join(d.isoformat() for d in days) + "]"
+
+
+def diff_codes(plan: Plan, expected, got):
+    """Message décrivant le premier jour où les codes diffèrent, None s'ils sont égaux."""
+    expected, got = tuple(expected), tuple(got)
+    if expected == got:
+        return None
+    if len(expected) != len(got):
+        return f"{len(got)} codes rendus au lieu de {len(expected)}"
+    i = next(i for i, (a, b) in enumerate(zip(expected, got)) if a != b)
+    return f"code du {plan.day(i)} : référence {expected[i]}, moteur {got[i]}"
+
+
+def diff_total(expected, got):
+    """Message si (total, jours) diffère de la référence, None sinon."""
+    (exp_count, exp_days), (got_count, got_days) = expected, got
+    if exp_count == got_count and list(exp_days) == list(got_days):
+        return None
+    return f"total : référence {exp_count} {_days(exp_days)}, moteur {got_count} {_days(got_days)}"
+
+
+def _plan_with(plan: Plan, placed_cx, placed_c4):
+    for d in placed_cx:
+        plan = plan.with_code(plan.index(d), "CX")
+    for d in placed_c4:
+        plan = plan.with_code(plan.index(d), "C4")
+    return plan
+
+
+# ---------------------------
+# Moteurs
+# ---------------------------
+def rules_engine(name, func, max_days=0):
+    """Moteur comparant func(plan) aux codes finaux de l'ancien apply_business_rules."""
+    def check(cases):
+        failures = []
+        for k, case in enumerate(cases):
+            message = diff_codes(case.plan, reference_rules(case.plan), func(case.plan))
+            if message:
+                failures.append((k, message))
+        return failures
+    return Engine(name, check, max_days)
+
+
+def total_engine(name, func, max_days=0):
+    """Moteur comparant func(plan) à (total, jours) de l'ancien total_absence_for_scope."""
+    def check(cases):
+        failures = []
+        for k, case in enumerate(cases):
+            message = diff_total(reference_total(case.plan), func(case.plan))
+            if message:
+                failures.append((k, message))
+        return failures
+    return Engine(name, check, max_days)
+
+
+def _evaluate_final_codes(plan: Plan):
+    return evaluate_final(replace(plan, codes=reference_rules(plan)))
+
+
+def _teams(cases):
+    """(Team, positions des cas) par début, longueur et fériés communs."""
+    groups = {}
+    for k, case in enumerate(cases):
+        p = case.plan
+        groups.setdefault((p.start, len(p.codes), p.holidays), []).append(k)
+    for (start, _, holidays), positions in groups.items():
+        employees = [Employee(str(k), cases[k].plan.zz_odd, cases[k].plan.zz_even, cases[k].plan.parity_choice)
+                     for k in positions]
+        codes = [[encode(c) for c in cases[k].plan.codes] for k in positions]
+        yield Team(employees, start, codes, holidays), positions
+
+
+def _check_rules_bulk(cases):
+    failures = []
+    for team, positions in _teams(cases):
+        final = apply_rules_bulk(team)
+        for row, k in enumerate(positions):
+            plan = cases[k].plan
+            # les matrices ne gardent pas le libellé d'un code inconnu ("?")
+            expected = [decode(encode(c)) for c in reference_rules(plan)]
+            message = diff_codes(plan, expected, [decode(c) for c in final[row].tolist()])
+            if message:
+                failures.append((k, message))
+    return failures
+
+
+def _check_absence_bulk(cases):
+    failures = []
+    for team, positions in _teams(cases):
+        totals, mask = absence_bulk(team)
+        for row, k in enumerate(positions):
+            plan = cases[k].plan
+            got = int(totals[row]), [plan.day(int(i)) for i in np.flatnonzero(mask[row])]
+            message = diff_total(reference_total(plan), got)
+            if message:
+                failures.append((k, message))
+    return failures
+
+
+def _check_effective_cz(cases):
+    failures = []
+    for k, case in enumerate(cases):
+        # calendrier de référence après apply_business_rules
+        ref = ReferenceCalendar(replace(case.plan, codes=reference_rules(case.plan)))
+        index = vacs_index(case.plan, ref.codes())
+        # ordre des questions mélangé : l'index est construit à la demande
+        order = list(range(len(case.plan.codes)))
+        random.Random(k).shuffle(order)
+        for i in order:
+            d = case.plan.day(i)
+            expected, got = ref.is_effective_cz(d), index.is_effective_cz(i)
+            if expected != got:
+                failures.append((k, f"CZ effectif du {d} : référence {expected}, moteur {got}"))
+                break
+    return failures
+
+
+def _check_vacs_days_from(cases):
+    failures = []
+    for k, case in enumerate(cases):
+        ref = ReferenceCalendar(replace(case.plan, codes=reference_rules(case.plan)))
+        final = ref.codes()
+        for i in range(len(final)):
+            d = case.plan.day(i)
+            expected, got = ref.simulate_vacs_from(d), vacs_days_from(case.plan, final, i)
+            if expected != got:
+                failures.append((k, f"VACS depuis le {d} : référence {_days(expected)}, moteur {_days(got)}"))
+                break
+    return failures
+
+
+def _manual_zz(plan: Plan):
+    """Vrai si un ZZ est saisi hors des jours ZZ choisis et des fériés."""
+    ref = ReferenceCalendar(plan)
+    for d, code in zip(plan.dates(), plan.codes):
+        if code == "ZZ" and d not in plan.holidays:
+            chosen = plan.zz_even if ref.is_week_even(d) else plan.zz_odd
+            if WEEKDAYS_FR[d.weekday()] not in chosen:
+                return True
+    return False
+
+
+def _check_greedy(cases):
+    failures = []
+    for k, case in enumerate(cases):
+        # L'ancien glouton évaluait en place : un ZZ saisi hors des jours choisis, passé en CZ par
+        # un essai, redevient TRA au passage suivant et reste perdu pour les essais d'après.
+        # greedy_placement évalue chaque essai sur le plan d'origine : ces cas ne sont pas comparés.
+        if _manual_zz(case.plan):
+            continue
+        _, ref_cx, ref_c4, _ = ReferenceCalendar(case.plan).optimize_placement(case.cx_quota, case.c4_quota)
+        got_cx, got_c4 = greedy_placement(case.plan, case.cx_quota, case.c4_quota)
+        if (ref_cx, ref_c4) != (got_cx, got_c4):
+            failures.append((k, f"glouton : référence CX {_days(ref_cx)} C4 {_days(ref_c4)}, "
+                                f"moteur CX {_days(got_cx)} C4 {_days(got_c4)}"))
+    return failures
+
+
+def _check_exact_bulk(cases):
+    failures = []
+    groups = {}
+    for k, case in enumerate(cases):
+        groups.setdefault((case.cx_quota, case.c4_quota), []).append(k)
+    for (cx_quota, c4_quota), positions in groups.items():
+        subset = [cases[k] for k in positions]
+        for team, rows in _teams(subset):
+            values = exact_bulk(team, cx_quota, c4_quota)
+            for row, j in enumerate(rows):
+                case = subset[j]
+                if _brute_forceable(case):
+                    expected = brute_force_optimum(case)
+                else:
+                    # hors de portée de l'énumération : la valeur d'exact_placement, vérifiée à part
+                    # (moteur "exact") en recomptant son placement avec la référence
+                    expected = exact_placement(case.plan, cx_quota, c4_quota)[0]
+                if int(values[row]) != expected:
+                    failures.append((positions[j], f"exact_bulk : {int(values[row])} au lieu de {expected}"))
+    return failures
+
+
+def _check_whatif(cases):
+    failures = []
+    for k, case in enumerate(cases):
+        for column, got, expected in check_current(case.plan, case.cx_quota, case.c4_quota):
+            failures.append((k, f"what-if, réglages en cours : {column} {got} au lieu de {expected}"))
+    return failures
+
+
+def _check_daystore(cases):
+    failures = []
+    for k, case in enumerate(cases):
+        plan = case.plan
+        store = DayCodeStore()
+        for d, code in zip(plan.dates(), plan.codes):
+            if code is not None:
+                store.set(d, code)
+        loaded = DayCodeStore.from_json(store.to_json())
+        message = diff_codes(plan, plan.codes, [loaded.get(d) for d in plan.dates()])
+        if message:
+            failures.append((k, f"DayCodeStore après to_json/from_json : {message}"))
+    return failures
+
+
+def _check_incremental(cases):
+    failures = []
+    for k, case in enumerate(cases):
+        plan = case.plan
+        dates = plan.dates()
+        tables = functools.lru_cache(maxsize=None)(lambda year: build_year_rules(
+            _year_calendar(year, plan.holidays), plan.zz_odd, plan.zz_even, plan.parity_choice
+        ))
+        store = DayCodeStore()
+        for d, code in zip(dates, reference_rules(plan)):  # calendrier laissé par une passe complète
+            store.set(d, code)
+        # modifications tirées du plan : un cas réduit (shrink) en tire d'autres, de la même façon
+        rng = random.Random(repr(plan))
+        for _ in range(EDITS_PER_CASE):
+            d, code = rng.choice(dates), rng.choice(EDIT_CODES)
+            store.set(d, code)
+            expected = reference.reference_rules(replace(plan, codes=tuple(store.get(day) for day in dates)))
+            apply_rules_from(store, [d], DateRange(dates[0], dates[-1]), tables)
+            message = diff_codes(plan, expected, [store.get(day) for day in dates])
+            if message:
+                failures.append((k, f"règles incrémentales après {code} le {d} : {message}"))
+                break
+    return failures
+
+
+def _brute_forceable(case: Case):
+    return len(case.plan.codes) <= BRUTE_FORCE_DAYS and case.cx_quota + case.c4_quota <= BRUTE_FORCE_BUDGET
+
+
+def brute_force_optimum(case: Case):
+    """Meilleur total de la référence sur tous les placements d'au plus cx_quota CX et c4_quota C4."""
+    plan = case.plan
+    free = [d for d, code in zip(plan.dates(), plan.codes) if code not in ("CX", "C4")]
+    best = reference.reference_total(plan)[0]
+    for size in range(1, case.cx_quota + case.c4_quota + 1):
+        for days in itertools.combinations(free, size):
+            for n_cx in range(max(0, size - case.c4_quota), min(size, case.cx_quota) + 1):
+                for cx_days in itertools.combinations(days, n_cx):
+                    c4_days = [d for d in days if d not in cx_days]
+                    best = max(best, reference.reference_total(_plan_with(plan, cx_days, c4_days))[0])
+    return best
+
+
+def _check_exact(cases):
+    failures = []
+    for k, case in enumerate(cases):
+        plan = case.plan
+        value, placed_cx, placed_c4 = exact_placement(plan, case.cx_quota, case.c4_quota)
+        placed = placed_cx + placed_c4
+        if (len(placed_cx) > case.cx_quota or len(placed_c4) > case.c4_quota or len(set(placed)) != len(placed)
+                or any(plan.index(d) is None for d in placed)):
+            failures.append((k, f"exact : placement invalide CX {_days(placed_cx)} C4 {_days(placed_c4)}"))
+            continue
+        reached = reference.reference_total(_plan_with(plan, placed_cx, placed_c4))[0]
+        if reached != value:
+            failures.append((k, f"exact : annonce {value}, la référence compte {reached} avec "
+                                f"CX {_days(placed_cx)} C4 {_days(placed_c4)}"))
+            continue
+        if _brute_forceable(case):
+            optimum = brute_force_optimum(case)
+            if optimum != value:
+                failures.append((k, f"exact : {value} au lieu de l'optimum {optimum}"))
+    return failures
+
+
+ENGINES = [
+    rules_engine("apply_rules", apply_rules),
+    Engine("apply_rules_bulk", _check_rules_bulk),
+    total_engine("evaluate_plan", evaluate_plan),
+    total_engine("evaluate_final", _evaluate_final_codes),
+    total_engine("evaluation_cache", evaluations.evaluate),
+    Engine("absence_bulk", _check_absence_bulk),
+    Engine("is_effective_cz", _check_effective_cz),
+    Engine("daystore", _check_daystore),
+    Engine("incremental", _check_incremental),
+    Engine("vacs_days_from", _check_vacs_days_from),
+    Engine("exact", _check_exact, max_days=62),
+    Engine("exact_bulk", _check_exact_bulk, max_days=62),
+    Engine("greedy", _check_greedy, max_days=21),
+    Engine("whatif", _check_whatif, max_days=62),
+]
+
+
+def load_plugin(spec):
+    """Moteurs de `module:attribut` (un Engine ou une liste d'Engine)."""
+    module_name, _, attr = spec.partition(":")
+    engines = getattr(importlib.import_module(module_name), attr or "ENGINES")
+    return [engines] if isinstance(engines, Engine) else list(engines)
+
+
+def select_engines(plugins=(), names=None):
+    """Moteurs intégrés et ceux des `plugins`, restreints aux noms `names` s'ils sont donnés."""
+    engines = ENGINES + [engine for spec in plugins for engine in load_plugin(spec)]
+    if names:
+        unknown = set(names) - {engine.name for engine in engines}
+        if unknown:
+            raise ValueError(f"moteur(s) inconnu(s) : {', '.join(sorted(unknown))}")
+        engines = [engine for engine in engines if engine.name in names]
+    return engines
+
+
+# ---------------------------
+# Exécution et réduction
+# ---------------------------
+def check_cases(engine: Engine, cases):
+    """Comme engine.check, une exception du moteur étant un désaccord sur le cas qui la lève."""
+    try:
+        return engine.check(cases)
+    except Exception as exc:
+        if len(cases) == 1:
+            return [(0, f"exception : {type(exc).__name__}: {exc}")]
+    failures = []
+    for k, case in enumerate(cases):
+        failures += [(k, message) for _, message in check_cases(engine, [case])]
+    return failures
+
+
+def _failure_message(engine: Engine, case: Case):
+    failures = check_cases(engine, [case])
+    return failures[0][1] if failures else None
+
+
+def _simpler(case: Case):
+    """Variantes plus simples du cas, des plus grosses réductions aux plus petites."""
+    plan = case.plan
+    n = len(plan.codes)
+    if case.cx_quota:
+        yield case._replace(cx_quota=case.cx_quota - 1)
+    if case.c4_quota:
+        yield case._replace(c4_quota=case.c4_quota - 1)
+    for keep in sorted({n // 2, n - 1} - {0}):
+        yield case._replace(plan=replace(plan, codes=plan.codes[:keep]))
+    for drop in sorted({n // 2, 7, 1}, reverse=True):
+        if 0 < drop < n:
+            yield case._replace(plan=replace(plan, start=plan.day(drop), codes=plan.codes[drop:]))
+    inside = frozenset(d for d in plan.holidays if plan.index(d) is not None)
+    if inside != plan.holidays:
+        yield case._replace(plan=replace(plan, holidays=inside))
+    for d in sorted(plan.holidays):
+        yield case._replace(plan=replace(plan, holidays=plan.holidays - {d}))
+    for i in range(n - 2, 0, -1):
+        # jour du milieu retiré : les précédents reculent d'un jour, ou les suivants avancent
+        codes = plan.codes[:i] + plan.codes[i + 1:]
+        yield case._replace(plan=replace(plan, start=plan.day(1), codes=codes))
+        yield case._replace(plan=replace(plan, codes=codes))
+    for field in ("zz_odd", "zz_even"):
+        chosen = getattr(plan, field)
+        for day in chosen:
+            yield case._replace(plan=replace(plan, **{field: tuple(x for x in chosen if x != day)}))
+    for simple in (None, "TRA"):
+        for i, code in enumerate(plan.codes):
+            if code is not None and code != simple:
+                yield case._replace(plan=plan.with_code(i, simple))
+
+
+def shrink(engine: Engine, case: Case, message, max_tries=5000):
+    """Réduit le cas tant qu'il met encore le moteur en défaut : (cas minimal, message)."""
+    tries = 0
+    progress = True
+    while progress and tries < max_tries:
+        progress = False
+        for candidate in _simpler(case):
+            tries += 1
+            found = _failure_message(engine, candidate)
+            if found:
+                case, message, progress = candidate, found, True
+                break
+            if tries >= max_tries:
+                break
+    return case, message
+
+
+class EngineStats:
+    def __init__(self):
+        self.cases = 0
+        self.seconds = 0.0
+        self.failure = None
+
+
+def fuzz(engines, cases=10_000, seed=0, max_days=DEFAULT_MAX_DAYS, seconds=None):
+    """
+    Soumet `cases` cas tirés de `seed` (ou autant que possible en `seconds` secondes) à chaque
+    moteur. Un moteur est écarté à son premier désaccord, réduit par shrink.
+    Retourne ({nom: EngineStats}, [Failure]).
+    """
+    rng = random.Random(seed)
+    stats = {engine.name: EngineStats() for engine in engines}
+    deadline = None if seconds is None else time.perf_counter() + seconds
+    generated = 0
+    for group in random_cases(rng, max_days):
+        if generated >= cases or (deadline is not None and time.perf_counter() > deadline):
+            break
+        group = group[:cases - generated]
+        generated += len(group)
+        for engine in engines:
+            s = stats[engine.name]
+            if s.failure is not None:
+                continue
+            batch = [c for c in group if not engine.max_days or len(c.plan.codes) <= engine.max_days]
+            if not batch:
+                continue
+            t0 = time.perf_counter()
+            failures = check_cases(engine, batch)
+            s.seconds += time.perf_counter() - t0
+            s.cases += len(batch)
+            if failures:
+                k, message = failures[0]
+                s.failure = Failure(engine.name, *shrink(engine, batch[k], message))
+    return stats, [s.failure for s in stats.values() if s.failure is not None]
+
+
+def _fuzz_shard(job):
+    plugins, names, cases, seed, max_days, seconds = job
+    return fuzz(select_engines(plugins, names), cases, seed, max_days, seconds)
+
+
+def fuzz_parallel(plugins=(), names=None, cases=10_000, seed=0, max_days=DEFAULT_MAX_DAYS, seconds=None, workers=1):
+    """
+    Comme fuzz, sur `workers` processus : chacun tire sa part des cas d'une graine dérivée de
+    `seed` et reconstruit les moteurs (select_engines) ; les durées des moteurs s'additionnent.
+    """
+    if workers <= 1:
+        return fuzz(select_engines(plugins, names), cases, seed, max_days, seconds)
+    jobs = [(tuple(plugins), names, cases // workers + (k < cases % workers), f"{seed}-{k}", max_days, seconds)
+            for k in range(workers)]
+    stats = {}
+    for shard_stats, _ in map_in_order(_fuzz_shard, jobs, workers):
+        for name, s in shard_stats.items():
+            total = stats.setdefault(name, EngineStats())
+            total.cases += s.cases
+            total.seconds += s.seconds
+            total.failure = total.failure or s.failure
+    return stats, [s.failure for s in stats.values() if s.failure is not None]
+
+
+# ---------------------------
+# Affichage et rejeu
+# ---------------------------
+def describe(case: Case):
+    """Le cas jour par jour : semaine, 3-ZZ, jour ZZ choisi, férié, code stocké -> code final de la référence."""
+    plan = case.plan
+    ref = ReferenceCalendar(plan)
+    final = reference.reference_rules(plan)
+    lines = [f"début {plan.start}, {len(plan.codes)} jour(s), ZZ impaires {list(plan.zz_odd)}, "
+             f"paires {list(plan.zz_even)}, parité {plan.parity_choice}, CX {case.cx_quota}, C4 {case.c4_quota}"]
+    outside = sorted(d for d in plan.holidays if plan.index(d) is None)
+    if outside:
+        lines.append(f"fériés hors plage : {_days(outside)}")
+    for d, code, final_code in zip(plan.dates(), plan.codes, final):
+        week = d.isocalendar()[1]
+        chosen = plan.zz_even if week % 2 == 0 else plan.zz_odd
+        flags = [f"S{week:02d}", "3-ZZ" if ref.week_is_three_zz(d) else "",
+                 "ZZ" if WEEKDAYS_FR[d.weekday()] in chosen else "", "férié" if d in plan.holidays else ""]
+        lines.append(f"  {d} {WEEKDAYS_FR[d.weekday()][:3]} {' '.join(f'{x:5s}' for x in flags)} "
+                     f"{code or '-':3s} -> {final_code}")
+    return "\n".join(lines)
+
+
+def case_to_json(case: Case):
+    plan = case.plan
+    return {
+        "start": plan.start.isoformat(),
+        "codes": list(plan.codes),
+        "holidays": sorted(d.isoformat() for d in plan.holidays),
+        "zz_odd": list(plan.zz_odd),
+        "zz_even": list(plan.zz_even),
+        "parity_choice": plan.parity_choice,
+        "cx_quota": case.cx_quota,
+        "c4_quota": case.c4_quota,
+    }
+
+
+def case_from_json(obj):
+    return Case(
+        Plan(
+            start=date.fromisoformat(obj["start"]),
+            codes=tuple(obj["codes"]),
+            holidays=frozenset(date.fromisoformat(d) for d in obj["holidays"]),
+            zz_odd=tuple(obj["zz_odd"]),
+            zz_even=tuple(obj["zz_even"]),
+            parity_choice=obj["parity_choice"],
+        ),
+        cx_quota=obj.get("cx_quota", 0),
+        c4_quota=obj.get("c4_quota", 0),
+    )
+
+
+def replay(engines, entries):
+    """Rejoue les cas enregistrés ({"engine", "case"}) : [Failure] des désaccords encore présents."""
+    by_name = {engine.name: engine for engine in engines}
+    failures = []
+    for entry in entries:
+        engine = by_name.get(entry["engine"])
+        if engine is None:
+            continue
+        case = case_from_json(entry["case"])
+        message = _failure_message(engine, case)
+        if message:
+            failures.append(Failure(engine.name, case, message))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fuzzing différentiel des moteurs contre l'implémentation de référence.")
+    parser.add_argument("--cases", type=int, default=10_000, help="nombre de cas tirés")
+    parser.add_argument("--seconds", type=float, help="arrête le tirage après ce temps")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-days", type=int, default=DEFAULT_MAX_DAYS, help="longueur maximale d'un cas")
+    parser.add_argument("--plugin", action="append", default=[], help="moteurs supplémentaires (module:attribut)")
+    parser.add_argument("--engines", nargs="+", help="moteurs à vérifier (par défaut : tous)")
+    parser.add_argument("--workers", type=int, default=1, help="processus (débit affiché : par processus)")
+    parser.add_argument("--replay", help="rejoue les cas d'un fichier écrit par --out au lieu d'en tirer")
+    parser.add_argument("--out", help="enregistre les cas minimaux en désaccord (JSON)")
+    args = parser.parse_args(argv)
+
+    try:
+        engines = select_engines(args.plugin, args.engines)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    if args.replay:
+        with open(args.replay, "r", encoding="utf-8") as f:
+            failures = replay(engines, json.load(f))
+    else:
+        t0 = time.perf_counter()
+        stats, failures = fuzz_parallel(args.plugin, args.engines, args.cases, args.seed, args.max_days, args.seconds,
+                                        args.workers)
+        for name, s in stats.items():
+            rate = s.cases / s.seconds if s.seconds else 0.0
+            status = "ÉCART" if s.failure else "ok"
+            print(f"{name:20s} {s.cases:8d} cas {s.seconds:8.2f} s {rate:10.0f} cas/s  {status}")
+        print(f"{time.perf_counter() - t0:.1f} s au total")
+
+    for failure in failures:
+        print(f"\n[{failure.engine}] {failure.message}\n{describe(failure.case)}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump([{"engine": x.engine, "message": x.message, "case": case_to_json(x.case)} for x in failures],
+                      f, ensure_ascii=False, indent=2)
+    if failures:
+        sys.exit(1)
+    if not args.replay:
+        print("Aucun écart avec la référence.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Règles métier réappliquées au calendrier chargé (planning.daystore.DayCodeStore) après
+modification de quelques jours, sans repasser sur toute la période.
+
+Le calendrier de départ est celui qu'a laissé une passe complète (apply_business_rules de
+Conge.py, planning.reference pour l'ancien code) ; le résultat est celui qu'aurait donné une
+nouvelle passe complète après les modifications. Les tables de l'année (`tables`, année ->
+planning.calendar_meta.YearRules) donnent code par défaut et semaines 3-ZZ de chaque jour.
+"""
+from datetime import date
+
+from planning import metrics
+from planning.ruleset import active_ruleset
+
+
+def normalized_code(table, d: date, code):
+    """Étapes 1 et 2 de la passe complète pour un seul jour : defaults TRA/ZZ/FC puis retour des CZ."""
+    default = table.default_code[table.index(d)]
+    if default == "FC":
+        return "FC"
+    if default == "ZZ":
+        return code if code == "FC" else "ZZ"
+    if code is None or code == "CZ":
+        return "TRA"
+    return code
+
+
+def apply_rules_from(store, changed, scope, tables, ruleset=None):
+    """
+    Équivalent de la passe complète sur `scope` après modification des seuls jours `changed` :
+    seuls les segments allant du précédent code qui fixe l'état de l'automate (CX/TRA/C4 pour
+    l'accord par défaut, voir RuleSet.resets) jusqu'au suivant sont recalculés, le reste ne
+    peut pas changer. Le calendrier laissé par une passe complète n'est pas un point fixe des
+    règles : un ZZ posé à la main hors sélection et passé en CZ est remis en TRA par la passe
+    suivante. Les jours que la normalisation change sont donc recalculés comme les jours
+    modifiés, où qu'ils soient dans la période.
+    """
+    metrics.count("rules_incremental")
+    rules = active_ruleset() if ruleset is None else ruleset
+    all_dates = scope.dates()
+    codes = [store.get(d) for d in all_dates]
+    normalized = [normalized_code(tables(d.year), d, code) for d, code in zip(all_dates, codes)]
+    starts = {scope.index(d) for d in changed} - {None}
+    starts.update(i for i, (code, norm) in enumerate(zip(codes, normalized)) if norm != code)
+
+    segments = []  # [premier, dernier] jours recalculés, fusionnés
+    for start in sorted(starts):
+        if segments and start <= segments[-1][1]:
+            continue
+        first = 0
+        for i in range(start - 1, -1, -1):
+            if normalized[i] in rules.resets:
+                first = i
+                break
+        last = start
+        while last + 1 < len(all_dates) and (last + 1 in starts or normalized[last + 1] not in rules.resets):
+            last += 1
+        last = min(last + 1, len(all_dates) - 1)
+        if segments and first <= segments[-1][1]:
+            segments[-1][1] = last
+        else:
+            segments.append([first, last])
+
+    for first, last in segments:
+        dates = all_dates[first:last + 1]
+        three_zz = []
+        for d in dates:
+            table = tables(d.year)
+            three_zz.append(table.three_zz[table.index(d)])
+        final = rules.apply_codes(normalized[first:last + 1], three_zz)
+        for d, code, old in zip(dates, final, codes[first:last + 1]):
+            if code != old:
+                store.set(d, code)
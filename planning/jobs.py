@@ -0,0 +1,188 @@
+"""
+Optimisations en tâche de fond.
+
+Une JobQueue (une par processus) exécute les tâches dans l'ordre d'arrivée sur un nombre fixe
+de threads : plusieurs utilisateurs qui lancent une optimisation en même temps sont mis en
+file d'attente au lieu de se disputer le processeur. Chaque tâche travaille sur une copie
+immuable du calendrier (planning.Plan) prise au lancement, publie son avancement et peut être
+annulée ; son résultat est appliqué par l'appelant, en une fois, quand elle est terminée.
+"""
+from collections import deque
+from dataclasses import dataclass, field
+import itertools
+import threading
+import time
+
+from planning.coverage import coverage_placement
+from planning.optimize import anytime_search, exact_placement, greedy_placement, placed_result
+from planning.result_cache import cached_placement
+from planning.ruleset import is_default_ruleset
+
+QUEUED, RUNNING, DONE, CANCELLED, FAILED = "en attente", "en cours", "terminée", "annulée", "échec"
+
+
+class Cancelled(Exception):
+    """Levée par Job.report quand la tâche a été annulée."""
+
+
+@dataclass(eq=False)
+class Job:
+    id: int
+    description: str
+    func: object
+    args: tuple
+    context: dict = field(default_factory=dict)  # données de l'appelant (employé, période, plan de départ...)
+    status: str = QUEUED
+    progress: float = 0.0
+    message: str = ""
+    result: object = None
+    error: str = ""
+    created: float = field(default_factory=time.time)
+    started: float = None
+    finished: float = None
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def report(self, progress, message=""):
+        """Avancement (0 à 1) publié par la tâche ; point d'annulation."""
+        self.progress = max(0.0, min(1.0, progress))
+        self.message = message
+        if self.cancelled:
+            raise Cancelled
+
+
+class JobQueue:
+    def __init__(self, workers=1):
+        self._ids = itertools.count(1)
+        self._lock = threading.Condition()
+        self._pending = deque()
+        self._jobs = {}
+        self._threads = [
+            threading.Thread(target=self._work, name=f"optimisation-{k}", daemon=True) for k in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, func, *args, description="", context=None):
+        """Met `func(job, *args)` en file d'attente ; retourne la tâche (Job)."""
+        with self._lock:
+            job = Job(next(self._ids), description, func, args, dict(context or {}))
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._lock.notify()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def position(self, job):
+        """Rang de la tâche dans la file d'attente (1 = prochaine), None si elle n'y est plus."""
+        with self._lock:
+            for k, pending in enumerate(self._pending, start=1):
+                if pending is job:
+                    return k
+        return None
+
+    def cancel(self, job_id):
+        """Annule la tâche : retirée de la file si elle attend, arrêtée au prochain point d'annulation sinon."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.active:
+                return
+            job.cancel()
+            if job.status == QUEUED:
+                self._pending.remove(job)
+                job.status, job.finished = CANCELLED, time.time()
+
+    def forget(self, job_id):
+        """Oublie une tâche terminée (son résultat a été appliqué ou abandonné)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and not job.active:
+                del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._lock.wait()
+                job = self._pending.popleft()
+                job.status, job.started = RUNNING, time.time()
+            try:
+                result = job.func(job, *job.args)
+            except Cancelled:
+                job.status = CANCELLED
+            except Exception as exc:  # la tâche échoue, pas le thread
+                job.error = f"{type(exc).__name__}: {exc}"
+                job.status = FAILED
+            else:
+                job.result = result
+                job.status = CANCELLED if job.cancelled else DONE
+            job.finished = time.time()
+
+
+# ---------------------------
+# Tâche d'optimisation
+# ---------------------------
+def optimize_job(job: Job, plan, cx_quota, c4_quota, method="exact", budget=3.0, k=5, workers=1, cache=None):
+    """
+    Tâche d'optimisation de `plan` :
+    - "exact" / "greedy" : (OptimizeResult, total optimal exact), placements lus dans / enregistrés
+      dans `cache` (planning.result_cache.ResultCache) s'il est fourni ; l'optimum vaut None sous
+      d'autres règles que l'accord par défaut, que l'optimisation exacte ne connaît pas ;
+    - "anytime" : liste de Candidate (voir optimize.anytime_search).
+    """
+    if method == "anytime":
+        best = []
+        for step in anytime_search(plan, cx_quota, c4_quota, budget, k, should_stop=lambda: job.cancelled):
+            best = step.best
+            job.report(step.elapsed / step.budget, f"{step.evaluations} plans évalués, meilleur : "
+                                                   f"{best[0].total if best else 0} jours")
+        if job.cancelled:
+            raise Cancelled
+        return best
+
+    optimal = None
+    if method == "exact" or is_default_ruleset():
+        job.report(0.0, "optimum exact")
+        optimal, placed_cx, placed_c4 = cached_placement(
+            cache, "exact", plan, cx_quota, c4_quota, lambda: exact_placement(plan, cx_quota, c4_quota)
+        )
+    if method == "greedy":
+        def greedy():
+            placed = greedy_placement(
+                plan, cx_quota, c4_quota, workers,
+                should_stop=lambda: job.cancelled,
+                on_round=lambda done, total: job.report(done / max(total, 1), f"{done}/{total} jours posés"),
+            )
+            if job.cancelled:
+                raise Cancelled  # placement incomplet : pas mis en cache
+            return (None, *placed)
+
+        _, placed_cx, placed_c4 = cached_placement(cache, "greedy", plan, cx_quota, c4_quota, greedy)
+    elif method != "exact":
+        raise ValueError(f"méthode d'optimisation inconnue : {method!r}")
+    result = placed_result(plan, placed_cx, placed_c4)
+    job.report(1.0, "terminé")
+    return result, optimal
+
+
+def coverage_job(job: Job, team, cx_quota, c4_quota, min_staff, fairness=0.0, budget=30.0):
+    """Tâche de planning d'équipe sous effectif minimum : TeamPlacement (voir coverage.coverage_placement)."""
+    result = coverage_placement(
+        team, cx_quota, c4_quota, min_staff, fairness, budget,
+        should_stop=lambda: job.cancelled, on_progress=job.report,
+    )
+    if job.cancelled:
+        raise Cancelled
+    return result
@@ -0,0 +1,133 @@
+"""
+Mesures de temps par phase et compteurs (appels au moteur de règles, évaluations, écritures).
+
+Un Recorder est installé pour le thread courant (un rerun Streamlit s'exécute dans un thread) ;
+sans Recorder installé, phase(), lap() et count() ne font rien, le coût est alors celui d'un appel de
+fonction. Chaque rerun terminé peut être ajouté à un journal JSON lines et les cumuls du
+processus écrits au format texte Prometheus.
+"""
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+import json
+import os
+import threading
+import time
+
+_local = threading.local()
+_NULL_PHASE = nullcontext()
+_totals_lock = threading.Lock()
+_totals = Counter()  # cumuls du processus (compteurs et secondes par phase)
+_last_phases = {}
+
+
+class Recorder:
+    """Durées (secondes, cumulées par nom de phase) et compteurs d'un rerun."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.phases = {}
+        self.counters = Counter()
+        self._lap = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - t0
+
+    def lap(self, name=None):
+        """Attribue à `name` le temps écoulé depuis le tour précédent (None : repart de maintenant)."""
+        now = time.perf_counter()
+        if name is not None:
+            self.phases[name] = self.phases.get(name, 0.0) + now - self._lap
+        self._lap = now
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def record(self, **extra):
+        """Enregistrement sérialisable du rerun (durées en millisecondes)."""
+        return {
+            "ts": datetime.fromtimestamp(self.started).isoformat(timespec="milliseconds"),
+            **extra,
+            "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()},
+            "counters": dict(self.counters),
+        }
+
+
+# ---------------------------
+# Recorder du thread courant
+# ---------------------------
+def install(recorder):
+    """Installe `recorder` pour le thread courant (None : mesures désactivées)."""
+    _local.recorder = recorder
+
+
+def current():
+    return getattr(_local, "recorder", None)
+
+
+def phase(name):
+    recorder = getattr(_local, "recorder", None)
+    return _NULL_PHASE if recorder is None else recorder.phase(name)
+
+
+def lap(name=None):
+    """Phase mesurée par tours successifs : utile pour le corps d'un script, sans bloc with."""
+    recorder = getattr(_local, "recorder", None)
+    if recorder is not None:
+        recorder.lap(name)
+
+
+def count(name, n=1):
+    recorder = getattr(_local, "recorder", None)
+    if recorder is not None:
+        recorder.counters[name] += n
+
+
+# ---------------------------
+# Sorties
+# ---------------------------
+def finish(recorder, jsonl_path=None, prometheus_path=None, **extra):
+    """Clôt un rerun : ajoute son enregistrement au journal, met à jour les cumuls et le fichier Prometheus."""
+    record = recorder.record(**extra)
+    with _totals_lock:
+        _totals.update(recorder.counters)
+        _totals["reruns"] += 1
+        for name, seconds in recorder.phases.items():
+            _totals[f"seconds:{name}"] += seconds
+            _last_phases[name] = seconds
+        if jsonl_path:
+            with open(jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if prometheus_path:
+            write_prometheus(prometheus_path)
+    return record
+
+
+def write_prometheus(path):
+    lines = [
+        "# HELP conge_events_total Événements cumulés depuis le démarrage du processus.",
+        "# TYPE conge_events_total counter",
+    ]
+    lines += [f'conge_events_total{{name="{name}"}} {value}' for name, value in sorted(_totals.items())
+              if not name.startswith("seconds:")]
+    lines += [
+        "# HELP conge_phase_seconds_total Temps cumulé par phase de rerun.",
+        "# TYPE conge_phase_seconds_total counter",
+    ]
+    lines += [f'conge_phase_seconds_total{{phase="{name[8:]}"}} {value:.6f}' for name, value in sorted(_totals.items())
+              if name.startswith("seconds:")]
+    lines += [
+        "# HELP conge_last_phase_seconds Durée de chaque phase au dernier rerun.",
+        "# TYPE conge_last_phase_seconds gauge",
+    ]
+    lines += [f'conge_last_phase_seconds{{phase="{name}"}} {value:.6f}' for name, value in sorted(_last_phases.items())]
+    # écriture atomique : un collecteur ne lit jamais un fichier à moitié écrit
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
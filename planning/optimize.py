@@ -0,0 +1,521 @@
+"""
+Placement des CX/C4 sur un plan (planning.Plan), sans Streamlit ni état global.
+
+- greedy_placement : pose les jours un à un par gain marginal (ancien optimize_placement) ;
+- exact_placement : plan optimal par programmation dynamique, contrôlé par force brute sur de
+  petits calendriers aléatoires (check_exact, python -m planning.optimize --check) ;
+- anytime_search : recherche locale bornée dans le temps, qui rend les K meilleurs placements ;
+- optimize_plan : glouton ou exact, avec le plan résultant et son total d'absence (résultat
+  lu dans le cache disque planning.result_cache s'il est fourni).
+"""
+import argparse
+from dataclasses import replace
+from datetime import date, timedelta
+import heapq
+import itertools
+import random
+import sys
+import time
+from typing import NamedTuple
+
+from planning.cache import evaluations
+from planning.parallel import CandidateScorer
+from planning.result_cache import cached_placement
+from planning.rules import WEEKDAYS_FR, Plan, apply_rules, day_flags, evaluate_plan, normalize_code, vacs_days_from
+from planning.ruleset import is_default_ruleset, require_default_ruleset
+
+METHODS = ("exact", "greedy")
+
+
+class OptimizeResult(NamedTuple):
+    plan: Plan  # plan avec les CX/C4 posés (codes stockés)
+    total: int
+    days: list
+    placed_cx: list
+    placed_c4: list
+
+
+# ---------------------------
+# Optimisation gloutonne
+# ---------------------------
+def greedy_placement(plan: Plan, cx_quota, c4_quota, workers=1, should_stop=None, on_round=None):
+    """
+    Retourne (CX à poser, C4 à poser) : chaque jour posé est celui qui augmente le plus le
+    total d'absence (le premier en cas d'égalité), les essais étant notés par un
+    CandidateScorer (un seul pool de `workers` processus pour toute l'optimisation).
+    D'un tour à l'autre les mêmes plans candidats reviennent : ils sont lus dans le cache
+    d'évaluations (planning.cache).
+    `should_stop()` est consulté avant chaque jour posé : s'il est vrai, le placement est rendu
+    tel quel (incomplet) ; `on_round(posés, à poser)` est appelé après chaque jour posé.
+    """
+    with CandidateScorer(plan, workers) as scorer:
+        return _greedy_rounds(plan, cx_quota, c4_quota, scorer, should_stop, on_round)
+
+
+def _greedy_rounds(plan: Plan, cx_quota, c4_quota, scorer, should_stop, on_round):
+    candidates = [i for i, code in enumerate(plan.codes) if code not in ("CX", "C4")]
+    placed_cx = []
+    placed_c4 = []
+    baseline_cnt, _ = evaluations.evaluate(plan)
+
+    # placer CX par gain marginal (fallback earliest pour consommer quota)
+    for _ in range(int(cx_quota)):
+        if should_stop is not None and should_stop():
+            break
+        best_gain = -1
+        best_i = None
+        remaining = [i for i in candidates if i not in placed_cx and i not in placed_c4]
+        for i, cnt in zip(remaining, scorer.score(plan, remaining, "CX")):
+            gain = cnt - baseline_cnt
+            if gain > best_gain:
+                best_gain = gain
+                best_i = i
+        if best_i is None:
+            for i in candidates:
+                if i not in placed_cx and i not in placed_c4:
+                    best_i = i
+                    break
+        if best_i is None:
+            break
+        plan = plan.with_code(best_i, "CX")
+        placed_cx.append(best_i)
+        baseline_cnt, _ = evaluations.evaluate(plan)
+        if on_round is not None:
+            on_round(len(placed_cx), int(cx_quota) + int(c4_quota))
+
+    # placer C4 par gain marginal (fallback heuristique)
+    for _ in range(int(c4_quota)):
+        if should_stop is not None and should_stop():
+            break
+        best_gain = -1
+        best_i = None
+        remaining = [i for i in candidates if i not in placed_cx and i not in placed_c4]
+        for i, cnt in zip(remaining, scorer.score(plan, remaining, "C4")):
+            gain = cnt - baseline_cnt
+            if gain > best_gain:
+                best_gain = gain
+                best_i = i
+        if best_i is None:
+            if placed_cx:
+                # lendemain de la VACS (ZZ/FC collés compris) parcourue depuis le dernier CX posé,
+                # comme simulate_vacs_from : le CX a pu redevenir ZZ ou FC
+                days = vacs_days_from(plan, apply_rules(plan), placed_cx[-1])
+                if days and plan.index(days[-1]) + 1 < len(plan.codes):
+                    best_i = plan.index(days[-1]) + 1
+        if best_i is None:
+            break
+        plan = plan.with_code(best_i, "C4")
+        placed_c4.append(best_i)
+        baseline_cnt, _ = evaluations.evaluate(plan)
+        if on_round is not None:
+            on_round(len(placed_cx) + len(placed_c4), int(cx_quota) + int(c4_quota))
+
+    return [plan.day(i) for i in placed_cx], [plan.day(i) for i in placed_c4]
+
+
+# ---------------------------
+# Optimisation exacte (programmation dynamique)
+# ---------------------------
+def exact_placement(plan: Plan, cx_quota, c4_quota, blocked=frozenset()):
+    """
+    Calcule le plan optimal : retourne (total, CX à poser, C4 à poser). Aucun jour n'est posé
+    aux positions `blocked` (jours fermés aux congés, voir planning.coverage).
+
+    Seule la VACS ouverte par le premier CX est comptée : elle court jusqu'au premier TRA,
+    plus les ZZ/FC collés avant et après. On essaie chaque début possible et une
+    programmation dynamique (de droite à gauche, par compteur restant) choisit les TRA à combler ;
+    après le début, CX et C4 sont interchangeables pour le décompte.
+    Un ZZ hors semaine 3-ZZ n'est compté que dans la queue de la VACS (après le dernier jour
+    compté) : l'état "queue" de la DP reproduit ce cas. Un code inconnu n'est ni compté ni
+    frontière : la VACS le traverse, mais une queue ne peut plus commencer avant le prochain jour
+    compté (état 2) et une queue qu'il interrompt ne doit plus être suivie d'un jour compté (état 3).
+    Un FC saisi sur un jour ZZ choisi (hors férié) redevient ZZ si l'on pose dessus : ce peut
+    être le seul moyen de rallonger la queue, la DP le propose comme un jour à combler.
+    Ces règles sont celles de l'accord par défaut, codées en dur : ValueError si un autre
+    fichier de règles est en vigueur (planning.ruleset).
+    """
+    require_default_ruleset("L'optimisation exacte")
+    cx_quota, c4_quota = int(cx_quota), int(c4_quota)
+    n = len(plan.codes)
+    if n == 0:
+        return 0, [], []
+
+    base, kinds, free, demote = [], [], [], []
+    for code, (holiday, zz_day, three_zz) in zip(plan.codes, day_flags(plan)):
+        code = normalize_code(code, holiday, zz_day)
+        base.append(code)
+        free.append(code not in ("CX", "C4") and not holiday and not zz_day and len(free) not in blocked)
+        # FC saisi sur un jour ZZ choisi (hors férié) : un CX/C4 posé dessus le rend ZZ
+        demote.append(code == "FC" and zz_day and not holiday and not three_zz and len(demote) not in blocked)
+        if code == "TRA":
+            kinds.append("stop")
+        elif code == "ZZ" and not three_zz:
+            kinds.append("tail")
+        elif code in ("CX", "C4", "CZ", "FC", "ZZ"):
+            kinds.append("count")
+        else:
+            kinds.append("skip")  # code inconnu : ni compté ni frontière, mais coupe la queue
+
+    budget = cx_quota + c4_quota
+    neg = -(n + 1)
+    # best[état][i][k] : meilleur décompte des jours i.. de la VACS avec k jours à combler ;
+    # état 0 : courant, 1 : queue, 2 : un jour ni compté ni ZZ/FC depuis le dernier compté (pas
+    # de queue avant le prochain jour compté), 3 : queue finie (plus rien de compté jusqu'au
+    # TRA) ; ligne n à 0 : la plage s'arrête
+    zeros, negs = [0] * (budget + 1), [neg] * (budget + 1)
+    best = [[None] * n + [zeros] for _ in range(4)]
+    # sans code inconnu, les états 2 et 3 ne sont jamais atteints : pas calculés
+    extended = "skip" in kinds
+
+    for i in range(n - 1, -1, -1):
+        kind = kinds[i]
+        nxt0, nxt1, nxt2, nxt3 = best[0][i + 1], best[1][i + 1], best[2][i + 1], best[3][i + 1]
+        # fill[k] : combler le jour i (1 + nxt0[k - 1])
+        fill = [neg] + [1 + x for x in nxt0[:-1]] if free[i] and kind != "count" else negs
+        row2 = row3 = None
+        if kind == "stop":
+            row0 = row2 = [0] + fill[1:] if free[i] else zeros
+            row1 = row3 = zeros
+        elif kind == "count":
+            row0 = row2 = [1 + x for x in nxt0]
+            row1 = row3 = negs
+            if demote[i]:
+                # poser rend le FC ZZ : valeurs [k - 1] de chaque état
+                prev0, prev1 = [neg] + nxt0[:-1], [neg] + nxt1[:-1]
+                row0 = [max(a, b, 1 + c) for a, b, c in zip(row2, prev0, prev1)]
+                row1 = [1 + c for c in prev1]
+                if extended:
+                    row2 = [max(a, b) for a, b in zip(row2, [neg] + nxt2[:-1])]
+                    row3 = [neg] + nxt3[:-1]
+        elif kind == "skip":
+            row0 = row2 = [max(a, b) for a, b in zip(nxt2, fill)]
+            row1 = row3 = nxt3
+        else:
+            row0 = [max(a, 1 + b, c) for a, b, c in zip(nxt0, nxt1, fill)]
+            row1 = [1 + b for b in nxt1]
+            if extended:
+                row2 = [max(a, c) for a, c in zip(nxt2, fill)]
+                row3 = nxt3
+        best[0][i], best[1][i] = row0, row1
+        if extended:
+            best[2][i], best[3][i] = row2, row3
+
+    first_cx = next((i for i, code in enumerate(base) if code == "CX"), n)
+    best_value, best_start, best_budget = 0, None, 0
+    for s in range(min(first_cx + 1, n)):
+        if s < first_cx and not (free[s] and cx_quota > 0):
+            continue
+        k = budget - (1 if s < first_cx else 0)
+        back = 0
+        j = s - 1
+        while j >= 0 and base[j] in ("ZZ", "FC"):
+            back += 1
+            j -= 1
+        value = back + 1 + best[0][s + 1][k]
+        if value > best_value or (value == best_value and best_start is not None and s == first_cx):
+            best_value, best_start, best_budget = value, s, k
+    if best_start is None:
+        return 0, [], []
+
+    # reconstruction : à valeur égale on préfère ne rien poser
+    fills = []
+    i, k, state = best_start, best_budget, 0
+    while i + 1 < n:
+        i += 1
+        target = best[state][i][k]
+        nxt0, nxt1, nxt2 = best[0][i + 1], best[1][i + 1], best[2][i + 1]
+        kind = kinds[i]
+        if kind == "stop":
+            if state in (1, 3) or target == 0:
+                break
+            fills.append(i)
+            k -= 1
+            state = 0
+        elif kind == "count":
+            if state in (0, 2) and target == 1 + nxt0[k]:
+                state = 0
+                continue
+            # FC rendu ZZ : compté dans la queue (état 0 -> 1) ou pas du tout
+            fills.append(i)
+            k -= 1
+            if state == 0 and target != nxt0[k]:
+                state = 1
+        elif kind == "skip":
+            if state in (1, 3):
+                state = 3
+            elif target == nxt2[k]:
+                state = 2
+            else:
+                fills.append(i)
+                k -= 1
+                state = 0
+        elif state == 2:
+            if target != nxt2[k]:
+                fills.append(i)
+                k -= 1
+                state = 0
+        elif state == 0:
+            if target == nxt0[k]:
+                continue
+            if target == 1 + nxt1[k]:
+                state = 1
+            else:
+                fills.append(i)
+                k -= 1
+
+    placed_cx = [best_start] if best_start < first_cx else []
+    cx_left = cx_quota - len(placed_cx)
+    placed_cx += fills[:cx_left]
+    placed_c4 = fills[cx_left:]
+    return best_value, [plan.day(i) for i in placed_cx], [plan.day(i) for i in placed_c4]
+
+
+# ---------------------------
+# Contrôle de l'optimum exact (force brute)
+# ---------------------------
+CHECK_CODES = (None, "TRA", "ZZ", "CX", "CZ", "C4", "FC", "XX")  # XX : code inconnu des règles
+
+
+def _with_placement(plan: Plan, placed_cx, placed_c4):
+    codes = list(plan.codes)
+    for d in placed_cx:
+        codes[plan.index(d)] = "CX"
+    for d in placed_c4:
+        codes[plan.index(d)] = "C4"
+    return replace(plan, codes=tuple(codes))
+
+
+def brute_force_placement(plan: Plan, cx_quota, c4_quota):
+    """
+    Meilleur total d'absence (evaluate_plan) parmi tous les placements d'au plus `cx_quota` CX
+    et `c4_quota` C4 sur les jours qui ne sont pas déjà CX/C4 : petits calendriers seulement.
+    """
+    free = [d for d, code in zip(plan.dates(), plan.codes) if code not in ("CX", "C4")]
+    best = evaluate_plan(plan)[0]
+    for size in range(1, cx_quota + c4_quota + 1):
+        for days in itertools.combinations(free, size):
+            for n_cx in range(max(0, size - c4_quota), min(size, cx_quota) + 1):
+                for cx_days in itertools.combinations(days, n_cx):
+                    c4_days = [d for d in days if d not in cx_days]
+                    best = max(best, evaluate_plan(_with_placement(plan, cx_days, c4_days))[0])
+    return best
+
+
+def random_check_plan(rng, max_days=10):
+    """Petit calendrier aléatoire : codes connus ou non, fériés, ZZ sur 0 à 3 jours, parité."""
+    start = date(rng.randint(2019, 2032), 1, 1) + timedelta(days=rng.randrange(366))
+    n = rng.randint(1, max_days)
+    weights = [rng.random() ** 2 for _ in CHECK_CODES]
+    return Plan(
+        start=start,
+        codes=tuple(rng.choices(CHECK_CODES, weights, k=n)),
+        holidays=frozenset(start + timedelta(days=i) for i in range(n) if rng.random() < 0.15),
+        zz_odd=tuple(rng.sample(WEEKDAYS_FR, rng.choice((0, 2, 3)))),
+        zz_even=tuple(rng.sample(WEEKDAYS_FR, rng.choice((0, 2, 3)))),
+        parity_choice=rng.choice(("Paires", "Impaires")),
+    )
+
+
+def check_exact(cases=2000, seed=0, max_days=10, max_budget=3):
+    """
+    Compare exact_placement à la force brute sur `cases` petits calendriers aléatoires (au plus
+    `max_budget` jours à poser) ; retourne les écarts (plan, cx, c4, annoncé, atteint, optimum).
+    Le total annoncé doit être celui du placement rendu et égaler l'optimum.
+    """
+    rng = random.Random(seed)
+    mismatches = []
+    for _ in range(cases):
+        plan = random_check_plan(rng, max_days)
+        cx_quota = rng.randint(0, max_budget)
+        c4_quota = rng.randint(0, max_budget - cx_quota)
+        value, placed_cx, placed_c4 = exact_placement(plan, cx_quota, c4_quota)
+        reached = evaluate_plan(_with_placement(plan, placed_cx, placed_c4))[0]
+        optimum = brute_force_placement(plan, cx_quota, c4_quota)
+        if not value == reached == optimum:
+            mismatches.append((plan, cx_quota, c4_quota, value, reached, optimum))
+    return mismatches
+
+
+# ---------------------------
+# Point d'entrée commun
+# ---------------------------
+def optimize_plan(plan: Plan, cx_quota, c4_quota, method="exact", workers=1, cache=None):
+    """
+    Pose les CX/C4 choisis par `method` ("exact" ou "greedy") et évalue le plan obtenu ;
+    `cache` : planning.result_cache.ResultCache où lire / enregistrer le placement.
+    """
+    if method == "exact":
+        def compute():
+            return exact_placement(plan, cx_quota, c4_quota)
+    elif method == "greedy":
+        def compute():
+            return (None, *greedy_placement(plan, cx_quota, c4_quota, workers))
+    else:
+        raise ValueError(f"méthode d'optimisation inconnue : {method!r} (attendu : {', '.join(METHODS)})")
+    _, placed_cx, placed_c4 = cached_placement(cache, method, plan, cx_quota, c4_quota, compute)
+    return placed_result(plan, placed_cx, placed_c4)
+
+
+def placed_result(plan: Plan, placed_cx, placed_c4):
+    """OptimizeResult de `plan` avec les CX/C4 `placed_cx` / `placed_c4` (dates) posés."""
+    for d in placed_cx:
+        plan = plan.with_code(plan.index(d), "CX")
+    for d in placed_c4:
+        plan = plan.with_code(plan.index(d), "C4")
+    total, days = evaluations.evaluate(plan)
+    return OptimizeResult(plan, total, days, placed_cx, placed_c4)
+
+
+# ---------------------------
+# Recherche anytime (K meilleurs placements)
+# ---------------------------
+class Candidate(NamedTuple):
+    total: int
+    placed_cx: list
+    placed_c4: list
+
+
+class SearchProgress(NamedTuple):
+    elapsed: float  # secondes
+    budget: float
+    evaluations: int
+    best: list  # Candidate, du meilleur au moins bon (au plus k)
+    done: bool
+
+
+def _placement_neighbours(placement, free, free_set, cx_quota, c4_quota, rng, relocations=4):
+    """Placements voisins : un jour décalé de 1 à 3 jours, échange CX/C4, ajout, ou déplacement au hasard."""
+    cx, c4 = placement
+    used = set(cx) | set(c4)
+    out = []
+
+    def with_moved(kind, old, new):
+        days = cx if kind == 0 else c4
+        moved = tuple(sorted(new if d == old else d for d in days))
+        return (moved, c4) if kind == 0 else (cx, moved)
+
+    for kind, days in ((0, cx), (1, c4)):
+        for d in days:
+            for delta in (1, -1, 2, -2, 3, -3):
+                if d + delta in free_set and d + delta not in used:
+                    out.append(with_moved(kind, d, d + delta))
+    for a in cx:
+        for b in c4:
+            out.append((tuple(sorted(b if d == a else d for d in cx)), tuple(sorted(a if d == b else d for d in c4))))
+    spare = [d for d in free if d not in used]
+    if spare:
+        if len(cx) < cx_quota:
+            out.append((tuple(sorted(cx + (rng.choice(spare),))), c4))
+        if len(c4) < c4_quota:
+            out.append((cx, tuple(sorted(c4 + (rng.choice(spare),)))))
+        placed = [(0, d) for d in cx] + [(1, d) for d in c4]
+        for _ in range(relocations if placed else 0):
+            kind, d = rng.choice(placed)
+            out.append(with_moved(kind, d, rng.choice(spare)))
+    return out
+
+
+def anytime_search(plan: Plan, cx_quota, c4_quota, budget=2.0, k=5, beam=16, seed=0, report_every=0.1,
+                   should_stop=None):
+    """
+    Générateur : recherche locale (meilleur d'abord, frontière bornée à `beam` placements)
+    partant du plan exact (du plan sans jour posé si un autre accord que celui par défaut est en
+    vigueur) et du plan glouton, pendant `budget` secondes au plus. Produit un
+    SearchProgress toutes les `report_every` secondes avec les k meilleurs placements distincts
+    trouvés jusque-là ; le dernier (done=True) donne le résultat final. `should_stop()` vrai
+    arrête la recherche (glouton compris) comme si le budget était épuisé.
+    Les placements évalués passent par le cache d'évaluations : relancer la recherche sur le
+    même calendrier est quasi immédiat.
+    """
+    t0 = time.perf_counter()
+    deadline = t0 + budget
+    stopped = should_stop or (lambda: False)
+    rng = random.Random(seed)
+    cx_quota, c4_quota = int(cx_quota), int(c4_quota)
+    free = [
+        i for i, (code, (holiday, zz_day, _)) in enumerate(zip(plan.codes, day_flags(plan)))
+        if code not in ("CX", "C4") and not holiday and not zz_day
+    ]
+    free_set = frozenset(free)
+    seen = {}  # placement -> total, dans l'ordre de découverte (départage des égalités)
+    frontier = []
+
+    def evaluate(placement):
+        codes = list(plan.codes)
+        for i in placement[0]:
+            codes[i] = "CX"
+        for i in placement[1]:
+            codes[i] = "C4"
+        total, _ = evaluations.evaluate(replace(plan, codes=tuple(codes)))
+        seen[placement] = total
+        heapq.heappush(frontier, (-total, len(seen), placement))
+
+    def progress(done):
+        ranked = sorted(enumerate(seen.items()), key=lambda item: (-item[1][1], item[0]))[:k]
+        best = [
+            Candidate(total, [plan.day(i) for i in cx], [plan.day(i) for i in c4])
+            for _, ((cx, c4), total) in ranked
+        ]
+        return SearchProgress(time.perf_counter() - t0, budget, len(seen), best, done)
+
+    if is_default_ruleset():
+        _, exact_cx, exact_c4 = exact_placement(plan, cx_quota, c4_quota)
+        evaluate((tuple(sorted(plan.index(d) for d in exact_cx)), tuple(sorted(plan.index(d) for d in exact_c4))))
+    else:
+        evaluate(((), ()))
+    # le glouton (graine de diversité) n'a droit qu'à la moitié du budget
+    greedy_deadline = t0 + budget / 2
+    yield progress(False)
+    if time.perf_counter() < greedy_deadline and not stopped():
+        greedy_cx, greedy_c4 = greedy_placement(
+            plan, cx_quota, c4_quota, should_stop=lambda: time.perf_counter() >= greedy_deadline or stopped()
+        )
+        seed_placement = (tuple(sorted(plan.index(d) for d in greedy_cx)), tuple(sorted(plan.index(d) for d in greedy_c4)))
+        if seed_placement not in seen:
+            evaluate(seed_placement)
+
+    next_report = time.perf_counter() + report_every
+    while frontier and time.perf_counter() < deadline and not stopped():
+        _, _, placement = heapq.heappop(frontier)
+        for neighbour in _placement_neighbours(placement, free, free_set, cx_quota, c4_quota, rng):
+            if neighbour not in seen:
+                evaluate(neighbour)
+        if len(frontier) > 4 * beam:
+            frontier = heapq.nsmallest(beam, frontier)
+            heapq.heapify(frontier)
+        if time.perf_counter() >= next_report:
+            yield progress(False)
+            next_report = time.perf_counter() + report_every
+    yield progress(True)
+
+
+def top_placements(plan: Plan, cx_quota, c4_quota, budget=2.0, k=5):
+    """Les k meilleurs placements (Candidate) trouvés par anytime_search dans le budget."""
+    for step in anytime_search(plan, cx_quota, c4_quota, budget, k):
+        pass
+    return step.best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Contrôle de l'optimisation exacte par force brute.")
+    parser.add_argument("--check", action="store_true", help="compare exact_placement à la force brute")
+    parser.add_argument("--cases", type=int, default=2000, help="nombre de calendriers aléatoires")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-days", type=int, default=10, help="longueur maximale des calendriers")
+    args = parser.parse_args(argv)
+    if not args.check:
+        parser.error("rien à faire (--check)")
+
+    mismatches = check_exact(args.cases, args.seed, args.max_days)
+    for plan, cx_quota, c4_quota, value, reached, optimum in mismatches[:10]:
+        print(f"ÉCART {plan.start.isoformat()} {list(plan.codes)} fériés {sorted(d.isoformat() for d in plan.holidays)} "
+              f"ZZ {plan.zz_odd}/{plan.zz_even} {plan.parity_choice} cx={cx_quota} c4={c4_quota} : "
+              f"annoncé {value}, atteint {reached}, optimum {optimum}")
+    if mismatches:
+        print(f"{len(mismatches)} écart(s) sur {args.cases} calendriers.")
+        sys.exit(1)
+    print(f"exact_placement optimal sur {args.cases} calendriers.")
+
+
+if __name__ == "__main__":
+    main()
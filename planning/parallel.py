@@ -0,0 +1,107 @@
+"""
+Notation des jours candidats de l'optimiseur (et traitements par lots) sur plusieurs processus.
+
+Chaque candidat est évalué indépendamment (evaluate_plan, via le cache d'évaluations du
+processus) ; les résultats sont renvoyés
+dans l'ordre des candidats, donc le départage (premier meilleur gain) est identique à
+l'exécution sur un seul processus.
+
+Un CandidateScorer garde un même pool pendant toute une optimisation : le plan de départ est
+envoyé une seule fois à chaque processus (initializer), puis chaque tour ne transmet que les
+jours modifiés depuis. Les pools sont arrêtés à la fin de l'optimisation ou du lot. Sur une
+machine qui a moins de cœurs que de processus demandés, tout reste dans le processus courant.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+import multiprocessing
+import os
+
+from planning import metrics
+from planning.cache import evaluations
+
+_base_plan = None  # plan de départ du CandidateScorer, dans chaque processus de son pool
+
+
+def effective_workers(workers):
+    """`workers`, ou 1 si la machine a moins de cœurs : des processus en plus n'y feraient que coûter."""
+    return 1 if workers > (os.cpu_count() or 1) else workers
+
+
+def _pool(workers, initializer=None, initargs=()):
+    # "spawn" : le processus Streamlit est multi-thread, on évite fork
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=initializer, initargs=initargs
+    )
+
+
+def _score_chunk(plan, candidates, code):
+    return [evaluations.evaluate(plan.with_code(i, code))[0] for i in candidates]
+
+
+def _set_base_plan(plan):
+    global _base_plan
+    _base_plan = plan
+
+
+def _score_chunk_from_base(changes, candidates, code):
+    codes = list(_base_plan.codes)
+    for i, changed in changes:
+        codes[i] = changed
+    return _score_chunk(replace(_base_plan, codes=tuple(codes)), candidates, code)
+
+
+class CandidateScorer:
+    """
+    Notation des candidats pendant une optimisation partant de `plan` ; à utiliser dans un bloc
+    with, qui arrête le pool (créé au premier tour parallèle seulement). Les plans notés doivent
+    dériver de `plan` par with_code : seuls leurs codes diffèrent.
+    """
+
+    def __init__(self, plan, workers=1):
+        self.base = plan
+        self.workers = effective_workers(workers)
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def score(self, plan, candidates, code):
+        """
+        Total d'absence du plan avec `code` posé sur chacun des jours `candidates` (positions
+        dans le plan), dans le même ordre que `candidates`.
+        """
+        candidates = list(candidates)
+        if self.workers <= 1 or len(candidates) < 2 * self.workers:
+            return _score_chunk(plan, candidates, code)
+        if self._executor is None:
+            self._executor = _pool(self.workers, _set_base_plan, (self.base,))
+        changes = [(i, c) for i, (c, base) in enumerate(zip(plan.codes, self.base.codes)) if c != base]
+        # les processus fils n'ont pas de Recorder : les évaluations sont comptées ici
+        metrics.count("evaluations", len(candidates))
+        size = -(-len(candidates) // self.workers)
+        chunks = [candidates[k:k + size] for k in range(0, len(candidates), size)]
+        scores = []
+        for part in self._executor.map(
+            _score_chunk_from_base, [changes] * len(chunks), chunks, [code] * len(chunks)
+        ):
+            scores.extend(part)
+        return scores
+
+
+def map_in_order(func, items, workers=1):
+    """`func` appliquée à chaque élément sur `workers` processus ; résultats dans l'ordre des éléments."""
+    items = list(items)
+    workers = effective_workers(workers)
+    if workers <= 1 or len(items) < 2:
+        return [func(item) for item in items]
+    chunksize = max(1, len(items) // (4 * workers))
+    with _pool(workers) as executor:
+        return list(executor.map(func, items, chunksize=chunksize))
@@ -0,0 +1,274 @@
+"""
+Implémentation de référence des règles, reprise de la première version de Conge.py :
+apply_business_rules, is_effective_cz, simulate_vacs_from, total_absence_for_scope et
+optimize_placement (glouton), appliqués à un planning.Plan au lieu de l'état Streamlit.
+
+Volontairement naïve et lente : jour par jour, sur un dictionnaire {jour: code}, sans table
+ni cache. Elle sert d'oracle au banc de fuzzing (planning.fuzz) : elle ne doit partager aucun
+code avec les moteurs qu'elle contrôle ni être optimisée. La période (months_scope) est la
+plage du plan.
+"""
+from datetime import timedelta
+
+_WEEKDAYS_FR = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
+
+
+class ReferenceCalendar:
+    def __init__(self, plan):
+        self.first = plan.start
+        self.last = plan.start + timedelta(days=len(plan.codes) - 1)
+        # jours non renseignés : absents du dictionnaire, comme dans l'ancien state["data"]
+        self.data = {plan.start + timedelta(days=i): code for i, code in enumerate(plan.codes) if code is not None}
+        self.holidays = plan.holidays
+        self.zz_odd = list(plan.zz_odd)
+        self.zz_even = list(plan.zz_even)
+        self.parity_choice = plan.parity_choice
+
+    def all_dates(self):
+        d, dates = self.first, []
+        while d <= self.last:
+            dates.append(d)
+            d += timedelta(days=1)
+        return dates
+
+    def in_scope(self, d):
+        return self.first <= d <= self.last
+
+    # ---------------------------
+    # Accesseurs codes
+    # ---------------------------
+    def get_code(self, d):
+        return self.data.get(d, "TRA")
+
+    def set_code(self, d, code):
+        self.data[d] = code
+
+    def codes(self):
+        """Codes de la plage (non renseigné = TRA, comme get_code)."""
+        return tuple(self.get_code(d) for d in self.all_dates())
+
+    # ---------------------------
+    # Règles métier : utilitaires
+    # ---------------------------
+    def is_week_even(self, d):
+        return (d.isocalendar()[1] % 2) == 0
+
+    def treated_as_zz(self, d):
+        c = self.get_code(d)
+        return c == "ZZ" or c == "FC"
+
+    def week_is_three_zz(self, d):
+        week_even = self.is_week_even(d)
+        chosen = self.zz_even if week_even else self.zz_odd
+        if len(chosen) == 3:
+            if self.parity_choice == "Paires":
+                return week_even
+            else:
+                return not week_even
+        return False
+
+    def apply_default_zz_and_fc(self):
+        for d in self.all_dates():
+            if d in self.holidays:
+                self.data[d] = "FC"
+                continue
+            self.data.setdefault(d, "TRA")
+        for d in self.all_dates():
+            week_even = self.is_week_even(d)
+            chosen = self.zz_even if week_even else self.zz_odd
+            if _WEEKDAYS_FR[d.weekday()] in chosen:
+                if self.data.get(d) != "FC":
+                    self.data[d] = "ZZ"
+
+    # ---------------------------
+    # Application des règles VACS / CZ / C4
+    # ---------------------------
+    def apply_business_rules(self):
+        # 1) Defaults
+        self.apply_default_zz_and_fc()
+
+        # 2) Revenir sur CZ précédents (ne pas écraser FC)
+        for d in self.all_dates():
+            if self.data.get(d) == "CZ":
+                if d in self.holidays:
+                    self.data[d] = "FC"
+                else:
+                    week_even = self.is_week_even(d)
+                    chosen = self.zz_even if week_even else self.zz_odd
+                    if _WEEKDAYS_FR[d.weekday()] in chosen:
+                        self.data[d] = "ZZ"
+                    else:
+                        self.data[d] = "TRA"
+
+        # 3) Parcours chronologique pour appliquer VACS et CZ
+        in_vacs = False
+        for d in self.all_dates():
+            code = self.get_code(d)
+            if code == "CX":
+                in_vacs = True
+                continue
+            if code == "C4":
+                in_vacs = False
+                continue
+            if code == "TRA":
+                in_vacs = False
+                continue
+            if in_vacs and self.treated_as_zz(d) and self.week_is_three_zz(d):
+                if self.get_code(d) == "ZZ":
+                    self.data[d] = "CZ"
+
+    # ---------------------------
+    # Évaluation CZ effectif et absence
+    # ---------------------------
+    def is_effective_cz(self, d):
+        code = self.get_code(d)
+        if code == "CZ":
+            return True
+        if code == "FC":
+            dd = d
+            while True:
+                prev = dd - timedelta(days=1)
+                if not self.in_scope(prev):
+                    break
+                prev_code = self.get_code(prev)
+                if prev_code == "CX":
+                    return self.week_is_three_zz(d)
+                if prev_code in ("TRA", "C4"):
+                    break
+                dd = prev
+        return False
+
+    def simulate_vacs_from(self, start_date):
+        abs_days = []
+        d = start_date
+        while True:
+            if not self.in_scope(d):
+                break
+            code = self.get_code(d)
+            if code == "TRA":
+                break
+            if code in ("CX", "C4", "CZ"):
+                abs_days.append(d)
+            elif code == "ZZ":
+                if self.week_is_three_zz(d):
+                    abs_days.append(d)
+            elif code == "FC":
+                abs_days.append(d)
+            d = d + timedelta(days=1)
+        if not abs_days:
+            return []
+        first = abs_days[0]
+        last = abs_days[-1]
+        d = first - timedelta(days=1)
+        while self.in_scope(d):
+            if self.treated_as_zz(d):
+                abs_days.insert(0, d)
+                d = d - timedelta(days=1)
+            else:
+                break
+        d = last + timedelta(days=1)
+        while self.in_scope(d):
+            if self.treated_as_zz(d):
+                abs_days.append(d)
+                d = d + timedelta(days=1)
+            else:
+                break
+        return sorted(set(abs_days))
+
+    def total_absence_for_scope(self):
+        first_cx = None
+        for d in self.all_dates():
+            if self.get_code(d) == "CX":
+                first_cx = d
+                break
+        if not first_cx:
+            return 0, []
+        days = self.simulate_vacs_from(first_cx)
+        return len(days), days
+
+    def evaluate_total_absence_with_plan(self):
+        self.apply_business_rules()
+        return self.total_absence_for_scope()
+
+    # ---------------------------
+    # Optimisation gloutonne
+    # ---------------------------
+    def optimize_placement(self, cx_quota, c4_quota):
+        """(total, CX posés, C4 posés, jours) ; les règles sont appliquées au calendrier au passage."""
+        candidates = sorted({d for d in self.all_dates() if self.get_code(d) not in ("CX", "C4")})
+        placed_cx = []
+        placed_c4 = []
+        baseline_cnt, _ = self.evaluate_total_absence_with_plan()
+
+        for _ in range(int(cx_quota)):
+            best_gain = -1
+            best_day = None
+            for cand in candidates:
+                if cand in placed_cx or cand in placed_c4:
+                    continue
+                prev = self.data.get(cand)
+                self.set_code(cand, "CX")
+                cnt, _ = self.evaluate_total_absence_with_plan()
+                gain = cnt - baseline_cnt
+                if prev is None:
+                    self.data.pop(cand, None)
+                else:
+                    self.set_code(cand, prev)
+                if gain > best_gain:
+                    best_gain = gain
+                    best_day = cand
+            if best_day is None:
+                for cand in candidates:
+                    if cand not in placed_cx and cand not in placed_c4:
+                        best_day = cand
+                        break
+            if best_day is None:
+                break
+            self.set_code(best_day, "CX")
+            placed_cx.append(best_day)
+            baseline_cnt, _ = self.evaluate_total_absence_with_plan()
+
+        for _ in range(int(c4_quota)):
+            best_gain = -1
+            best_day = None
+            for cand in candidates:
+                if cand in placed_cx or cand in placed_c4:
+                    continue
+                prev = self.data.get(cand)
+                self.set_code(cand, "C4")
+                cnt, _ = self.evaluate_total_absence_with_plan()
+                gain = cnt - baseline_cnt
+                if prev is None:
+                    self.data.pop(cand, None)
+                else:
+                    self.set_code(cand, prev)
+                if gain > best_gain:
+                    best_gain = gain
+                    best_day = cand
+            if best_day is None:
+                if placed_cx:
+                    last_vacs = self.simulate_vacs_from(placed_cx[-1])
+                    if last_vacs:
+                        candidate_day = last_vacs[-1] + timedelta(days=1)
+                        if self.in_scope(candidate_day):
+                            best_day = candidate_day
+            if best_day is None:
+                break
+            self.set_code(best_day, "C4")
+            placed_c4.append(best_day)
+            baseline_cnt, _ = self.evaluate_total_absence_with_plan()
+
+        final_cnt, final_days = self.evaluate_total_absence_with_plan()
+        return final_cnt, placed_cx, placed_c4, final_days
+
+
+def reference_rules(plan):
+    """Codes finaux du plan selon l'ancien apply_business_rules."""
+    ref = ReferenceCalendar(plan)
+    ref.apply_business_rules()
+    return ref.codes()
+
+
+def reference_total(plan):
+    """(nombre de jours, jours) selon l'ancien apply_business_rules + total_absence_for_scope."""
+    return ReferenceCalendar(plan).evaluate_total_absence_with_plan()
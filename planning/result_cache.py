@@ -0,0 +1,301 @@
+"""
+Cache disque des résultats d'optimisation, partagé par toutes les sessions et tous les processus.
+
+Un placement exact ou glouton ne dépend que de ses entrées : codes de la plage, début, jours
+fériés de la plage, réglages ZZ/parité, compteurs CX/C4, méthode et règles en vigueur
+(planning.ruleset). La clé est une empreinte (16 octets, blake2b) de ces entrées sous forme
+canonique (voir canonical_codes et result_key) : deux calendriers qui ne diffèrent que par ce
+que les règles recalculent (CZ générés, jours non renseignés, ordre des jours ZZ choisis...)
+partagent leur résultat.
+
+Stockage SQLite (mode WAL, comme planning.storage) : une ligne par résultat, les positions
+posées en entiers 32 bits. La taille des données est bornée (éviction des résultats les moins
+récemment utilisés) et chaque ligne porte CACHE_VERSION, à incrémenter quand les règles codées
+en dur ou les optimiseurs changent : les lignes d'une autre version sont effacées à l'ouverture.
+La recherche anytime, bornée dans le temps, n'est pas mise en cache.
+
+Pré-remplissage pour l'année à venir (réglages les plus fréquents de la base, calendriers vides) :
+    python -m planning.result_cache warm equipe.db --year 2027 --cx 3 5 --c4 0 1
+"""
+import argparse
+from array import array
+from calendar import monthrange
+from collections import Counter
+from datetime import date
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from planning import metrics
+from planning.rules import WEEKDAYS_FR, Plan, day_flags, normalize_code
+from planning.ruleset import active_ruleset
+
+CACHE_VERSION = 2
+DEFAULT_PATH = "optimization_cache.db"
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS result (key BLOB PRIMARY KEY, version INTEGER NOT NULL, value BLOB NOT NULL,"
+    " used REAL NOT NULL) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS result_used ON result (used)",
+]
+_WEEKDAY_ORDER = {day: k for k, day in enumerate(WEEKDAYS_FR)}
+
+
+# ---------------------------
+# Clé canonique
+# ---------------------------
+def canonical_codes(plan: Plan, method="exact"):
+    """
+    Codes de la plage tels que l'optimiseur `method` les voit : normalisés (defaults, retour des
+    CZ) ; pour le glouton, les CX/C4 stockés sont gardés tels quels, même sur un férié ou un ZZ
+    (il ne les propose pas comme candidats).
+    """
+    keep = ("CX", "C4") if method == "greedy" else ()
+    return tuple(
+        code if code in keep else normalize_code(code, holiday, zz_day)
+        for code, (holiday, zz_day, _) in zip(plan.codes, day_flags(plan))
+    )
+
+
+def result_key(method, plan: Plan, cx_quota, c4_quota, rules=None):
+    """Empreinte (16 octets) des entrées d'une optimisation `method` de `plan`."""
+    rules = rules or active_ruleset()
+    n = len(plan.codes)
+    first = plan.start.toordinal()
+    holidays = sorted(d.toordinal() - first for d in plan.holidays if 0 <= d.toordinal() - first < n)
+    zz_odd = sorted(plan.zz_odd, key=_WEEKDAY_ORDER.get)
+    zz_even = sorted(plan.zz_even, key=_WEEKDAY_ORDER.get)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{CACHE_VERSION}|{method}|{int(cx_quota)}|{int(c4_quota)}|{plan.start.isoformat()}|{n}|".encode())
+    h.update(f"{','.join(zz_odd)}|{','.join(zz_even)}|{plan.parity_choice}|{holidays}|".encode())
+    h.update(rules.digest)
+    h.update("\x1f".join(canonical_codes(plan, method)).encode())
+    return h.digest()
+
+
+def _pack(value, cx_positions, c4_positions):
+    return array("i", [-1 if value is None else value, len(cx_positions), *cx_positions, *c4_positions]).tobytes()
+
+
+def _unpack(blob):
+    values = array("i")
+    values.frombytes(blob)
+    value, n_cx = values[0], values[1]
+    return (None if value < 0 else value), values[2:2 + n_cx].tolist(), values[2 + n_cx:].tolist()
+
+
+# ---------------------------
+# Cache
+# ---------------------------
+class ResultCache:
+    """
+    Résultats (valeur, positions CX, positions C4) par clé, dans le fichier SQLite `path` ;
+    `max_bytes` borne la taille des clés et valeurs stockées.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # une instance par processus, utilisée par les threads d'optimisation et les reruns
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+            self.conn.execute("DELETE FROM result WHERE version != ?", (CACHE_VERSION,))
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, key):
+        """(valeur, positions CX, positions C4) enregistrés sous `key`, ou None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value FROM result WHERE key = ? AND version = ?", (key, CACHE_VERSION)
+            ).fetchone()
+            if row is not None:
+                with self.conn:
+                    self.conn.execute("UPDATE result SET used = ? WHERE key = ?", (time.time(), key))
+        if row is None:
+            metrics.count("result_cache_misses")
+            return None
+        metrics.count("result_cache_hits")
+        return _unpack(row[0])
+
+    def put(self, key, value, cx_positions, c4_positions):
+        """Enregistre un résultat (`value` : entier positif ou None), puis évince si la taille est dépassée."""
+        blob = _pack(value, list(cx_positions), list(c4_positions))
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO result (key, version, value, used) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET version = excluded.version, value = excluded.value,"
+                " used = excluded.used",
+                (key, CACHE_VERSION, blob, time.time()),
+            )
+            self._evict()
+
+    def _evict(self):
+        size = self.conn.execute("SELECT COALESCE(SUM(length(key) + length(value)), 0) FROM result").fetchone()[0]
+        if size <= self.max_bytes:
+            return
+        # on garde les plus récemment utilisés jusqu'à 90 % de la taille maximale
+        evicted = self.conn.execute(
+            "DELETE FROM result WHERE key IN (SELECT key FROM ("
+            " SELECT key, SUM(length(key) + length(value)) OVER (ORDER BY used DESC, key) AS kept FROM result"
+            ") WHERE kept > ?)",
+            (int(self.max_bytes * 0.9),),
+        ).rowcount
+        metrics.count("result_cache_evictions", evicted)
+
+    def placement(self, method, plan: Plan, cx_quota, c4_quota, compute):
+        """
+        `compute()` -> (valeur, CX à poser, C4 à poser) (dates de `plan`), lu dans le cache si les
+        mêmes entrées ont déjà été optimisées par `method` ; sinon calculé puis enregistré.
+        """
+        key = result_key(method, plan, cx_quota, c4_quota)
+        hit = self.get(key)
+        if hit is not None:
+            value, cx_positions, c4_positions = hit
+            return value, [plan.day(i) for i in cx_positions], [plan.day(i) for i in c4_positions]
+        value, placed_cx, placed_c4 = compute()
+        self.put(key, value, [plan.index(d) for d in placed_cx], [plan.index(d) for d in placed_c4])
+        return value, placed_cx, placed_c4
+
+    def stats(self):
+        with self._lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length(key) + length(value)), 0) FROM result"
+            ).fetchone()
+        return {"path": self.path, "entries": entries, "bytes": size, "max_bytes": self.max_bytes,
+                "version": CACHE_VERSION}
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM result")
+
+
+def cached_placement(cache, method, plan: Plan, cx_quota, c4_quota, compute):
+    """ResultCache.placement, ou `compute()` directement sans cache (`cache` None)."""
+    if cache is None:
+        return compute()
+    return cache.placement(method, plan, cx_quota, c4_quota, compute)
+
+
+# ---------------------------
+# Pré-remplissage
+# ---------------------------
+def _warm_job(job):
+    from planning.optimize import exact_placement, greedy_placement
+
+    method, plan, cx_quota, c4_quota = job
+    if method == "exact":
+        value, placed_cx, placed_c4 = exact_placement(plan, cx_quota, c4_quota)
+    else:
+        value, (placed_cx, placed_c4) = None, greedy_placement(plan, cx_quota, c4_quota)
+    return value, [plan.index(d) for d in placed_cx], [plan.index(d) for d in placed_c4]
+
+
+def warm_plans(year, settings_list, holidays, calendars=()):
+    """
+    Plans à pré-calculer pour `year` : l'année entière et chacun de ses mois (les périodes
+    usuelles de l'application), calendrier vide pour chaque réglage de `settings_list`, plus
+    chaque calendrier (nom, jours, réglages) de `calendars` tel quel.
+    """
+    from planning.batch import make_plan
+
+    ranges = [(date(year, 1, 1), date(year, 12, 31))]
+    ranges += [(date(year, month, 1), date(year, month, monthrange(year, month)[1])) for month in range(1, 13)]
+    sources = [({}, settings) for settings in settings_list] + [(days, settings) for _, days, settings in calendars]
+    return [make_plan(days, settings, start, end, holidays) for days, settings in sources for start, end in ranges]
+
+
+def warm(cache, plans, methods, cx_quotas, c4_quotas, workers=1):
+    """Calcule et enregistre les résultats absents du cache ; retourne (déjà présents, calculés)."""
+    from planning.parallel import map_in_order
+
+    jobs, keys, present = [], {}, 0
+    for plan in plans:
+        for method in methods:
+            for cx_quota in cx_quotas:
+                for c4_quota in c4_quotas:
+                    key = result_key(method, plan, cx_quota, c4_quota)
+                    if key in keys or cache.get(key) is not None:
+                        present += 1
+                        continue
+                    keys[key] = len(jobs)
+                    jobs.append((method, plan, cx_quota, c4_quota))
+    for key, result in zip(keys, map_in_order(_warm_job, jobs, workers)):
+        cache.put(key, *result)
+    return present, len(jobs)
+
+
+def common_settings(calendars, top):
+    """Les `top` réglages ZZ/parité les plus fréquents des calendriers (défauts si aucun)."""
+    from planning.batch import DEFAULT_SETTINGS
+
+    counts = Counter()
+    for _, _, settings in calendars:
+        settings = {**DEFAULT_SETTINGS, **settings}
+        counts[(
+            tuple(sorted(settings["zz_odd"], key=_WEEKDAY_ORDER.get)),
+            tuple(sorted(settings["zz_even"], key=_WEEKDAY_ORDER.get)),
+            settings["parity_choice"],
+        )] += 1
+    if not counts:
+        return [dict(DEFAULT_SETTINGS)]
+    return [
+        {"zz_odd": list(zz_odd), "zz_even": list(zz_even), "parity_choice": parity}
+        for (zz_odd, zz_even, parity), _ in counts.most_common(top)
+    ]
+
+
+def main(argv=None):
+    from planning.batch import read_calendars
+    from planning.optimize import METHODS
+
+    parser = argparse.ArgumentParser(description="Cache disque des résultats d'optimisation.")
+    parser.add_argument("--cache", default=DEFAULT_PATH, help=f"fichier du cache (défaut : {DEFAULT_PATH})")
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / 2**20, help="taille maximale (Mo)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    w = sub.add_parser("warm", help="pré-calcule les configurations courantes d'une année")
+    w.add_argument("inputs", nargs="*", help="fichiers .json, .csv ou .db dont on prend les réglages (voir planning.batch)")
+    w.add_argument("--year", type=int, default=date.today().year + 1, help="année à préparer (défaut : la suivante)")
+    w.add_argument("--cx", type=int, nargs="+", default=[3], help="compteurs CX")
+    w.add_argument("--c4", type=int, nargs="+", default=[0], help="compteurs C4")
+    w.add_argument("--method", nargs="+", choices=METHODS, default=["exact"])
+    w.add_argument("--top", type=int, default=5, help="réglages ZZ/parité les plus fréquents retenus")
+    w.add_argument("--calendars", action="store_true", help="pré-calcule aussi chaque calendrier tel quel")
+    w.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processus en parallèle")
+    sub.add_parser("stats", help="nombre d'entrées et taille du cache")
+    sub.add_parser("clear", help="vide le cache")
+    args = parser.parse_args(argv)
+
+    cache = ResultCache(args.cache, int(args.max_mb * 2**20))
+    if args.command == "warm":
+        try:
+            calendars = read_calendars(args.inputs)
+        except (OSError, ValueError, KeyError) as exc:
+            parser.error(f"lecture impossible : {exc}")
+        from planning.calendar_meta import french_holidays
+
+        plans = warm_plans(
+            args.year, common_settings(calendars, args.top), frozenset(french_holidays(args.year)),
+            calendars if args.calendars else (),
+        )
+        present, computed = warm(cache, plans, args.method, args.cx, args.c4, args.workers)
+        print(f"{args.cache} : {computed} résultats calculés, {present} déjà présents")
+    elif args.command == "clear":
+        cache.clear()
+        print(f"{args.cache} vidé")
+    stats = cache.stats()
+    print(f"{stats['entries']} entrées, {stats['bytes'] / 2**20:.1f}/{stats['max_bytes'] / 2**20:.1f} Mo "
+          f"(version {stats['version']})")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Évaluation pure d'un plan de congés.
+
+Mêmes règles que apply_business_rules / total_absence_for_scope dans Conge.py, mais sur des
+valeurs immuables : aucun état global n'est lu ni modifié, ce qui permet d'évaluer des plans
+en parallèle, de mettre les résultats en cache ou d'appeler ces fonctions hors de Streamlit.
+"""
+from dataclasses import dataclass, replace
+from datetime import date, timedelta
+import functools
+
+from planning import metrics
+from planning.codes import CODES
+from planning.ruleset import active_ruleset
+from planning.vacs import VacsIndex
+
+WEEKDAYS_FR = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
+
+
+@dataclass(frozen=True)
+class Plan:
+    """
+    Codes stockés d'une plage de jours consécutifs commençant à `start` (None = jour non
+    renseigné), avec les jours fériés de la plage et les paramètres ZZ/parité.
+    """
+    start: date
+    codes: tuple
+    holidays: frozenset = frozenset()
+    zz_odd: tuple = ("samedi", "dimanche")
+    zz_even: tuple = ("samedi", "dimanche")
+    parity_choice: str = "Paires"
+
+    def day(self, i):
+        return self.start + timedelta(days=i)
+
+    def dates(self):
+        return [self.day(i) for i in range(len(self.codes))]
+
+    def index(self, d: date):
+        """Position de `d` dans la plage, ou None s'il est hors plage."""
+        i = (d - self.start).days
+        return i if 0 <= i < len(self.codes) else None
+
+    def with_code(self, i, code):
+        """Nouveau plan identique avec le code stocké du jour i remplacé."""
+        codes = list(self.codes)
+        codes[i] = code
+        return replace(self, codes=tuple(codes))
+
+
+def week_is_three_zz(d: date, zz_odd, zz_even, parity_choice):
+    """Une semaine est '3-ZZ' si la sélection pour sa parité contient 3 jours et la parité correspond."""
+    week_even = (d.isocalendar()[1] % 2) == 0
+    chosen = zz_even if week_even else zz_odd
+    if len(chosen) == 3:
+        if parity_choice == "Paires":
+            return week_even
+        return not week_even
+    return False
+
+
+@functools.lru_cache(maxsize=256)
+def _day_flags(start, n, holidays, zz_odd, zz_even, parity_choice):
+    """(férié, jour ZZ par défaut, semaine 3-ZZ) pour chacun des n jours à partir de start."""
+    flags = []
+    for i in range(n):
+        d = start + timedelta(days=i)
+        week_even = (d.isocalendar()[1] % 2) == 0
+        chosen = zz_even if week_even else zz_odd
+        flags.append((
+            d in holidays,
+            WEEKDAYS_FR[d.weekday()] in chosen,
+            week_is_three_zz(d, zz_odd, zz_even, parity_choice),
+        ))
+    return tuple(flags)
+
+
+def _flags_key(plan: Plan):
+    return plan.start, len(plan.codes), plan.holidays, plan.zz_odd, plan.zz_even, plan.parity_choice
+
+
+def day_flags(plan: Plan):
+    return _day_flags(*_flags_key(plan))
+
+
+@functools.lru_cache(maxsize=256)
+def _three_zz(start, n, holidays, zz_odd, zz_even, parity_choice):
+    return tuple(flags[2] for flags in _day_flags(start, n, holidays, zz_odd, zz_even, parity_choice))
+
+
+def normalize_code(code, holiday, zz_day):
+    """Étapes 1 et 2 des règles pour un jour : FC si férié, ZZ sur les jours choisis sauf FC, TRA si non renseigné ou CZ."""
+    if holiday:
+        return "FC"
+    if zz_day:
+        return code if code == "FC" else "ZZ"
+    if code is None or code == "CZ":
+        return "TRA"
+    return code
+
+
+def apply_rules(plan: Plan):
+    """
+    Codes finaux de la plage, tels que apply_business_rules les laisserait :
+    - defaults (FC si férié, ZZ sur les jours choisis sauf FC, TRA si non renseigné),
+    - retour des CZ précédents,
+    - automate des VACS (planning.ruleset) : pour l'accord par défaut, ZZ -> CZ en VACS
+      (ouverte par CX, fermée par TRA/C4) dans une semaine à 3 ZZ.
+    """
+    flags = day_flags(plan)
+    normalized = [normalize_code(code, holiday, zz_day) for code, (holiday, zz_day, _) in zip(plan.codes, flags)]
+    return active_ruleset().apply_codes(normalized, _three_zz(*_flags_key(plan)))
+
+
+def _vacs_indices(codes, flags, start):
+    n = len(codes)
+    counted = []
+    i = start
+    while i < n and codes[i] != "TRA":
+        code = codes[i]
+        if code in ("CX", "C4", "CZ", "FC") or (code == "ZZ" and flags[i][2]):
+            counted.append(i)
+        i += 1
+    if not counted:
+        return []
+    # ZZ/FC contigus avant et après
+    before = counted[0]
+    while before > 0 and codes[before - 1] in ("ZZ", "FC"):
+        before -= 1
+    after = counted[-1] + 1
+    while after < n and codes[after] in ("ZZ", "FC"):
+        after += 1
+    return list(range(before, counted[0])) + counted + list(range(counted[-1] + 1, after))
+
+
+def vacs_days_from(plan: Plan, codes, start_index):
+    """Équivalent de simulate_vacs_from sur les codes finaux `codes` (voir apply_rules)."""
+    return [plan.day(i) for i in _vacs_indices(codes, day_flags(plan), start_index)]
+
+
+def vacs_index(plan: Plan, codes=None):
+    """Index des VACS (planning.vacs.VacsIndex) des codes finaux `codes` (par défaut ceux du plan)."""
+    return VacsIndex(plan.codes if codes is None else codes, _three_zz(*_flags_key(plan)), active_ruleset())
+
+
+def absence_of_codes(plan: Plan, codes):
+    """(nombre de jours d'absence, jours) de la VACS ouverte par le premier CX des codes finaux `codes`."""
+    count, positions = vacs_index(plan, codes).total()
+    return count, [plan.day(i) for i in positions]
+
+
+def evaluate_plan(plan: Plan):
+    """
+    Retourne (nombre de jours d'absence, jours) pour le plan : même résultat que
+    apply_business_rules suivi de total_absence_for_scope sur la même plage.
+    """
+    metrics.count("evaluations")
+    return absence_of_codes(plan, apply_rules(plan))
+
+
+def evaluate_final(plan: Plan):
+    """
+    Comme evaluate_plan, mais les codes du plan sont déjà les codes finaux (règles appliquées) :
+    même résultat que total_absence_for_scope sur un calendrier stocké.
+    """
+    metrics.count("evaluations")
+    return absence_of_codes(plan, plan.codes)
@@ -0,0 +1,243 @@
+"""
+Automate des VACS, décrit par un fichier de règles (JSON) au lieu d'une suite de `if`.
+
+Un jour est lu dans l'état laissé par la veille ; son code final et son code compté (CZ
+effectif) dépendent de cet état, de son code et de la semaine (3-ZZ ou non), puis son code
+fait passer l'automate à l'état suivant. Pour l'accord par défaut (rulesets/default.json) :
+CX ouvre une VACS, TRA et C4 la ferment ; en VACS et semaine 3-ZZ, ZZ devient CZ et FC compte
+comme CZ. Un autre accord se décrit par un autre fichier (variable CONGE_RULESET).
+
+Format du fichier :
+- "states" : noms des états, "initial" : état avant le premier jour ;
+- "transitions" : {"code", "to"} et, facultatif, "from" (état de départ ; tous par défaut) ;
+  un code sans transition laisse l'état inchangé ;
+- "rewrites" : {"state", "code", "to"} et, facultatif, "three_zz" (true/false ; les deux par
+  défaut) : code final du jour ;
+- "effective" : mêmes clés, "as" au lieu de "to" : code compté, le code stocké restant affiché.
+
+Deux noyaux exécutent les mêmes tables :
+- matrices calendriers × jours de codes entiers (planning.codes), en NumPy : l'état d'entrée
+  de chaque jour est obtenu par un parcours préfixe (composition des transitions, log2(jours)
+  étapes), ou directement par le dernier code qui fixe l'état quand chaque code soit fixe
+  l'état soit le laisse inchangé (cas de l'accord par défaut) ;
+- une seule plage de codes (chaînes), chemin des optimiseurs : une boucle Python générée à
+  partir des tables (une comparaison par règle, sans conversion en entiers).
+"""
+import functools
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from planning.codes import CODE_IDS, CODES, N_SYMBOLS, decode
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "rulesets", "default.json")
+
+
+class RuleSet:
+    def __init__(self, name, states, initial, next_state, rewrite, effective):
+        self.name = name
+        self.states = tuple(states)
+        self.initial = initial
+        self.next_state = next_state  # (codes, états) : état après un jour de ce code
+        self.rewrite = rewrite  # (états, codes, semaine 3-ZZ) : code final
+        self.effective = effective  # (états, codes, semaine 3-ZZ) : code compté
+        identity = np.arange(len(self.states))
+        self._constant = (next_state == next_state[:, :1]).all(axis=1)
+        # chaque code fixe l'état ou le laisse inchangé : pas besoin de composer les transitions
+        self._resettable = bool((self._constant | (next_state == identity).all(axis=1)).all())
+        # codes qui fixent l'état quel que soit l'état de départ (fin de segment pour les règles incrémentales)
+        self.resets = frozenset(CODES[c - 1] for c in np.flatnonzero(self._constant) if 0 < c <= len(CODES))
+
+    @functools.cached_property
+    def digest(self):
+        """Empreinte (16 octets) des tables : deux fichiers équivalents ont la même, le nom n'y entre pas."""
+        h = hashlib.blake2b(f"{len(self.states)}|{self.initial}|".encode(), digest_size=16)
+        for table in (self.next_state, self.rewrite, self.effective):
+            h.update(np.ascontiguousarray(table, dtype=np.uint8).tobytes())
+        return h.digest()
+
+    # ---------------------------
+    # Chargement
+    # ---------------------------
+    @classmethod
+    def from_dict(cls, spec):
+        """RuleSet d'un fichier de règles déjà lu ; ValueError si un état ou un code est inconnu."""
+        states = list(spec.get("states", ()))
+        if not states:
+            raise ValueError("fichier de règles sans états")
+        state_ids = {name: k for k, name in enumerate(states)}
+
+        def state(name):
+            if name not in state_ids:
+                raise ValueError(f"état inconnu dans le fichier de règles : {name!r}")
+            return state_ids[name]
+
+        def code(name):
+            if name not in CODE_IDS:
+                raise ValueError(f"code inconnu dans le fichier de règles : {name!r} (attendu : {', '.join(CODES)})")
+            return CODE_IDS[name]
+
+        def weeks(rule):
+            return (0, 1) if rule.get("three_zz") is None else (int(bool(rule["three_zz"])),)
+
+        n_states = len(states)
+        next_state = np.tile(np.arange(n_states, dtype=np.uint8), (N_SYMBOLS, 1))
+        for rule in spec.get("transitions", ()):
+            sources = range(n_states) if rule.get("from") is None else (state(rule["from"]),)
+            for s in sources:
+                next_state[code(rule["code"]), s] = state(rule["to"])
+
+        symbols = np.arange(N_SYMBOLS, dtype=np.uint8)
+        rewrite = np.broadcast_to(symbols[None, :, None], (n_states, N_SYMBOLS, 2)).copy()
+        effective = rewrite.copy()
+        for table, key, rules in ((rewrite, "to", spec.get("rewrites", ())), (effective, "as", spec.get("effective", ()))):
+            for rule in rules:
+                for w in weeks(rule):
+                    table[state(rule["state"]), code(rule["code"]), w] = code(rule[key])
+        # ce qui est réécrit est aussi compté sous son code final
+        effective = np.where(effective == symbols[None, :, None], rewrite, effective).astype(np.uint8)
+        return cls(spec.get("name", ""), states, state(spec.get("initial", states[0])), next_state, rewrite, effective)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            try:
+                spec = json.load(f)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"{path} est illisible ({exc})") from exc
+        return cls.from_dict(spec)
+
+    # ---------------------------
+    # Noyau (matrices calendriers × jours)
+    # ---------------------------
+    def states_before(self, codes):
+        """État d'entrée de chaque jour (même forme que `codes`, matrice de codes entiers)."""
+        codes = np.asarray(codes, dtype=np.intp)
+        n_rows, n = codes.shape
+        if self._resettable:
+            # l'état après le jour i est fixé par le dernier code qui fixe l'état, à i ou avant
+            fixes = self._constant[codes]
+            last = np.maximum.accumulate(np.where(fixes, np.arange(n), -1), axis=1)
+            fixed = self.next_state[np.take_along_axis(codes, np.maximum(last, 0), axis=1), 0]
+            after = np.where(last >= 0, fixed, self.initial)
+        else:
+            # composition préfixe des transitions : maps[r, i, s] = état après le jour i en partant de s avant le jour 0
+            maps = self.next_state[codes]
+            offset = 1
+            while offset < n:
+                head = maps[:, :offset]
+                tail = np.take_along_axis(maps[:, offset:], maps[:, :-offset].astype(np.intp), axis=2)
+                maps = np.concatenate((head, tail), axis=1)
+                offset *= 2
+            after = maps[:, :, self.initial]
+        before = np.empty((n_rows, n), dtype=np.uint8)
+        before[:, :1] = self.initial
+        before[:, 1:] = after[:, :-1]
+        return before
+
+    def apply(self, codes, three_zz):
+        """Codes finaux (matrice) de codes normalisés (defaults appliqués) ; `three_zz` : semaines 3-ZZ."""
+        codes = np.asarray(codes, dtype=np.intp)
+        return self.rewrite[self.states_before(codes), codes, np.asarray(three_zz, dtype=np.intp)]
+
+    def counted(self, codes, three_zz):
+        """Codes comptés (matrice) : FC -> CZ effectif pour l'accord par défaut."""
+        codes = np.asarray(codes, dtype=np.intp)
+        return self.effective[self.states_before(codes), codes, np.asarray(three_zz, dtype=np.intp)]
+
+    # ---------------------------
+    # Une seule plage de codes (chaînes)
+    # ---------------------------
+    def _compile(self, table):
+        """
+        Boucle Python équivalente aux transitions et à `table` (rewrite ou effective) : la
+        source est générée avec une branche par état et par code qui change quelque chose.
+        """
+        identity = np.arange(len(self.states))
+        lines = [
+            "def run(codes, three_zz):",
+            "    out = []",
+            "    append = out.append",
+            f"    state = {self.initial}",
+            "    for code, three in zip(codes, three_zz):",
+            "        new = code",
+        ]
+        keyword = "if"
+        for s in range(len(self.states)):
+            branches = []
+            for c in range(1, len(CODES) + 1):
+                other, three = (decode(int(t)) for t in table[s, c])
+                name = CODES[c - 1]
+                if other == three == name:
+                    continue
+                if other == three:
+                    branches.append(f"code == {name!r}: new = {three!r}")
+                elif other == name:
+                    branches.append(f"code == {name!r} and three: new = {three!r}")
+                elif three == name:
+                    branches.append(f"code == {name!r} and not three: new = {other!r}")
+                else:
+                    branches.append(f"code == {name!r}: new = {three!r} if three else {other!r}")
+            if branches:
+                lines.append(f"        {keyword} state == {s}:")
+                lines += [f"            {'if' if k == 0 else 'elif'} {b}" for k, b in enumerate(branches)]
+                keyword = "elif"
+        lines.append("        append(new)")
+        keyword = "if"
+        for c in range(1, len(CODES) + 1):
+            row = self.next_state[c]
+            if (row == identity).all():
+                continue
+            target = int(row[0]) if self._constant[c] else f"{tuple(int(x) for x in row)}[state]"
+            lines.append(f"        {keyword} code == {CODES[c - 1]!r}: state = {target}")
+            keyword = "elif"
+        lines.append("    return tuple(out)")
+        namespace = {}
+        exec(compile("\n".join(lines), f"<règles {self.name}>", "exec"), namespace)
+        return namespace["run"]
+
+    @functools.cached_property
+    def _apply_loop(self):
+        return self._compile(self.rewrite)
+
+    @functools.cached_property
+    def _counted_loop(self):
+        return self._compile(self.effective)
+
+    def apply_codes(self, codes, three_zz):
+        """Comme apply, pour une suite de codes (chaînes) : tuple des codes finaux."""
+        return self._apply_loop(codes, three_zz)
+
+    def counted_codes(self, codes, three_zz):
+        """Comme counted, pour une suite de codes (chaînes) : tuple des codes comptés."""
+        return self._counted_loop(codes, three_zz)
+
+
+@functools.lru_cache(maxsize=8)
+def load_ruleset(path=DEFAULT_PATH):
+    return RuleSet.load(path)
+
+
+def active_ruleset():
+    """Règles en vigueur : le fichier de CONGE_RULESET, sinon l'accord par défaut."""
+    return load_ruleset(os.environ.get("CONGE_RULESET") or DEFAULT_PATH)
+
+
+def is_default_ruleset(ruleset=None):
+    """Vrai si `ruleset` (par défaut les règles en vigueur) a les tables de l'accord par défaut."""
+    ruleset = active_ruleset() if ruleset is None else ruleset
+    return ruleset.digest == load_ruleset(DEFAULT_PATH).digest
+
+
+def require_default_ruleset(what):
+    """
+    ValueError si les règles en vigueur ne sont pas celles de l'accord par défaut : `what`
+    (optimiseur exact, en bloc...) code ces règles en dur au lieu de lire les tables.
+    """
+    if not is_default_ruleset():
+        raise ValueError(
+            f"{what} ne connaît que l'accord par défaut, pas les règles {active_ruleset().name!r} "
+            "(CONGE_RULESET) : utiliser l'optimisation gloutonne"
+        )
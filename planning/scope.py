@@ -0,0 +1,60 @@
+"""
+Période de planification : un intervalle de jours [start, end] quelconque, sur plusieurs
+années au besoin. L'appartenance et la position d'un jour se calculent en temps constant
+(comparaison de dates) ; la liste des jours n'est construite qu'une fois par période.
+"""
+import calendar
+from dataclasses import dataclass
+from datetime import date, timedelta
+import functools
+
+
+@functools.lru_cache(maxsize=64)
+def _range_dates(start, n):
+    return tuple(start + timedelta(days=i) for i in range(n))
+
+
+@dataclass(frozen=True)
+class DateRange:
+    start: date
+    end: date  # inclus
+
+    def __post_init__(self):
+        if self.end < self.start:
+            raise ValueError(f"période vide : {self.start} est après {self.end}")
+
+    @classmethod
+    def from_months(cls, months):
+        """Du premier jour du plus ancien mois au dernier jour du plus récent (dates ou couples (année, mois))."""
+        keys = sorted((m.year, m.month) if isinstance(m, date) else tuple(m) for m in months)
+        (y0, m0), (y1, m1) = keys[0], keys[-1]
+        return cls(date(y0, m0, 1), date(y1, m1, calendar.monthrange(y1, m1)[1]))
+
+    @classmethod
+    def year(cls, year):
+        return cls(date(year, 1, 1), date(year, 12, 31))
+
+    def __contains__(self, d):
+        return self.start <= d <= self.end
+
+    def __len__(self):
+        return (self.end - self.start).days + 1
+
+    def index(self, d: date):
+        """Position de `d` dans la période, ou None s'il est hors période."""
+        return (d - self.start).days if self.start <= d <= self.end else None
+
+    def day(self, i):
+        return self.start + timedelta(days=i)
+
+    def dates(self):
+        return _range_dates(self.start, len(self))
+
+    def months(self):
+        """Couples (année, mois) couverts, dans l'ordre."""
+        months = []
+        year, month = self.start.year, self.start.month
+        while (year, month) <= (self.end.year, self.end.month):
+            months.append((year, month))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return months
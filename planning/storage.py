@@ -0,0 +1,304 @@
+"""
+Persistance SQLite du calendrier (mode WAL).
+
+Une ligne par employé et par jour renseigné : les modifications sont écrites par upsert dans une seule
+transaction (atomique, un arrêt brutal ne corrompt pas le fichier) et les lectures se font
+par année ou par jour. Les mois présents et les réglages sont gardés à part pour que
+l'export JSON redonne exactement l'ancien format calendar_state.json.
+
+Migration d'un ancien fichier :
+    python -m planning.storage import calendar_state.json calendar_state.db [--employee NOM]
+"""
+import argparse
+import copy
+import json
+import sqlite3
+from datetime import date
+
+from planning import metrics
+
+SCHEMA_VERSION = 3
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS day_code (employee TEXT NOT NULL, day TEXT NOT NULL, code TEXT NOT NULL,"
+    " PRIMARY KEY (employee, day)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS month (employee TEXT NOT NULL, year INTEGER NOT NULL, month INTEGER NOT NULL,"
+    " PRIMARY KEY (employee, year, month)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS setting (employee TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+    " PRIMARY KEY (employee, key)) WITHOUT ROWID",
+    # numéro de version du calendrier de chaque employé, incrémenté par chaque écriture
+    "CREATE TABLE IF NOT EXISTS revision (employee TEXT PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID",
+]
+
+
+class SqliteCalendar:
+    """
+    Calendriers stockés dans un fichier SQLite. Une instance lit et écrit ceux de `employee`
+    ("" = calendrier principal, celui des bases créées avant le multi-employés).
+    """
+
+    def __init__(self, path, employee=""):
+        self.path = path
+        self.employee = employee
+        # Conge.py ouvre une instance par session (st.session_state) et la garde d'un rerun à
+        # l'autre : chaque rerun (callbacks compris) tourne sur un thread du ScriptRunner, qui
+        # change d'un rerun à l'autre, d'où check_same_thread=False. Les reruns d'une session
+        # se succèdent sans se chevaucher : la connexion n'est jamais utilisée par deux threads
+        # à la fois, et ne doit pas l'être (les tâches de fond ne la reçoivent pas).
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+
+    def _migrate(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        legacy = version < 2 and "day_code" in tables
+        self.conn.execute("BEGIN")
+        try:
+            if legacy:
+                # version 1 : un seul calendrier, sans colonne employee
+                for table in ("day_code", "month", "setting"):
+                    self.conn.execute(f"ALTER TABLE {table} RENAME TO {table}_v1")
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+            if legacy:
+                self.conn.execute("INSERT INTO day_code SELECT '', day, code FROM day_code_v1")
+                self.conn.execute("INSERT INTO month SELECT '', year, month FROM month_v1")
+                self.conn.execute("INSERT INTO setting SELECT '', key, value FROM setting_v1")
+                for table in ("day_code", "month", "setting"):
+                    self.conn.execute(f"DROP TABLE {table}_v1")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    def with_employee(self, employee):
+        """Même base (même connexion), calendrier d'un autre employé."""
+        other = copy.copy(self)
+        other.employee = employee
+        return other
+
+    def list_employees(self):
+        return [row[0] for row in self.conn.execute(
+            "SELECT employee FROM month UNION SELECT employee FROM setting ORDER BY 1"
+        )]
+
+    def close(self):
+        self.conn.close()
+
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM month WHERE employee = ? LIMIT 1", (self.employee,)).fetchone() is None
+
+    def revision(self):
+        """Version du calendrier de l'employé (0 s'il n'a jamais été écrit) : change à chaque write()."""
+        row = self.conn.execute("SELECT version FROM revision WHERE employee = ?", (self.employee,)).fetchone()
+        return row[0] if row else 0
+
+    def read_code(self, d: date):
+        row = self.conn.execute(
+            "SELECT code FROM day_code WHERE employee = ? AND day = ?", (self.employee, d.isoformat())
+        ).fetchone()
+        return row[0] if row else None
+
+    def read_year(self, year):
+        """Liste (jour ISO, code) des jours renseignés de l'année."""
+        return self.conn.execute(
+            "SELECT day, code FROM day_code WHERE employee = ? AND day >= ? AND day < ?",
+            (self.employee, f"{year:04d}-01-01", f"{year + 1:04d}-01-01"),
+        ).fetchall()
+
+    def read_months(self):
+        return [tuple(row) for row in self.conn.execute(
+            "SELECT year, month FROM month WHERE employee = ?", (self.employee,)
+        )]
+
+    def read_settings(self):
+        return {key: json.loads(value) for key, value in self.conn.execute(
+            "SELECT key, value FROM setting WHERE employee = ?", (self.employee,)
+        )}
+
+    def read_all_range(self, start: date, end: date):
+        """Liste (employé, jour ISO, code) de tous les employés entre start et end inclus."""
+        return self.conn.execute(
+            "SELECT employee, day, code FROM day_code WHERE day >= ? AND day <= ?",
+            (start.isoformat(), end.isoformat()),
+        ).fetchall()
+
+    def iter_range(self, start: date = None, end: date = None, employees=None, chunk=10_000):
+        """
+        (employé, jour ISO, code) des jours renseignés entre start et end inclus (bornes
+        facultatives), par employé puis par jour ; lus par paquets de `chunk` lignes, sans tout
+        charger en mémoire. `employees` : liste d'employés, dans cet ordre (défaut : tous).
+        """
+        where, params = [], []
+        if start is not None:
+            where.append("day >= ?")
+            params.append(start.isoformat())
+        if end is not None:
+            where.append("day <= ?")
+            params.append(end.isoformat())
+        queries = []
+        if employees is None:
+            clause = f" WHERE {' AND '.join(where)}" if where else ""
+            queries.append((f"SELECT employee, day, code FROM day_code{clause} ORDER BY employee, day", params))
+        else:
+            clause = " AND ".join(["employee = ?"] + where)
+            for employee in employees:
+                queries.append((f"SELECT employee, day, code FROM day_code WHERE {clause} ORDER BY day", [employee] + params))
+        for sql, args in queries:
+            cursor = self.conn.execute(sql, args)
+            while True:
+                rows = cursor.fetchmany(chunk)
+                if not rows:
+                    break
+                yield from rows
+
+    def read_all_settings(self):
+        """Réglages de chaque employé connu : {employé: {clé: valeur}}."""
+        settings = {employee: {} for employee in self.list_employees()}
+        for employee, key, value in self.conn.execute("SELECT employee, key, value FROM setting"):
+            settings[employee][key] = json.loads(value)
+        return settings
+
+    def write(self, days=None, months_added=(), months_removed=(), settings=None):
+        """
+        Applique un lot de modifications en une transaction :
+        `days` associe un jour à son code (None = jour supprimé).
+        Retourne la nouvelle version du calendrier (voir revision()).
+        """
+        days = days or {}
+        emp = self.employee
+        upserts = [(emp, d.isoformat(), code) for d, code in days.items() if code is not None]
+        deletes = [(emp, d.isoformat()) for d, code in days.items() if code is None]
+        with self.conn:
+            if upserts:
+                self.conn.executemany(
+                    "INSERT INTO day_code (employee, day, code) VALUES (?, ?, ?)"
+                    " ON CONFLICT(employee, day) DO UPDATE SET code = excluded.code",
+                    upserts,
+                )
+            if deletes:
+                self.conn.executemany("DELETE FROM day_code WHERE employee = ? AND day = ?", deletes)
+            if months_added:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO month (employee, year, month) VALUES (?, ?, ?)",
+                    [(emp, year, month) for year, month in months_added],
+                )
+            if months_removed:
+                self.conn.executemany(
+                    "DELETE FROM month WHERE employee = ? AND year = ? AND month = ?",
+                    [(emp, year, month) for year, month in months_removed],
+                )
+            if settings is not None:
+                self.conn.execute("DELETE FROM setting WHERE employee = ?", (emp,))
+                self.conn.executemany(
+                    "INSERT INTO setting (employee, key, value) VALUES (?, ?, ?)",
+                    [(emp, key, json.dumps(value, ensure_ascii=False, default=str)) for key, value in settings.items()],
+                )
+            self.conn.execute(
+                "INSERT INTO revision (employee, version) VALUES (?, 1)"
+                " ON CONFLICT(employee) DO UPDATE SET version = version + 1",
+                (emp,),
+            )
+            version = self.revision()
+        metrics.count("storage_writes")
+        return version
+
+    def write_rows(self, rows, months_added=()):
+        """
+        Écrit en une transaction des codes de plusieurs employés : `rows` = (employé, jour, code)
+        (code None = jour supprimé), `months_added` = (employé, année, mois). La version de chaque
+        employé touché est incrémentée (voir revision()).
+        """
+        upserts, deletes, touched = [], [], set()
+        for employee, d, code in rows:
+            touched.add(employee)
+            if code is None:
+                deletes.append((employee, d.isoformat()))
+            else:
+                upserts.append((employee, d.isoformat(), code))
+        months_added = list(months_added)
+        touched.update(employee for employee, _, _ in months_added)
+        with self.conn:
+            if upserts:
+                self.conn.executemany(
+                    "INSERT INTO day_code (employee, day, code) VALUES (?, ?, ?)"
+                    " ON CONFLICT(employee, day) DO UPDATE SET code = excluded.code",
+                    upserts,
+                )
+            if deletes:
+                self.conn.executemany("DELETE FROM day_code WHERE employee = ? AND day = ?", deletes)
+            if months_added:
+                self.conn.executemany("INSERT OR IGNORE INTO month (employee, year, month) VALUES (?, ?, ?)", months_added)
+            self.conn.executemany(
+                "INSERT INTO revision (employee, version) VALUES (?, 1)"
+                " ON CONFLICT(employee) DO UPDATE SET version = version + 1",
+                [(employee,) for employee in sorted(touched)],
+            )
+        metrics.count("storage_writes")
+
+    def import_json(self, state_obj):
+        """Importe un état au format calendar_state.json ({"data": {...}, "settings": {...}})."""
+        days = {}
+        months = []
+        for key, month_data in state_obj.get("data", {}).items():
+            year, month = (int(x) for x in key.split("-"))
+            months.append((year, month))
+            for iso, code in month_data.items():
+                days[date.fromisoformat(iso)] = code
+        self.write(days, months_added=months, settings=state_obj.get("settings", {}))
+
+    def export_json(self):
+        data = {}
+        for year, month in sorted(self.read_months()):
+            data[f"{year:04d}-{month:02d}"] = {}
+        for iso, code in self.conn.execute(
+            "SELECT day, code FROM day_code WHERE employee = ? ORDER BY day", (self.employee,)
+        ):
+            data.setdefault(iso[:7], {})[iso] = code
+        return {"data": data, "settings": self.read_settings()}
+
+
+def load_json_file(path):
+    """Lit un ancien calendar_state.json ; une erreur de lecture est remontée, pas masquée."""
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            state_obj = json.load(f)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"{path} est illisible ({exc}) : fichier corrompu ?") from exc
+    if not isinstance(state_obj, dict) or not isinstance(state_obj.get("data", {}), dict):
+        raise ValueError(f"{path} n'a pas le format attendu {{'data': ..., 'settings': ...}}")
+    return state_obj
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import/export du calendrier entre JSON et SQLite.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="importe un ou plusieurs calendar_state.json dans la base")
+    imp.add_argument("json_files", nargs="+")
+    imp.add_argument("database")
+    imp.add_argument("--employee", default="", help="employé destinataire (défaut : calendrier principal)")
+    exp = sub.add_parser("export", help="exporte la base au format calendar_state.json")
+    exp.add_argument("database")
+    exp.add_argument("json_file")
+    exp.add_argument("--employee", default="", help="employé à exporter (défaut : calendrier principal)")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        db = SqliteCalendar(args.database, args.employee)
+        for path in args.json_files:
+            db.import_json(load_json_file(path))
+            print(f"{path} importé dans {args.database}")
+        db.close()
+    else:
+        db = SqliteCalendar(args.database, args.employee)
+        with open(args.json_file, "w", encoding="utf-8") as f:
+            json.dump(db.export_json(), f, ensure_ascii=False, indent=2, default=str)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
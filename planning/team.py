@@ -0,0 +1,257 @@
+"""
+Règles et totaux d'absence de toute une équipe, calculés en bloc.
+
+Les codes stockés de l'équipe forment une matrice employés × jours de petits entiers ; les
+règles d'apply_rules (defaults, retour des CZ, ZZ -> CZ en VACS) et le total d'evaluate_plan
+sont appliqués par opérations NumPy sur toute la matrice au lieu d'une boucle Python par
+personne et par jour. Chaque employé garde ses propres réglages ZZ/parité.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+
+from planning.codes import C4, CX, CZ, FC, OTHER, TRA, ZZ, decode, encode
+from planning.rules import WEEKDAYS_FR, Plan
+from planning.ruleset import active_ruleset, require_default_ruleset
+
+
+@dataclass(frozen=True)
+class Employee:
+    name: str
+    zz_odd: tuple = ("samedi", "dimanche")
+    zz_even: tuple = ("samedi", "dimanche")
+    parity_choice: str = "Paires"
+
+    @classmethod
+    def from_settings(cls, name, settings):
+        """Employé à partir de ses réglages enregistrés (clés zz_odd, zz_even, parity_choice)."""
+        return cls(
+            name=name,
+            zz_odd=tuple(settings.get("zz_odd", cls.zz_odd)),
+            zz_even=tuple(settings.get("zz_even", cls.zz_even)),
+            parity_choice=settings.get("parity_choice", cls.parity_choice),
+        )
+
+
+class Team:
+    """
+    Codes stockés d'une équipe sur `n_days` jours consécutifs à partir de `start` :
+    codes[e, i] est le code de l'employé e au jour i (voir planning.codes, 0 = non renseigné).
+    """
+
+    def __init__(self, employees, start: date, codes, holidays=frozenset()):
+        self.employees = list(employees)
+        self.start = start
+        self.codes = np.asarray(codes, dtype=np.uint8).reshape(len(self.employees), -1)
+        self.holidays = frozenset(holidays)
+
+    @property
+    def n_days(self):
+        return self.codes.shape[1]
+
+    def dates(self):
+        return [self.start + timedelta(days=i) for i in range(self.n_days)]
+
+    @classmethod
+    def empty(cls, employees, start: date, end: date, holidays=frozenset()):
+        n_days = (end - start).days + 1
+        employees = list(employees)
+        return cls(employees, start, np.zeros((len(employees), n_days), dtype=np.uint8), holidays)
+
+    @classmethod
+    def from_storage(cls, db, start: date, end: date, holidays=frozenset()):
+        """Équipe de tous les employés d'une base SqliteCalendar, entre start et end inclus."""
+        settings = db.read_all_settings()
+        employees = [Employee.from_settings(name, s) for name, s in settings.items()]
+        team = cls.empty(employees, start, end, holidays)
+        row_of = {e.name: k for k, e in enumerate(employees)}
+        origin = start.toordinal()
+        for name, iso, code in db.read_all_range(start, end):
+            row = row_of.get(name)
+            if row is not None:
+                team.codes[row, date.fromisoformat(iso).toordinal() - origin] = encode(code)
+        return team
+
+    def plan(self, k):
+        """Plan (rules.Plan) de l'employé k, pour l'évaluer ou l'optimiser seul."""
+        e = self.employees[k]
+        return Plan(
+            start=self.start,
+            codes=tuple(decode(c) for c in self.codes[k].tolist()),
+            holidays=self.holidays,
+            zz_odd=e.zz_odd,
+            zz_even=e.zz_even,
+            parity_choice=e.parity_choice,
+        )
+
+
+# ---------------------------
+# Tables jours × employés
+# ---------------------------
+def day_tables(team: Team):
+    """(férié (jours,), jour ZZ (employés, jours), semaine 3-ZZ (employés, jours))."""
+    days = team.dates()
+    weekday = np.array([d.weekday() for d in days], dtype=np.intp)
+    week_even = np.array([(d.isocalendar()[1] % 2) == 0 for d in days], dtype=bool)
+    holiday = np.array([d in team.holidays for d in days], dtype=bool)
+
+    odd_mask = np.array([[w in e.zz_odd for w in WEEKDAYS_FR] for e in team.employees], dtype=bool).reshape(-1, 7)
+    even_mask = np.array([[w in e.zz_even for w in WEEKDAYS_FR] for e in team.employees], dtype=bool).reshape(-1, 7)
+    zz_day = np.where(week_even, even_mask[:, weekday], odd_mask[:, weekday])
+
+    # même règle que week_is_three_zz
+    odd_three = np.array([len(e.zz_odd) == 3 for e in team.employees], dtype=bool)
+    even_three = np.array([len(e.zz_even) == 3 for e in team.employees], dtype=bool)
+    paires = np.array([e.parity_choice == "Paires" for e in team.employees], dtype=bool)
+    chosen_three = np.where(week_even, even_three[:, None], odd_three[:, None])
+    three_zz = chosen_three & (week_even == paires[:, None])
+    return holiday, zz_day, three_zz
+
+
+# ---------------------------
+# Règles et totaux en bloc
+# ---------------------------
+def normalize_bulk(team: Team, tables=None):
+    """Étapes 1 et 2 des règles (normalize_code) sur toute la matrice."""
+    holiday, zz_day, _ = tables or day_tables(team)
+    c = team.codes
+    return np.where(
+        holiday,
+        FC,
+        np.where(zz_day, np.where(c == FC, FC, ZZ), np.where((c == 0) | (c == CZ), TRA, c)),
+    ).astype(np.uint8)
+
+
+def apply_rules_bulk(team: Team, tables=None):
+    """Codes finaux de chaque employé : même résultat qu'apply_rules ligne par ligne."""
+    tables = tables or day_tables(team)
+    return active_ruleset().apply(normalize_bulk(team, tables), tables[2]).astype(np.uint8)
+
+
+def _next_index(mask, n):
+    """Pour chaque jour, position du prochain jour où mask est vrai (n s'il n'y en a pas)."""
+    return np.minimum.accumulate(np.where(mask, np.arange(n), n)[:, ::-1], axis=1)[:, ::-1]
+
+
+def absence_bulk(team: Team, final=None, tables=None):
+    """
+    Retourne (totaux par employé, masque employés × jours des jours d'absence) : même
+    résultat qu'evaluate_plan sur chaque ligne (VACS ouverte par le premier CX).
+    """
+    tables = tables or day_tables(team)
+    c = apply_rules_bulk(team, tables) if final is None else final
+    three_zz = tables[2]
+    n_employees, n = c.shape
+    rows = np.arange(n_employees)
+    pos = np.arange(n)[None, :]
+
+    is_cx = c == CX
+    has_cx = is_cx.any(axis=1)
+    first = is_cx.argmax(axis=1)
+    end = _next_index(c == TRA, n)[rows, first]
+    window = (pos >= first[:, None]) & (pos < end[:, None])
+    counted = window & (np.isin(c, (CX, C4, CZ, FC)) | ((c == ZZ) & three_zz))
+    last = np.where(counted, pos, -1).max(axis=1)
+
+    # ZZ/FC contigus avant le premier jour compté et après le dernier
+    zz_fc = (c == ZZ) | (c == FC)
+    last_other = np.maximum.accumulate(np.where(zz_fc, -1, pos), axis=1)
+    before = np.where(first > 0, last_other[rows, np.maximum(first - 1, 0)] + 1, 0)
+    after = last + 1
+    after_end = np.where(after < n, _next_index(~zz_fc, n)[rows, np.minimum(after, n - 1)], n)
+
+    mask = (
+        counted
+        | ((pos >= before[:, None]) & (pos < first[:, None]))
+        | ((pos >= after[:, None]) & (pos < after_end[:, None]))
+    )
+    mask &= has_cx[:, None]
+    return mask.sum(axis=1), mask
+
+
+# ---------------------------
+# Optimum exact en bloc
+# ---------------------------
+def exact_bulk(team: Team, cx_quota, c4_quota, tables=None):
+    """
+    Total d'absence optimal de chaque ligne avec `cx_quota` CX et `c4_quota` C4 à poser : même
+    valeur qu'exact_placement ligne par ligne. La programmation dynamique (de droite à gauche,
+    par compteur restant) avance d'un jour à la fois pour toutes les lignes ensemble.
+    Comme exact_placement, ValueError si un autre accord que celui par défaut est en vigueur.
+    """
+    require_default_ruleset("L'optimisation exacte en bloc")
+    cx_quota, c4_quota = int(cx_quota), int(c4_quota)
+    tables = tables or day_tables(team)
+    holiday, zz_day, three_zz = tables
+    base = normalize_bulk(team, tables)
+    n_rows, n = base.shape
+    best_value = np.zeros(n_rows, dtype=np.int32)
+    if n == 0:
+        return best_value
+
+    free = (base != CX) & (base != C4) & ~holiday & ~zz_day
+    stop = base == TRA
+    tail = (base == ZZ) & ~three_zz
+    skip = base == OTHER  # code inconnu : ni compté ni frontière, mais coupe la queue
+    # FC saisi sur un jour ZZ choisi (hors férié) : un CX/C4 posé dessus le rend ZZ
+    demote = (base == FC) & zz_day & ~holiday & ~three_zz
+    is_cx = base == CX
+    first_cx = np.where(is_cx.any(axis=1), is_cx.argmax(axis=1), n)
+    # ZZ/FC contigus juste avant chaque jour (extension de la VACS vers l'arrière)
+    zz_fc = (base == ZZ) | (base == FC)
+    back = np.zeros((n_rows, n), dtype=np.int32)
+    for i in range(1, n):
+        back[:, i] = np.where(zz_fc[:, i - 1], back[:, i - 1] + 1, 0)
+
+    budget = cx_quota + c4_quota
+    neg = -(n + 1)
+    has_k = np.arange(budget + 1) > 0
+    # états 2 et 3 (voir exact_placement) : seulement s'il y a des codes inconnus
+    extended = bool(skip.any())
+    demoting = bool(demote.any())
+
+    def shifted(x):  # x[:, k - 1] : le jour i consomme un jour à poser
+        return np.concatenate((np.full((n_rows, 1), neg, dtype=np.int32), x[:, :-1]), axis=1)
+
+    nxt0 = np.zeros((n_rows, budget + 1), dtype=np.int32)  # best[0][i + 1]
+    nxt1 = np.zeros((n_rows, budget + 1), dtype=np.int32)  # best[1][i + 1]
+    nxt2 = np.zeros((n_rows, budget + 1), dtype=np.int32)  # best[2][i + 1]
+    nxt3 = np.zeros((n_rows, budget + 1), dtype=np.int32)  # best[3][i + 1]
+    for i in range(n - 1, -1, -1):
+        # début de la VACS au jour i : le premier CX, ou un CX posé sur un jour libre avant lui
+        before_cx = i < first_cx
+        valid = (i == first_cx) | (before_cx & free[:, i] & (cx_quota > 0))
+        k_left = np.where(before_cx, nxt0[:, max(budget - 1, 0)], nxt0[:, budget])
+        best_value = np.where(valid, np.maximum(best_value, back[:, i] + 1 + k_left), best_value)
+
+        fill = np.empty_like(nxt0)  # 1 + best[0][i + 1][k - 1] : combler le jour i
+        fill[:, 0] = neg
+        fill[:, 1:] = 1 + nxt0[:, :-1]
+        tail_fill = np.where(free[:, i, None] & has_k, fill, neg)
+        is_stop, is_tail = stop[:, i, None], tail[:, i, None]
+        b0 = np.where(
+            is_stop,
+            np.where(has_k, fill, 0),
+            np.where(is_tail, np.maximum(np.maximum(nxt0, 1 + nxt1), tail_fill), 1 + nxt0),
+        )
+        b1 = np.where(is_stop, 0, np.where(is_tail, 1 + nxt1, neg))
+        if extended:
+            is_skip = skip[:, i, None]
+            b0 = np.where(is_skip, np.maximum(nxt2, tail_fill), b0)
+            b1 = np.where(is_skip, nxt3, b1)
+            b2 = np.where(is_tail, np.maximum(nxt2, tail_fill), b0)
+            b3 = np.where(is_stop, 0, np.where(is_tail | is_skip, nxt3, neg))
+        if demoting:
+            # FC rendu ZZ par un jour posé
+            demoted = demote[:, i, None] & has_k
+            prev1 = shifted(nxt1)
+            b0 = np.where(demoted, np.maximum(b0, np.maximum(fill - 1, 1 + prev1)), b0)
+            b1 = np.where(demoted, 1 + prev1, b1)
+            if extended:
+                b2 = np.where(demoted, np.maximum(1 + nxt0, shifted(nxt2)), b2)
+                b3 = np.where(demoted, shifted(nxt3), b3)
+        nxt0, nxt1 = b0.astype(np.int32), b1.astype(np.int32)
+        if extended:
+            nxt2, nxt3 = b2.astype(np.int32), b3.astype(np.int32)
+    return best_value
@@ -0,0 +1,181 @@
+"""
+Index des périodes VACS d'une plage de codes finaux (règles appliquées).
+
+Un seul parcours vers l'avant relève, pour chaque VACS (ouverte par le premier CX qui suit un
+TRA, fermée par le TRA suivant) : les jours comptés et les ZZ/FC collés avant et après. Le
+parcours est paresseux : il n'avance que jusqu'au jour demandé, le total (première VACS)
+s'arrête donc au premier TRA qui la ferme. Les requêtes par jour sont une recherche
+dichotomique parmi les VACS déjà relevées. Les codes comptés (FC compté comme CZ en VACS et
+semaine 3-ZZ pour l'accord par défaut) viennent de l'automate des règles (planning.ruleset).
+"""
+from bisect import bisect_right
+from typing import NamedTuple
+
+_COUNTED = frozenset(("CX", "C4", "CZ", "FC"))
+_ZZ_OR_FC = frozenset(("ZZ", "FC"))
+
+
+class Segment(NamedTuple):
+    """Une VACS : jours first..last inclus (ZZ/FC collés compris), `days` = positions comptées, triées."""
+    first: int
+    last: int
+    opening: int  # position du CX qui ouvre la VACS
+    days: tuple
+
+
+class VacsIndex:
+    def __init__(self, codes, three_zz, rules=None):
+        """
+        `codes` : codes finaux de la plage ; `three_zz[i]` : le jour i est dans une semaine 3-ZZ ;
+        `rules` : automate des règles (planning.ruleset.RuleSet), pour les codes comptés.
+        """
+        self.codes = codes
+        self.three_zz = three_zz
+        self.rules = rules
+        self.segments = []
+        self._firsts = []  # first de chaque segment, pour bisect
+        self._counted_codes = None
+        self._pos = 0
+        # état du parcours
+        self._streak = 0  # suite de ZZ/FC la plus récente : _streak.._streak_end exclu
+        self._streak_end = 0
+        self._opening = None  # CX ouvrant la VACS en cours de décompte (fermée par TRA seulement)
+        self._before = 0  # premier jour de la VACS en cours (ZZ/FC collés avant le CX compris)
+        self._counted = []
+        self._tail = 0  # fin (exclue) des ZZ/FC collés après le dernier jour compté
+        self._tail_open = False
+
+    # ---------------------------
+    # Parcours
+    # ---------------------------
+    def _close(self):
+        counted, before = self._counted, self._before
+        days = tuple(range(before, counted[0])) + tuple(counted) + tuple(range(counted[-1] + 1, self._tail))
+        self.segments.append(Segment(before, self._tail - 1, self._opening, days))
+        self._firsts.append(before)
+        self._opening = None
+        self._counted = []
+
+    def _advance(self, until):
+        """Poursuit le parcours jusqu'au jour `until` exclu (len(codes) : jusqu'au bout, VACS en cours fermée)."""
+        codes, three_zz = self.codes, self.three_zz
+        n = len(codes)
+        until = min(until, n)
+        i = self._pos
+        while i < until:
+            if self._opening is None:
+                # rien à relever avant le prochain CX, sauf la suite de ZZ/FC qui le précède
+                try:
+                    j = codes.index("CX", i, until)
+                except ValueError:
+                    j = until
+                if j > i:
+                    k = j
+                    while k > i and codes[k - 1] in _ZZ_OR_FC:
+                        k -= 1
+                    if k < j:
+                        if k > i or self._streak_end != i:
+                            self._streak = k
+                        self._streak_end = j
+                    i = j
+                    continue
+            code = codes[i]
+            zz_or_fc = code in _ZZ_OR_FC
+            if code == "TRA":
+                if self._opening is not None:
+                    self._close()
+            else:
+                if self._opening is None and code == "CX":
+                    self._opening = i
+                    self._before = self._streak if self._streak_end == i else i
+                if self._opening is not None:
+                    if code in _COUNTED or (code == "ZZ" and three_zz[i]):
+                        self._counted.append(i)
+                        self._tail = i + 1
+                        self._tail_open = True
+                    elif self._tail_open and zz_or_fc:
+                        self._tail = i + 1
+                    else:
+                        self._tail_open = False
+            if zz_or_fc:
+                if self._streak_end != i:
+                    self._streak = i
+                self._streak_end = i + 1
+            i += 1
+        self._pos = i
+        if i == n and self._opening is not None:
+            self._close()
+
+    def complete(self):
+        """Termine le parcours (toutes les VACS de la plage) et retourne l'index."""
+        self._advance(len(self.codes))
+        return self
+
+    # ---------------------------
+    # Requêtes
+    # ---------------------------
+    def _to_next_stop(self):
+        """Avance jusqu'au prochain TRA inclus (une VACS en cours s'y ferme), ou jusqu'au bout."""
+        try:
+            stop = self.codes.index("TRA", self._pos) + 1
+        except ValueError:
+            stop = len(self.codes)
+        self._advance(stop)
+
+    def _settle(self, i):
+        """Avance jusqu'à ce que l'appartenance du jour i à une VACS soit connue."""
+        n = len(self.codes)
+        while self._pos < n:
+            if self._pos <= i:
+                self._advance(i + 1)
+            elif self._opening is not None:
+                self._to_next_stop()
+            elif self._streak_end == self._pos and self._streak <= i:
+                # i est dans des ZZ/FC encore ouverts : un CX juste après les rattacherait à sa VACS
+                self._advance(self._pos + 1)
+            else:
+                break
+
+    def first(self):
+        """La VACS ouverte par le premier CX de la plage, ou None."""
+        n = len(self.codes)
+        while not self.segments and self._pos < n:
+            if self._opening is None:
+                try:
+                    self._advance(self.codes.index("CX", self._pos) + 1)
+                except ValueError:
+                    self._advance(n)
+            else:
+                self._to_next_stop()
+        return self.segments[0] if self.segments else None
+
+    def segment_at(self, i):
+        """VACS (ZZ/FC collés compris) contenant le jour i, ou None."""
+        self._settle(i)
+        k = bisect_right(self._firsts, i) - 1
+        if k >= 0 and self.segments[k].last >= i:
+            return self.segments[k]
+        return None
+
+    def is_counted(self, i):
+        """Le jour i compte dans le total d'absence d'une VACS."""
+        segment = self.segment_at(i)
+        if segment is None:
+            return False
+        k = bisect_right(segment.days, i) - 1
+        return k >= 0 and segment.days[k] == i
+
+    def is_effective_cz(self, i):
+        """CZ stocké, ou jour compté comme CZ par les règles (FC en VACS et semaine 3-ZZ par défaut)."""
+        if self.codes[i] == "CZ":
+            return True
+        if self.rules is None:
+            return False
+        if self._counted_codes is None:
+            self._counted_codes = self.rules.counted_codes(self.codes, self.three_zz)
+        return self._counted_codes[i] == "CZ"
+
+    def total(self):
+        """(nombre de jours, positions) de la première VACS : le total d'absence de la plage."""
+        segment = self.first()
+        return (0, ()) if segment is None else (len(segment.days), segment.days)
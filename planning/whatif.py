@@ -0,0 +1,155 @@
+"""
+Simulation des réglages ZZ / parité : pour un calendrier, une période et des compteurs, le
+total d'absence actuel et le total atteignable (plan optimal) sous chaque configuration.
+
+Chaque configuration (jours ZZ des semaines impaires, des semaines paires, parité des semaines
+à 3 ZZ) devient une ligne d'une planning.team.Team : les règles, les totaux et l'optimum exact
+sont calculés en bloc pour toutes les configurations à la fois. Seuls les codes que les règles
+ont dérivés des réglages en cours sont recalculés ; les FC et ZZ saisis à la main sont gardés.
+check_current vérifie que la ligne des réglages en cours redonne evaluate_plan / exact_placement.
+
+    python -m planning.whatif calendar_state.json --start 2026-01-01 --end 2026-12-31 --cx 5 -n 20
+    python -m planning.whatif calendar_state.json --start 2026-01-01 --end 2026-12-31 --cx 5 --check
+"""
+import argparse
+from datetime import date
+from itertools import combinations, product
+import os
+import sys
+from typing import NamedTuple
+
+import numpy as np
+
+from planning.optimize import exact_placement
+from planning.rules import WEEKDAYS_FR, Plan, day_flags, evaluate_plan
+from planning.team import Employee, Team, absence_bulk, day_tables, encode, exact_bulk
+
+PARITIES = ("Paires", "Impaires")
+SIZES = (2, 3)
+
+
+class WhatIfRow(NamedTuple):
+    zz_odd: tuple
+    zz_even: tuple
+    parity_choice: str
+    current: int  # total d'absence du calendrier tel quel
+    achievable: int  # total avec les CX/C4 posés au mieux
+
+
+def zz_selections(sizes=SIZES):
+    """Sélections de jours ZZ valides (2 ou 3 jours), dans l'ordre de la semaine."""
+    return [sel for size in sizes for sel in combinations(WEEKDAYS_FR, size)]
+
+
+def configurations(parities=PARITIES, sizes=SIZES, zz_odd=None, zz_even=None):
+    """
+    Toutes les configurations (zz_odd, zz_even, parité) ; `zz_odd` / `zz_even` fixent l'une des
+    deux sélections pour n'explorer que l'autre.
+    """
+    odd = [tuple(zz_odd)] if zz_odd is not None else zz_selections(sizes)
+    even = [tuple(zz_even)] if zz_even is not None else zz_selections(sizes)
+    return [(o, e, p) for p, o, e in product(parities, odd, even)]
+
+
+def settings_free_codes(plan: Plan):
+    """
+    Codes stockés (planning.codes) sans ce que les règles ont dérivé des réglages en cours :
+    FC d'un férié, ZZ d'un jour ZZ choisi et CZ sont effacés. Un FC hors férié ou un ZZ hors des
+    jours choisis a été saisi à la main : il est gardé.
+    """
+    row = []
+    for code, (holiday, zz_day, _) in zip(plan.codes, day_flags(plan)):
+        derived = code == "CZ" or (code == "FC" and holiday) or (code == "ZZ" and zz_day)
+        row.append(0 if derived else encode(code))
+    return np.array(row, dtype=np.uint8)
+
+
+def what_if(plan: Plan, cx_quota, c4_quota, configs=None):
+    """
+    Lignes WhatIfRow pour chaque configuration (toutes par défaut), de la meilleure à la moins
+    bonne (total atteignable, puis total actuel). Les codes dérivés des réglages en cours sont
+    effacés (settings_free_codes) puis recalculés par les règles de chaque configuration.
+    """
+    configs = configurations() if configs is None else list(configs)
+    employees = [Employee("", tuple(o), tuple(e), p) for o, e, p in configs]
+    row = settings_free_codes(plan)
+    team = Team(employees, plan.start, np.tile(row, (len(employees), 1)), plan.holidays)
+    tables = day_tables(team)
+    current, _ = absence_bulk(team, tables=tables)
+    achievable = exact_bulk(team, cx_quota, c4_quota, tables)
+    order = np.lexsort((-current, -achievable))
+    return [
+        WhatIfRow(*configs[k], int(current[k]), int(achievable[k]))
+        for k in order.tolist()
+    ]
+
+
+def check_current(plan: Plan, cx_quota, c4_quota):
+    """
+    Écarts entre la ligne des réglages en cours du plan et le calcul direct : liste de
+    (colonne, valeur de la simulation, valeur attendue), vide si tout concorde. Effacer puis
+    recalculer les codes dérivés ne doit rien changer sous les réglages qui les ont produits.
+    """
+    row = what_if(plan, cx_quota, c4_quota, [(tuple(plan.zz_odd), tuple(plan.zz_even), plan.parity_choice)])[0]
+    mismatches = []
+    expected = evaluate_plan(plan)[0]
+    if row.current != expected:
+        mismatches.append(("actuel", row.current, expected))
+    expected = exact_placement(plan, cx_quota, c4_quota)[0]
+    if row.achievable != expected:
+        mismatches.append(("atteignable", row.achievable, expected))
+    return mismatches
+
+
+def main(argv=None):
+    from planning.batch import make_plan, read_calendars
+
+    parser = argparse.ArgumentParser(description="Compare les réglages ZZ / parité d'un calendrier.")
+    parser.add_argument("input", help="fichier .json, .csv ou .db (voir planning.batch)")
+    parser.add_argument("--employee", help="calendrier à simuler (défaut : le premier du fichier)")
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="premier jour (AAAA-MM-JJ)")
+    parser.add_argument("--end", type=date.fromisoformat, required=True, help="dernier jour inclus (AAAA-MM-JJ)")
+    parser.add_argument("--cx", type=int, default=3, help="compteur CX")
+    parser.add_argument("--c4", type=int, default=0, help="compteur C4")
+    parser.add_argument("--parity", nargs="+", choices=PARITIES, default=list(PARITIES))
+    parser.add_argument("--sizes", type=int, nargs="+", choices=SIZES, default=list(SIZES),
+                        help="nombre de jours ZZ par semaine")
+    parser.add_argument("-n", "--top", type=int, default=20, help="configurations affichées")
+    parser.add_argument("--check", action="store_true",
+                        help="vérifie seulement la ligne des réglages en cours (check_current)")
+    args = parser.parse_args(argv)
+    if args.end < args.start:
+        parser.error("--end doit être postérieur à --start")
+
+    try:
+        calendars = read_calendars([args.input])
+    except (OSError, ValueError, KeyError) as exc:
+        parser.error(f"lecture impossible : {exc}")
+    if args.employee is not None:
+        calendars = [c for c in calendars if c[0] == args.employee]
+    if not calendars:
+        parser.error(f"aucun calendrier {args.employee!r} dans {args.input}")
+    name, days, settings = calendars[0]
+
+    from planning.calendar_meta import french_holidays
+
+    holidays = frozenset().union(*(french_holidays(y) for y in range(args.start.year, args.end.year + 1)))
+    plan = make_plan(days, settings, args.start, args.end, holidays)
+    if args.check:
+        mismatches = check_current(plan, args.cx, args.c4)
+        for column, got, expected in mismatches:
+            print(f"ÉCART {column} : simulation {got}, calcul direct {expected}")
+        if mismatches:
+            sys.exit(1)
+        print("La ligne des réglages en cours concorde avec evaluate_plan et exact_placement.")
+        return
+    rows = what_if(plan, args.cx, args.c4, configurations(tuple(args.parity), tuple(args.sizes)))
+    print(f"{os.path.basename(args.input)} {name or ''} : {len(rows)} configurations")
+    print(f"{'rang':>4}  {'atteignable':>11}  {'actuel':>6}  parité    ZZ impaires / ZZ paires")
+    for rank, r in enumerate(rows[:args.top], start=1):
+        print(f"{rank:4d}  {r.achievable:11d}  {r.current:6d}  {r.parity_choice:8s}  "
+              f"{', '.join(r.zz_odd)} / {', '.join(r.zz_even)}")
+
+
+if __name__ == "__main__":
+    main()